@@ -0,0 +1,173 @@
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+import numpy as np
+from django.conf import settings
+
+from core.metrics import metrics
+
+EMBEDDING_DIMENSIONS = 512
+
+_NON_WORD = re.compile(r"[^\w\s]")
+
+# Words that only frame a question and are left out of its embedding
+_QUESTION_WORDS = frozenset(
+    "a an the is are was were be of in on at to for by with and or it its this that "
+    "what which who how why when where do does did can could please explain tell me about define describe".split()
+)
+
+
+def normalize_question(question: str) -> str:
+    """
+    Case, punctuation and whitespace insensitive form of a question
+    """
+    return " ".join(_NON_WORD.sub(" ", question.lower()).split())
+
+
+def _bucket(feature: str) -> int:
+    return int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=4).digest(), "little") % EMBEDDING_DIMENSIONS
+
+
+def embed(normalized_question: str) -> np.ndarray:
+    """
+    Local hashing embedding of a normalized question: its content words and,
+    with a lower weight, their character trigrams are hashed into a fixed
+    number of dimensions, then L2-normalized so a dot product is the cosine
+    similarity. Trigrams let inflections ("refracts"/"refraction") overlap
+    without making different terms ("reflection"/"refraction") look alike.
+    """
+    vector = np.zeros(EMBEDDING_DIMENSIONS, dtype=np.float32)
+    for word in normalized_question.split():
+        if word in _QUESTION_WORDS:
+            continue
+        vector[_bucket(word)] += 1.0
+        padded = f"#{word}#"
+        for i in range(len(padded) - 2):
+            vector[_bucket(padded[i:i + 3])] += 0.15
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class AnswerCache:
+    """
+    In-memory cache of chatbot answers keyed by (lesson content hash,
+    normalized question), with LRU eviction beyond max_entries and a TTL.
+
+    With a similarity threshold, a miss on the exact question falls back to
+    the most similar cached question about the same lesson (cosine over
+    hashing embeddings), so paraphrases hit too. max_entries and ttl default
+    to the CHAT_ANSWER_CACHE_MAX_ENTRIES and CHAT_ANSWER_CACHE_TTL settings.
+    """
+
+    def __init__(
+        self,
+        max_entries: Optional[int] = None,
+        ttl: Optional[float] = None,
+        similarity: Optional[float] = None,
+    ):
+        self.max_entries = settings.CHAT_ANSWER_CACHE_MAX_ENTRIES if max_entries is None else max_entries
+        self.ttl = settings.CHAT_ANSWER_CACHE_TTL if ttl is None else ttl
+        self.similarity = similarity
+        self._lock = threading.Lock()
+        # (lesson hash, normalized question) -> (answer, expires at, embedding)
+        self._entries = OrderedDict()
+        # lesson hash -> keys of its entries
+        self._lessons: Dict[str, set] = {}
+
+    def _drop(self, key) -> None:
+        del self._entries[key]
+        keys = self._lessons[key[0]]
+        keys.discard(key)
+        if not keys:
+            del self._lessons[key[0]]
+
+    def _live(self, key, now: float):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[1] <= now:
+            self._drop(key)
+            metrics.incr("chat_answer_cache.expired")
+            return None
+        return entry
+
+    def _most_similar(self, lesson_hash: str, embedding: np.ndarray, now: float):
+        keys = [key for key in self._lessons.get(lesson_hash, ()) if self._entries[key][1] > now]
+        if not keys:
+            return None
+        similarities = np.stack([self._entries[key][2] for key in keys]) @ embedding
+        best = int(np.argmax(similarities))
+        return keys[best] if similarities[best] >= self.similarity else None
+
+    def get(self, question: str, lesson_hash: str) -> Optional[Dict[str, Any]]:
+        """The cached answer to the question about the lesson, or None"""
+        normalized = normalize_question(question)
+        key = (lesson_hash, normalized)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._live(key, now)
+            if entry is None and self.similarity is not None:
+                similar = self._most_similar(lesson_hash, embed(normalized), now)
+                if similar is not None:
+                    key, entry = similar, self._entries[similar]
+                    metrics.incr("chat_answer_cache.similar_hits")
+            if entry is None:
+                metrics.incr("chat_answer_cache.misses")
+                return None
+            self._entries.move_to_end(key)
+        metrics.incr("chat_answer_cache.hits")
+        return entry[0]
+
+    def put(self, question: str, lesson_hash: str, answer: Dict[str, Any]) -> None:
+        normalized = normalize_question(question)
+        key = (lesson_hash, normalized)
+        embedding = embed(normalized) if self.similarity is not None else None
+        with self._lock:
+            self._entries[key] = (answer, time.monotonic() + self.ttl, embedding)
+            self._entries.move_to_end(key)
+            self._lessons.setdefault(lesson_hash, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+                metrics.incr("chat_answer_cache.evictions")
+
+    def purge(self, lesson_hash: str) -> int:
+        """Remove every cached answer about a lesson, returns how many"""
+        with self._lock:
+            keys = list(self._lessons.get(lesson_hash, ()))
+            for key in keys:
+                self._drop(key)
+        metrics.incr("chat_answer_cache.purged", len(keys))
+        return len(keys)
+
+    def clear(self) -> int:
+        with self._lock:
+            count = len(self._entries)
+            self._entries.clear()
+            self._lessons.clear()
+        metrics.incr("chat_answer_cache.purged", count)
+        return count
+
+    def stats(self) -> Dict[str, Any]:
+        hits = metrics.get("chat_answer_cache.hits")
+        lookups = hits + metrics.get("chat_answer_cache.misses")
+        with self._lock:
+            entries = len(self._entries)
+            lessons = len(self._lessons)
+        return {
+            "entries": entries,
+            "lessons": lessons,
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "similarity_threshold": self.similarity,
+            "hits": hits,
+            "similar_hits": metrics.get("chat_answer_cache.similar_hits"),
+            "misses": metrics.get("chat_answer_cache.misses"),
+            "hit_rate": round(hits / lookups, 4) if lookups else None,
+        }
+
+
+answer_cache = AnswerCache(similarity=settings.CHAT_ANSWER_CACHE_SIMILARITY)
@@ -0,0 +1,89 @@
+import functools
+import logging
+from typing import Optional
+
+import mutagen
+from django.conf import settings
+from django.core.files.uploadhandler import StopUpload, TemporaryFileUploadHandler
+
+from core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Room for the multipart boundaries and part headers around the file in Content-Length
+MULTIPART_ALLOWANCE_BYTES = 64 * 1024
+
+
+class SizeCappedUploadHandler(TemporaryFileUploadHandler):
+    """
+    Upload handler that writes every file straight to a temporary file on
+    disk, whatever its size, so an upload never sits in worker memory, and
+    stops parsing the request once more than max_bytes of file data
+    (settings.TRANSCRIBE_MAX_UPLOAD_BYTES by default) have arrived (a
+    client can send a body larger than its Content-Length claims, or no
+    Content-Length at all).
+
+    Under WSGI this stops reading the request from the client. Under ASGI
+    Django has already received the whole body before any handler runs, so
+    core.asgi caps it with BodySizeLimitMiddleware while it arrives.
+    """
+
+    def __init__(self, request=None, max_bytes: Optional[int] = None):
+        super().__init__(request)
+        self.max_bytes = settings.TRANSCRIBE_MAX_UPLOAD_BYTES if max_bytes is None else max_bytes
+        self.received = 0
+        self.exceeded = False
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > self.max_bytes:
+            self.exceeded = True
+            metrics.incr("transcribe.rejected_size")
+            # Drops the partial temporary file and the rest of the request body
+            # (under WSGI; ASGI servers have received it already)
+            raise StopUpload(connection_reset=True)
+        return super().receive_data_chunk(raw_data, start)
+
+
+def spool_uploads(view):
+    """
+    Install SizeCappedUploadHandler on the request before the view (and DRF
+    authentication, which may read the form for its CSRF check) parses it.
+    Upload handlers can only be replaced before the request body is read.
+    """
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        request.upload_handlers = [SizeCappedUploadHandler(request)]
+        return await view(request, *args, **kwargs)
+    return wrapper
+
+
+def upload_too_large(request) -> bool:
+    """
+    Whether the request declares or sent more than TRANSCRIBE_MAX_UPLOAD_BYTES
+    of file data. Call before and after reading request.FILES.
+    """
+    try:
+        content_length = int(request.META.get("CONTENT_LENGTH") or 0)
+    except ValueError:
+        content_length = 0
+    if content_length > settings.TRANSCRIBE_MAX_UPLOAD_BYTES + MULTIPART_ALLOWANCE_BYTES:
+        metrics.incr("transcribe.rejected_size")
+        return True
+    return any(getattr(handler, "exceeded", False) for handler in request.upload_handlers)
+
+
+def audio_duration(path: str) -> Optional[float]:
+    """
+    Duration in seconds read from the headers of an audio file on disk
+    (MP3, M4A, Ogg/Opus, FLAC, WAV, ...) without decoding it. None when the
+    format is not recognised.
+    """
+    try:
+        audio = mutagen.File(path)
+    except mutagen.MutagenError as e:
+        logger.warning(f"Could not read audio headers: {str(e)}")
+        return None
+    if audio is None or audio.info is None:
+        return None
+    return getattr(audio.info, "length", None) or None
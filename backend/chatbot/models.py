@@ -1,3 +1,68 @@
 from django.db import models
 
-# Create your models here.
+
+class ChatSession(models.Model):
+    """
+    A doubt-solving conversation about one lesson.
+
+    The lesson is bound once, either as a user's GeneratedContent or as
+    uploaded content identified by its content hash, so follow-up turns only
+    send the new question. Older messages are folded into a rolling summary.
+    """
+    user = models.ForeignKey('user_profiles.CustomUser', on_delete=models.CASCADE, related_name='chat_sessions')
+    generated_content = models.ForeignKey(
+        'content_generation.GeneratedContent',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='chat_sessions',
+    )
+    # content_generation.keys.content_hash of the lesson
+    content_hash = models.CharField(max_length=64, blank=True, default="", db_index=True)
+    # The uploaded lesson, when it is not a GeneratedContent
+    content = models.JSONField(null=True, blank=True)
+    # Summary of the messages no longer sent verbatim
+    summary = models.TextField(blank=True, default="")
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Chat Session"
+        verbose_name_plural = "Chat Sessions"
+        ordering = ['-updated_at']
+
+    def lesson(self):
+        """The bound lesson (loads the GeneratedContent's blob unless it was selected)"""
+        if self.generated_content_id is not None:
+            return self.generated_content.blob.content
+        return self.content
+
+    def __str__(self):
+        return f"Chat {self.pk} for {self.user}"
+
+
+class ChatMessage(models.Model):
+    """
+    A question or answer in a chat session
+    """
+    USER = 'user'
+    ASSISTANT = 'assistant'
+    ROLE_CHOICES = [
+        (USER, 'User'),
+        (ASSISTANT, 'Assistant'),
+    ]
+
+    session = models.ForeignKey(ChatSession, on_delete=models.CASCADE, related_name='messages')
+    role = models.CharField(max_length=10, choices=ROLE_CHOICES)
+    text = models.TextField()
+    # Set once the message is part of the session summary
+    summarized = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Chat Message"
+        verbose_name_plural = "Chat Messages"
+        ordering = ['created_at', 'id']
+
+    def __str__(self):
+        return f"{self.role}: {self.text[:40]}"
@@ -0,0 +1,178 @@
+import json
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, List, Optional
+
+import numpy as np
+from django.conf import settings
+
+from content_generation.keys import content_hash
+from content_generation.question_generation import estimate_tokens
+from core.metrics import metrics
+
+# Passages longer than this many words are split into overlapping windows
+PASSAGE_WORDS = 150
+PASSAGE_OVERLAP = 30
+
+_WORD = re.compile(r"\w+")
+
+_STOPWORDS = frozenset(
+    "a an the is are was were be been of in on at to for by with and or as it its this that these those "
+    "what which who whom how why when where do does did can could i you we they he she my your".split()
+)
+
+
+def _terms(text: str) -> List[str]:
+    return [word for word in _WORD.findall(text.lower()) if word not in _STOPWORDS]
+
+
+def _windows(text: str) -> List[str]:
+    words = text.split()
+    if len(words) <= PASSAGE_WORDS:
+        return [text]
+    step = PASSAGE_WORDS - PASSAGE_OVERLAP
+    return [" ".join(words[start:start + PASSAGE_WORDS]) for start in range(0, len(words) - PASSAGE_OVERLAP, step)]
+
+
+def _section_passages(section: Any) -> List[str]:
+    if not isinstance(section, dict):
+        return _windows(str(section))
+    title = section.get("title", "")
+    passages = [f"Section: {title}\n{window}" for window in _windows(str(section.get("content", "")))]
+    key_points = section.get("key_points") or []
+    if key_points:
+        passages.append(f"Section: {title}\nKey points:\n" + "\n".join(f"- {point}" for point in key_points))
+    return passages
+
+
+def split_passages(content: Any) -> List[str]:
+    """
+    Split a lesson into passages: the topic and summary, then every
+    section's content (in windows for long sections) and key points.
+    Content that is not a lesson is split on blank lines.
+    """
+    lesson = content
+    if isinstance(content, str):
+        try:
+            lesson = json.loads(content)
+        except json.JSONDecodeError:
+            lesson = None
+
+    if isinstance(lesson, dict) and isinstance(lesson.get("sections"), list):
+        passages = [f"Lesson: {lesson.get('topic', '')}\n{lesson.get('summary', '')}"]
+        for section in lesson["sections"]:
+            passages.extend(_section_passages(section))
+        return passages
+
+    text = content if isinstance(content, str) else json.dumps(content, ensure_ascii=False)
+    paragraphs = [paragraph.strip() for paragraph in re.split(r"\n\s*\n", text) if paragraph.strip()]
+    return [window for paragraph in paragraphs for window in _windows(paragraph)]
+
+
+class BM25Index:
+    """
+    Okapi BM25 index over the passages of one lesson.
+
+    Term frequencies are held in a dense passages x vocabulary matrix (a
+    lesson has tens of passages and a few thousand distinct terms), so a
+    question is scored against every passage with a few vectorized NumPy
+    operations.
+    """
+
+    def __init__(self, passages: List[str], k1: float = 1.5, b: float = 0.75):
+        self.passages = passages
+        tokenized = [_terms(passage) for passage in passages]
+        self.vocabulary = {}
+        for terms in tokenized:
+            for term in terms:
+                self.vocabulary.setdefault(term, len(self.vocabulary))
+
+        frequencies = np.zeros((len(passages), max(1, len(self.vocabulary))), dtype=np.float32)
+        for row, terms in enumerate(tokenized):
+            for term in terms:
+                frequencies[row, self.vocabulary[term]] += 1
+
+        lengths = frequencies.sum(axis=1)
+        average_length = lengths.mean() if len(passages) else 0.0
+        document_frequency = np.count_nonzero(frequencies, axis=0)
+        self.idf = np.log1p((len(passages) - document_frequency + 0.5) / (document_frequency + 0.5))
+        # Saturated term frequencies: tf * (k1 + 1) / (tf + k1 * (1 - b + b * length / average length))
+        norms = k1 * (1 - b + b * lengths / max(average_length, 1e-9))
+        self.weights = frequencies * (k1 + 1) / (frequencies + norms[:, None])
+
+    def scores(self, question: str) -> np.ndarray:
+        columns = [self.vocabulary[term] for term in set(_terms(question)) if term in self.vocabulary]
+        if not columns:
+            return np.zeros(len(self.passages), dtype=np.float32)
+        return self.weights[:, columns] @ self.idf[columns]
+
+    def top_k(self, question: str, k: int) -> List[str]:
+        """
+        The k passages most relevant to the question, in lesson order. The
+        lesson overview (first passage) is used when nothing matches.
+        """
+        scores = self.scores(question)
+        ranked = [int(i) for i in np.argsort(-scores, kind="stable")[:k] if scores[i] > 0]
+        if not ranked:
+            ranked = [0]
+        return [self.passages[i] for i in sorted(ranked)]
+
+
+class IndexCache:
+    """
+    LRU cache of BM25 indexes keyed by lesson content hash, so every
+    question about the same lesson reuses its index. Holds at most max_size
+    indexes (the CHAT_RETRIEVAL_INDEX_CACHE_SIZE setting by default).
+    """
+
+    def __init__(self, max_size: Optional[int] = None):
+        self.max_size = settings.CHAT_RETRIEVAL_INDEX_CACHE_SIZE if max_size is None else max_size
+        self._lock = threading.Lock()
+        self._indexes = OrderedDict()
+
+    def get(self, content: Any) -> BM25Index:
+        key = content_hash(content)
+        with self._lock:
+            index = self._indexes.get(key)
+            if index is not None:
+                self._indexes.move_to_end(key)
+                metrics.incr("chat_retrieval.index_hits")
+                return index
+
+        metrics.incr("chat_retrieval.index_misses")
+        index = BM25Index(split_passages(content))
+        with self._lock:
+            self._indexes[key] = index
+            while len(self._indexes) > self.max_size:
+                self._indexes.popitem(last=False)
+        return index
+
+
+index_cache = IndexCache()
+
+
+def retrieve_context(question: str, content: Any, k: Optional[int] = None) -> Optional[str]:
+    """
+    Reference text for a question: the top k passages of the content
+    (CHAT_RETRIEVAL_TOP_K by default), or the whole content when it is at
+    most CHAT_RETRIEVAL_MIN_TOKENS long. Counts the estimated prompt tokens
+    saved compared to sending the whole content.
+    """
+    if content is None:
+        return None
+    if k is None:
+        k = settings.CHAT_RETRIEVAL_TOP_K
+    full_text = content if isinstance(content, str) else json.dumps(content, ensure_ascii=False)
+    full_tokens = estimate_tokens(full_text)
+    if full_tokens <= settings.CHAT_RETRIEVAL_MIN_TOKENS:
+        metrics.incr("chat_retrieval.full_content")
+        return full_text
+
+    context = "\n\n".join(index_cache.get(content).top_k(question, k))
+    sent_tokens = estimate_tokens(context)
+    metrics.incr("chat_retrieval.retrieved")
+    metrics.incr("chat_retrieval.content_tokens", full_tokens)
+    metrics.incr("chat_retrieval.sent_tokens", sent_tokens)
+    metrics.incr("chat_retrieval.tokens_saved", max(0, full_tokens - sent_tokens))
+    return context
@@ -0,0 +1,103 @@
+import logging
+from typing import List, Optional, Tuple
+
+from django.conf import settings
+
+from content_generation.keys import content_hash
+from content_generation.models import GeneratedContent
+from core.metrics import metrics
+from .models import ChatMessage, ChatSession
+
+logger = logging.getLogger(__name__)
+
+
+class UnknownLesson(Exception):
+    """Raised when a chat session refers to a lesson the server does not have"""
+
+
+async def create_session(user, content_id=None, content=None, lesson_hash=None) -> ChatSession:
+    """
+    Start a chat session bound to a lesson: one of the user's
+    GeneratedContent (content_id), uploaded content, or the hash of content
+    the user uploaded before (so it does not have to be uploaded again).
+    """
+    if content_id is not None:
+        try:
+            link = await GeneratedContent.objects.select_related('blob').aget(pk=content_id, user=user)
+        except (GeneratedContent.DoesNotExist, ValueError):
+            raise UnknownLesson(f"Content {content_id} not found")
+        return await ChatSession.objects.acreate(
+            user=user, generated_content=link, content_hash=content_hash(link.blob.content)
+        )
+
+    if content is None and lesson_hash:
+        # Only the user's own uploads are reused, a hash must not reveal another user's content
+        known = await ChatSession.objects.filter(
+            user=user, content_hash=lesson_hash, content__isnull=False
+        ).afirst()
+        if known is None:
+            raise UnknownLesson("No content with this hash was uploaded, send the content instead")
+        metrics.incr("chat_sessions.content_reused")
+        content = known.content
+
+    if content is None:
+        raise UnknownLesson("A content_id, content or content_hash is required")
+    return await ChatSession.objects.acreate(user=user, content=content, content_hash=content_hash(content))
+
+
+async def get_session(session_id, user) -> Optional[ChatSession]:
+    """The user's chat session with its lesson loaded, or None"""
+    try:
+        return await ChatSession.objects.select_related('generated_content__blob').aget(pk=session_id, user=user)
+    except (ChatSession.DoesNotExist, ValueError):
+        return None
+
+
+async def recent_history(session: ChatSession) -> List[Tuple[str, str]]:
+    """
+    (role, text) of the latest CHAT_HISTORY_MESSAGES messages not folded
+    into the summary yet, oldest first. Capped even when summaries fail, so
+    the prompt stays bounded; older pending messages wait for the next fold.
+    """
+    latest = [
+        (message.role, message.text)
+        async for message in session.messages.filter(summarized=False).order_by('-created_at', '-id')[
+            :settings.CHAT_HISTORY_MESSAGES
+        ]
+    ]
+    return latest[::-1]
+
+
+async def record_turn(session: ChatSession, question: str, answer: str, agent) -> None:
+    """
+    Store a question and its answer, then fold the oldest messages into the
+    session summary once more than CHAT_HISTORY_MESSAGES + CHAT_SUMMARY_BATCH
+    are pending. A failed summary keeps the messages for the next turn,
+    which retries the fold; at most CHAT_SUMMARY_MAX_FOLD messages are
+    folded per call.
+    """
+    await ChatMessage.objects.abulk_create([
+        ChatMessage(session=session, role=ChatMessage.USER, text=question),
+        ChatMessage(session=session, role=ChatMessage.ASSISTANT, text=answer),
+    ])
+
+    pending = [message async for message in session.messages.filter(summarized=False)]
+    history_messages = settings.CHAT_HISTORY_MESSAGES
+    if len(pending) <= history_messages + settings.CHAT_SUMMARY_BATCH:
+        await session.asave(update_fields=["updated_at"])
+        return
+
+    folded = pending[: min(len(pending) - history_messages, settings.CHAT_SUMMARY_MAX_FOLD)]
+    try:
+        session.summary = await agent.summarize_history(
+            session.summary, [(message.role, message.text) for message in folded]
+        )
+    except Exception as e:
+        metrics.incr("chat_sessions.summary_failures")
+        logger.warning(f"Could not summarize chat session {session.pk}: {str(e)}")
+        await session.asave(update_fields=["updated_at"])
+        return
+
+    await session.asave(update_fields=["summary", "updated_at"])
+    await ChatMessage.objects.filter(pk__in=[message.pk for message in folded]).aupdate(summarized=True)
+    metrics.incr("chat_sessions.summaries")
@@ -1,3 +1,189 @@
-from django.test import TestCase
+import json
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from content_generation.keys import content_hash
+from user_profiles.models import CustomUser
+from .answer_cache import AnswerCache
+from .models import ChatMessage, ChatSession
+from .retrieval import PASSAGE_WORDS, BM25Index, retrieve_context, split_passages
+from .sessions import UnknownLesson, create_session, recent_history, record_turn
+
+LESSON = {"topic": "Optics", "summary": "Light and lenses", "sections": []}
+
+
+class CreateSessionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = CustomUser.objects.create_user(username="owner", password="pass")
+        cls.other = CustomUser.objects.create_user(username="other", password="pass")
+
+    async def test_content_hash_reuses_the_users_own_upload(self):
+        first = await create_session(self.owner, content=LESSON)
+        second = await create_session(self.owner, lesson_hash=content_hash(LESSON))
+        self.assertEqual(second.content, LESSON)
+        self.assertEqual(second.content_hash, first.content_hash)
+
+    async def test_content_hash_does_not_reveal_another_users_upload(self):
+        await create_session(self.owner, content=LESSON)
+        with self.assertRaises(UnknownLesson):
+            await create_session(self.other, lesson_hash=content_hash(LESSON))
+        self.assertFalse(await ChatSession.objects.filter(user=self.other).aexists())
+
+
+class StubSummaryAgent:
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.folded = []
+
+    async def summarize_history(self, summary, history):
+        if self.fail:
+            raise RuntimeError("model unavailable")
+        self.folded.append(len(history))
+        return f"{summary} +{len(history)}".strip()
+
+
+@override_settings(CHAT_HISTORY_MESSAGES=6, CHAT_SUMMARY_BATCH=4, CHAT_SUMMARY_MAX_FOLD=8)
+class ChatHistoryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(username="student", password="pass")
+
+    async def _chat(self, session, agent, turns, start=0):
+        for i in range(start, start + turns):
+            await record_turn(session, f"question {i}", f"answer {i}", agent)
+
+    async def test_history_is_capped_when_summaries_fail(self):
+        session = await create_session(self.user, content=LESSON)
+        await self._chat(session, StubSummaryAgent(fail=True), 20)
+        history = await recent_history(session)
+        self.assertEqual(len(history), settings.CHAT_HISTORY_MESSAGES)
+        self.assertEqual(history[-2:], [("user", "question 19"), ("assistant", "answer 19")])
+        self.assertEqual(await session.messages.filter(summarized=True).acount(), 0)
+
+    async def test_failed_folds_are_retried_in_bounded_batches(self):
+        session = await create_session(self.user, content=LESSON)
+        await self._chat(session, StubSummaryAgent(fail=True), 20)
+        agent = StubSummaryAgent()
+        await self._chat(session, agent, 5, start=20)
+        self.assertTrue(agent.folded)
+        self.assertLessEqual(max(agent.folded), settings.CHAT_SUMMARY_MAX_FOLD)
+        pending = await ChatMessage.objects.filter(session=session, summarized=False).acount()
+        # Caught up: only what a regular batch leaves pending
+        self.assertLessEqual(pending, settings.CHAT_HISTORY_MESSAGES + settings.CHAT_SUMMARY_BATCH)
+        self.assertEqual(len(await recent_history(session)), settings.CHAT_HISTORY_MESSAGES)
+
+
+class AnswerCacheTests(SimpleTestCase):
+    def test_questions_are_matched_ignoring_case_and_punctuation(self):
+        cache = AnswerCache(similarity=None)
+        cache.put("What is refraction?", "lesson", {"answer": "Bending of light"})
+        self.assertEqual(cache.get("what is  REFRACTION", "lesson"), {"answer": "Bending of light"})
+        self.assertIsNone(cache.get("What is refraction?", "other lesson"))
+
+    def test_entries_expire_after_the_ttl(self):
+        cache = AnswerCache(ttl=60, similarity=None)
+        with mock.patch("chatbot.answer_cache.time.monotonic", return_value=1000.0):
+            cache.put("What is refraction?", "lesson", {"answer": "Bending of light"})
+        with mock.patch("chatbot.answer_cache.time.monotonic", return_value=1059.0):
+            self.assertIsNotNone(cache.get("What is refraction?", "lesson"))
+        with mock.patch("chatbot.answer_cache.time.monotonic", return_value=1060.0):
+            self.assertIsNone(cache.get("What is refraction?", "lesson"))
+        self.assertEqual(cache.stats()["entries"], 0)
+
+    def test_least_recently_used_entries_are_evicted(self):
+        cache = AnswerCache(max_entries=2, similarity=None)
+        cache.put("first", "lesson", {"answer": "1"})
+        cache.put("second", "lesson", {"answer": "2"})
+        cache.get("first", "lesson")
+        cache.put("third", "lesson", {"answer": "3"})
+        self.assertIsNone(cache.get("second", "lesson"))
+        self.assertIsNotNone(cache.get("first", "lesson"))
+        self.assertIsNotNone(cache.get("third", "lesson"))
+
+    def test_purge_removes_one_lesson(self):
+        cache = AnswerCache(similarity=None)
+        cache.put("first", "optics", {"answer": "1"})
+        cache.put("second", "optics", {"answer": "2"})
+        cache.put("first", "biology", {"answer": "3"})
+        self.assertEqual(cache.purge("optics"), 2)
+        self.assertEqual(cache.purge("optics"), 0)
+        self.assertIsNone(cache.get("first", "optics"))
+        self.assertEqual(cache.get("first", "biology"), {"answer": "3"})
+        self.assertEqual(cache.stats()["lessons"], 1)
+
+    def test_paraphrases_hit_above_the_similarity_threshold(self):
+        cache = AnswerCache(similarity=0.85)
+        cache.put("What is the focal length of a convex lens?", "lesson", {"answer": "f"})
+        cache.put("What is refraction?", "lesson", {"answer": "Bending of light"})
+        self.assertEqual(cache.get("Define focal length for convex lenses", "lesson"), {"answer": "f"})
+        self.assertEqual(cache.get("Please explain refraction", "lesson"), {"answer": "Bending of light"})
+        # Different terms, and the same question about another lesson, miss
+        self.assertIsNone(cache.get("What is reflection?", "lesson"))
+        self.assertIsNone(cache.get("What is a concave lens?", "lesson"))
+        self.assertIsNone(cache.get("Please explain refraction", "other lesson"))
+
+    @override_settings(CHAT_ANSWER_CACHE_MAX_ENTRIES=3, CHAT_ANSWER_CACHE_TTL=10)
+    def test_limits_default_to_the_settings(self):
+        stats = AnswerCache().stats()
+        self.assertEqual((stats["max_entries"], stats["ttl_seconds"], stats["similarity_threshold"]), (3, 10, None))
+
+    def test_paraphrase_matching_can_be_disabled(self):
+        cache = AnswerCache(similarity=None)
+        cache.put("What is the focal length of a convex lens?", "lesson", {"answer": "f"})
+        self.assertIsNone(cache.get("Define focal length for convex lenses", "lesson"))
+
+
+RETRIEVAL_LESSON = {
+    "topic": "Light",
+    "summary": "How light travels and interacts with matter",
+    "sections": [
+        {"title": "Reflection", "content": "Light bounces off a mirror. The angle of incidence equals the angle of reflection.",
+         "key_points": ["Plane mirrors form virtual images"]},
+        {"title": "Refraction", "content": "Light bends when it passes from air into water or glass, because its speed changes.",
+         "key_points": ["Snell's law relates the angles and refractive indices"]},
+        {"title": "Dispersion", "content": "A prism splits white light into a spectrum of colours."},
+    ],
+}
+
+
+class RetrievalTests(SimpleTestCase):
+    def test_lessons_are_split_into_overview_sections_and_key_points(self):
+        passages = split_passages(RETRIEVAL_LESSON)
+        self.assertEqual(len(passages), 6)
+        self.assertTrue(passages[0].startswith("Lesson: Light"))
+        self.assertTrue(passages[2].startswith("Section: Reflection\nKey points:"))
+        # Lesson JSON sent as a string is split the same way
+        self.assertEqual(split_passages(json.dumps(RETRIEVAL_LESSON)), passages)
+
+    def test_long_sections_are_windowed_and_plain_text_split_on_blank_lines(self):
+        long_section = {"title": "Long", "content": " ".join(f"word{i}" for i in range(PASSAGE_WORDS * 2))}
+        self.assertGreater(len(split_passages({"topic": "t", "summary": "s", "sections": [long_section]})), 2)
+        self.assertEqual(split_passages("First paragraph.\n\n  \nSecond paragraph."), ["First paragraph.", "Second paragraph."])
+
+    def test_the_relevant_section_ranks_first(self):
+        index = BM25Index(split_passages(RETRIEVAL_LESSON))
+        scores = index.scores("Why does light bend in water?")
+        self.assertEqual(int(scores.argmax()), 3)
+        self.assertEqual(index.top_k("Why does light bend in water?", 1)[0].split("\n")[0], "Section: Refraction")
+
+    def test_passages_come_back_in_lesson_order(self):
+        passages = split_passages(RETRIEVAL_LESSON)
+        top = BM25Index(passages).top_k("prism spectrum and the mirror angle of reflection", 3)
+        self.assertEqual(top, sorted(top, key=passages.index))
+        self.assertIn(passages[5], top)
+        self.assertIn(passages[1], top)
+
+    def test_the_overview_is_the_fallback(self):
+        passages = split_passages(RETRIEVAL_LESSON)
+        self.assertEqual(BM25Index(passages).top_k("photosynthesis chlorophyll", 3), [passages[0]])
+
+    def test_short_content_is_sent_whole(self):
+        self.assertEqual(retrieve_context("What is refraction?", RETRIEVAL_LESSON), json.dumps(RETRIEVAL_LESSON))
+
+    @override_settings(CHAT_RETRIEVAL_MIN_TOKENS=0, CHAT_RETRIEVAL_TOP_K=1)
+    def test_longer_content_is_retrieved(self):
+        context = retrieve_context("Why does light bend in water?", RETRIEVAL_LESSON)
+        self.assertEqual(context, split_passages(RETRIEVAL_LESSON)[3])
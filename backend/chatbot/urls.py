@@ -1,9 +1,13 @@
 from django.urls import path
-from .views import chat_response, transcribe_audio
+from .views import answer_cache_view, chat_response, chat_response_stream, chat_session_detail, create_chat_session, transcribe_audio
 
 app_name = 'chatbot'
 
 urlpatterns = [
     path('chatbot/', chat_response, name='chat_response'),
-    path('transcribe/', transcribe_audio),
+    path('chatbot/stream/', chat_response_stream, name='chat_response_stream'),
+    path('chatbot/sessions/', create_chat_session, name='create_chat_session'),
+    path('chatbot/sessions/<int:session_id>/', chat_session_detail, name='chat_session_detail'),
+    path('chatbot/answer-cache/', answer_cache_view, name='answer_cache'),
+    path('transcribe/', transcribe_audio, name='transcribe_audio'),
 ]
\ No newline at end of file
@@ -1,27 +1,89 @@
-import os, logging
+import os, sys, logging
 import google.generativeai as genai
 from pydantic_ai import Agent
-from pydantic_ai.providers.google_gla import GoogleGLAProvider
-from pydantic_ai.models.gemini import GeminiModel
 import json
 if __name__ == "__main__":
+    sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
     from schemas import ChatResponse
+    from retrieval import retrieve_context
+    from answer_cache import answer_cache
 else:
     from .schemas import ChatResponse
+    from .retrieval import retrieve_context
+    from .answer_cache import answer_cache
+from content_generation.keys import content_hash
+from core.llm import llm_clients
 from dotenv import load_dotenv
 import asyncio
 
 # Load environment variables
 load_dotenv()
 
+# Static system prompt shared by every request; the question and the
+# reference content are sent as the user message
+CHAT_SYSTEM_PROMPT = (
+    "You are a helpful assistant that provides accurate information. "
+    "Answer the user's question. When reference content is provided, use it for reference."
+)
+
+chat_agent = Agent(
+    result_type=ChatResponse,
+    system_prompt=CHAT_SYSTEM_PROMPT,
+)
+
+# Streamed answers are requested as plain text: Gemini returns a structured
+# result as a single function call once generation ends, while text arrives
+# as it is generated
+chat_stream_agent = Agent(
+    result_type=str,
+    system_prompt=CHAT_SYSTEM_PROMPT,
+)
+
+SUMMARY_SYSTEM_PROMPT = (
+    "You maintain the running summary of a conversation between a student and a tutor. "
+    "Given the current summary and new messages, return an updated summary of at most "
+    "120 words that keeps the student's questions, the facts explained and anything still unclear."
+)
+
+summary_agent = Agent(
+    result_type=str,
+    system_prompt=SUMMARY_SYSTEM_PROMPT,
+)
+
+
+# Seconds of model output grouped into one streamed chunk
+STREAM_DEBOUNCE = 0.05
+
+
+def format_history(history) -> str:
+    """
+    Render (role, text) messages as a transcript
+    """
+    return "\n".join(f"{'Student' if role == 'user' else 'Tutor'}: {text}" for role, text in history)
+
+
+def chat_prompt(question: str, content: str = None, history=None, summary: str = None) -> str:
+    """
+    Build the per-request user message for the chat agent.
+    history is a list of (role, text) of the latest messages of a chat
+    session, summary covers the messages before them.
+    """
+    if content is None and not history and not summary:
+        return question
+    parts = [f"Question: {question}"]
+    if summary:
+        parts.append(f"Summary of the conversation so far:\n{summary}")
+    if history:
+        parts.append(f"Latest messages:\n{format_history(history)}")
+    if content is not None:
+        parts.append(f"Reference content:\n{content}")
+    return "\n\n".join(parts)
+
+
 class ChatBotAgent():
     def __init__(self):
-        self.model = GeminiModel(
-            "gemini-2.0-flash",
-            provider=GoogleGLAProvider(
-                api_key=os.getenv("GEMINI_API_KEY"),
-            ),
-        )
+        self.model_name = "gemini-2.0-flash"
         self.headers = {
             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
         }
@@ -30,24 +92,95 @@ class ChatBotAgent():
             self,
             question: str,
             content: str = None,
+            history=None,
+            summary: str = None,
     ) -> ChatResponse:
         """
         Generates a response to a question based on the provided content.
         If content is not provided, it will generate a response based on the question alone.
+        Only the passages of the content most relevant to the question are sent.
+        In a chat session, history holds the latest (role, text) messages and
+        summary the conversation before them.
+
+        Questions asked without conversation context are answered from the
+        answer cache when the same question was asked about the same content.
         """
-        agent = Agent(
-            self.model,
-            result_type=ChatResponse,
-            system_prompt=(
-                f"You are a helpful assistant that provides accurate information. "
-                f"Answer the following question: {question} "
-                f"Use the provided content for reference: {content}"
-            ),
+        cache_key, cached = self._cached_answer(question, content, history, summary)
+        if cached is not None:
+            return cached
+
+        response = await chat_agent.run(
+            self._prompt(question, content, history, summary),
+            model=llm_clients.gemini_model(self.model_name),
         )
-        
-        response = await agent.run(question)
+        if cache_key is not None:
+            answer_cache.put(question, cache_key, response.data.model_dump(mode="json"))
         return response.data
 
+    async def stream_response(
+            self,
+            question: str,
+            content: str = None,
+            history=None,
+            summary: str = None,
+    ):
+        """
+        Streams a response to a question, taking the same arguments as generate_response.
+
+        Yields ("delta", text) events with every new piece of the answer as
+        the model produces it, then ("done", ChatResponse) with the complete
+        validated response. Raises if the answer is empty or invalid, so the
+        stream always ends with a done event or an exception.
+        """
+        cache_key, cached = self._cached_answer(question, content, history, summary)
+        if cached is not None:
+            yield "delta", cached.answer
+            yield "done", cached
+            return
+
+        parts = []
+        async with chat_stream_agent.run_stream(
+            self._prompt(question, content, history, summary),
+            model=llm_clients.gemini_model(self.model_name),
+        ) as result:
+            async for text in result.stream_text(delta=True, debounce_by=STREAM_DEBOUNCE):
+                if text:
+                    parts.append(text)
+                    yield "delta", text
+
+        answer = "".join(parts).strip()
+        if not answer:
+            raise ValueError("The model returned an empty answer")
+        response = ChatResponse.model_validate({"answer": answer})
+        if cache_key is not None:
+            answer_cache.put(question, cache_key, response.model_dump(mode="json"))
+        yield "done", response
+
+    def _cached_answer(self, question, content, history, summary):
+        # Questions asked without conversation context are answered from the
+        # answer cache when the same question was asked about the same content
+        if history or summary:
+            return None, None
+        cache_key = content_hash(content) if content is not None else ""
+        cached = answer_cache.get(question, cache_key)
+        return cache_key, ChatResponse(**cached) if cached is not None else None
+
+    def _prompt(self, question, content, history, summary) -> str:
+        # Follow-ups ("explain that again") are retrieved together with the previous question
+        query = question
+        previous_questions = [text for role, text in history or [] if role == "user"]
+        if previous_questions:
+            query = f"{previous_questions[-1]} {question}"
+        return chat_prompt(question, retrieve_context(query, content), history, summary)
+
+    async def summarize_history(self, summary: str, history) -> str:
+        """
+        Fold (role, text) messages into the running summary of a chat session
+        """
+        prompt = f"Current summary:\n{summary or '(none)'}\n\nNew messages:\n{format_history(history)}"
+        response = await summary_agent.run(prompt, model=llm_clients.gemini_model(self.model_name))
+        return response.data.strip()
+
 
 if __name__ == "__main__":
     async def main():
@@ -2,10 +2,22 @@ from django.shortcuts import render
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, renderer_classes
+from rest_framework.renderers import JSONRenderer
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from adrf.decorators import api_view as drf_api_view
 # from django.views.decorators.csrf import csrf_exempt
-from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
 from .utils import ChatBotAgent
+from .answer_cache import answer_cache
+from .audio import audio_duration, spool_uploads, upload_too_large
+from .sessions import UnknownLesson, create_session, get_session, recent_history, record_turn
+from core.executors import ExecutorSaturated, deepgram_executor
+from core.metrics import metrics
+from content_generation.keys import content_hash
+from content_generation.models import GeneratedContent
+from content_generation.streaming import EventStreamRenderer, sse_event
 import asyncio
 import json
 import requests
@@ -18,66 +30,66 @@ load_dotenv()
 
 logger = logging.getLogger(__name__)
 
-# Helper function to get or create an event loop safely
-def get_or_create_eventloop():
-    try:
-        return asyncio.get_event_loop()
-    except RuntimeError as ex:
-        if "There is no current event loop in thread" in str(ex):
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            return loop
-        raise
-
-@api_view(['POST'])
+async def _parse_chat_request(request):
+    """
+    Extract the question and its context from a chat request.
+    Returns ((question, content, session, history, summary), None) or (None, error_response).
+    """
+    data = request.data
+    question = data.get('question', '')
+    content = data.get('content', None)
+    session_id = data.get('session_id')
+    
+    if not question:
+        return None, Response(
+            {"error": "Question is required"}, 
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    session = history = summary = None
+    if session_id is not None:
+        session = await get_session(session_id, request.user)
+        if session is None:
+            return None, Response({"error": "Chat session not found"}, status=status.HTTP_404_NOT_FOUND)
+        content = session.lesson()
+        history = await recent_history(session)
+        summary = session.summary
+    return (question, content, session, history, summary), None
+
+@drf_api_view(['POST'])
 @permission_classes([IsAuthenticated])
-def chat_response(request):
+async def chat_response(request):
     """
     Process a chat request and generate a response.
     
     Expected POST data:
     {
         "question": "The user's question",
-        "content": "Optional content for context" (optional)
+        "content": "Optional content for context" (optional),
+        "session_id": 3 (optional, see chatbot/sessions/; the lesson and the
+                         conversation are taken from the session, so
+                         content is not needed)
     }
     """
     try:
-        # Get data from request
-        data = request.data
-        question = data.get('question', '')
-        content = data.get('content', None)
-        
-        if not question:
-            return Response(
-                {"error": "Question is required"}, 
-                status=status.HTTP_400_BAD_REQUEST
-            )
+        chat_request, error_response = await _parse_chat_request(request)
+        if error_response is not None:
+            return error_response
+        question, content, session, history, summary = chat_request
         
         # Create an instance of the ChatBotAgent
         agent = ChatBotAgent()
         
-        # Try to use the existing event loop safely
-        try:
-            # Get the current event loop or create a new one if needed
-            loop = get_or_create_eventloop()
-            chat_response = loop.run_until_complete(
-                agent.generate_response(question=question, content=content)
-            )
-        except Exception as loop_error:
-            # If there's an event loop error, create a new one and try again
-            if "Event loop is closed" in str(loop_error):
-                logger.info("Event loop was closed. Creating a new one...")
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
-                chat_response = loop.run_until_complete(
-                    agent.generate_response(question=question, content=content)
-                )
-            else:
-                # Re-raise if it's not an event loop issue
-                raise
+        chat_response = await agent.generate_response(
+            question=question, content=content, history=history, summary=summary
+        )
 
         # Convert the Pydantic model to a dictionary
-        response_data = json.loads(chat_response.json())
+        response_data = chat_response.model_dump(mode="json")
+
+        if session is not None:
+            await record_turn(session, question, chat_response.answer, agent)
+            response_data["session_id"] = session.id
         
         return Response(response_data, status=status.HTTP_200_OK)
         
@@ -88,46 +100,210 @@ def chat_response(request):
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
         )
 
+async def _chat_event_stream(agent, question, content, session, history, summary):
+    """
+    Yield server-sent events for a chat answer while it is being generated
+    """
+    try:
+        async for event, data in agent.stream_response(
+            question=question, content=content, history=history, summary=summary
+        ):
+            if event == "delta":
+                yield sse_event("delta", {"text": data})
+                continue
+
+            response_data = data.model_dump(mode="json")
+            if session is not None:
+                await record_turn(session, question, data.answer, agent)
+                response_data["session_id"] = session.id
+            yield sse_event("done", response_data)
+            return
+        # Every stream ends with done or error, clients wait for one of them
+        yield sse_event("error", {"error": "Failed to generate response: the answer was incomplete"})
+    except Exception as e:
+        logger.exception(f"Error streaming chat response: {str(e)}")
+        yield sse_event("error", {"error": f"Failed to generate response: {str(e)}"})
+
+@drf_api_view(['POST'])
+@permission_classes([IsAuthenticated])
+@renderer_classes([JSONRenderer, EventStreamRenderer])
+async def chat_response_stream(request):
+    """
+    Stream a chat answer as server-sent events while the model writes it.
+    Serve the app through core.asgi so events are flushed as they are produced.
+    
+    Expects the same POST data as chat_response. Emits:
+        delta: {"text": "..."} with every new piece of the answer
+        done:  the complete ChatResponse (with session_id in a session)
+        error: {"error": "..."} if generation fails
+    """
+    chat_request, error_response = await _parse_chat_request(request)
+    if error_response is not None:
+        return error_response
+
+    response = StreamingHttpResponse(
+        _chat_event_stream(ChatBotAgent(), *chat_request),
+        content_type="text/event-stream",
+    )
+    response["Cache-Control"] = "no-cache"
+    # Disable proxy buffering so events reach the client as they are produced
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+@drf_api_view(['POST'])
+@permission_classes([IsAuthenticated])
+async def create_chat_session(request):
+    """
+    Start a chat session about a lesson, so follow-up questions only send
+    the question and the session_id.
+    
+    Expected POST data (one of):
+    {
+        "content_id": 12, (one of the user's generated contents)
+        "content": {...}, (the lesson itself)
+        "content_hash": "..." (hash of a lesson the user uploaded before)
+    }
+    """
+    data = request.data
+    try:
+        session = await create_session(
+            request.user,
+            content_id=data.get('content_id'),
+            content=data.get('content'),
+            lesson_hash=data.get('content_hash'),
+        )
+    except UnknownLesson as e:
+        return Response({"error": str(e)}, status=status.HTTP_404_NOT_FOUND)
+    except Exception as e:
+        logger.exception(f"Error creating chat session: {str(e)}")
+        return Response(
+            {"error": f"Failed to create chat session: {str(e)}"},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+    return Response(
+        {"session_id": session.id, "content_hash": session.content_hash},
+        status=status.HTTP_201_CREATED
+    )
+
+@drf_api_view(['GET'])
+@permission_classes([IsAuthenticated])
+async def chat_session_detail(request, session_id):
+    """
+    Return the summary and the latest messages of a chat session.
+    """
+    session = await get_session(session_id, request.user)
+    if session is None:
+        return Response({"error": "Chat session not found"}, status=status.HTTP_404_NOT_FOUND)
+    history = await recent_history(session)
+    return Response(
+        {
+            "session_id": session.id,
+            "content_hash": session.content_hash,
+            "summary": session.summary,
+            "messages": [{"role": role, "text": text} for role, text in history],
+        },
+        status=status.HTTP_200_OK
+    )
+
+@api_view(['GET', 'DELETE'])
+@permission_classes([IsAdminUser])
+def answer_cache_view(request):
+    """
+    Inspect or purge the chatbot answer cache of this worker (staff only).
+    
+    GET returns its size and hit rate. DELETE purges the answers about one
+    lesson, given as ?content_hash=... or ?content_id=... (a GeneratedContent),
+    or every answer with ?all=true.
+    """
+    if request.method == 'GET':
+        return Response(answer_cache.stats(), status=status.HTTP_200_OK)
+
+    params = request.query_params
+    if params.get('all') == 'true':
+        return Response({"purged": answer_cache.clear()}, status=status.HTTP_200_OK)
+
+    lesson_hash = params.get('content_hash')
+    content_id = params.get('content_id')
+    if not lesson_hash and content_id:
+        try:
+            link = GeneratedContent.objects.select_related('blob').get(pk=content_id)
+        except (GeneratedContent.DoesNotExist, ValueError):
+            return Response({"error": "Content not found"}, status=status.HTTP_404_NOT_FOUND)
+        lesson_hash = content_hash(link.blob.content)
+    if not lesson_hash:
+        return Response(
+            {"error": "content_hash, content_id or all=true is required"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    return Response(
+        {"content_hash": lesson_hash, "purged": answer_cache.purge(lesson_hash)},
+        status=status.HTTP_200_OK
+    )
+
 # @csrf_exempt
-@api_view(['POST'])
+@spool_uploads
+@drf_api_view(['POST'])
 @permission_classes([AllowAny])
-def transcribe_audio(request):
+async def transcribe_audio(request):
     """
     Transcribe an audio file to text using Deepgram API.
     
+    The upload is spooled to a temporary file and streamed to Deepgram from
+    disk, it is never held in memory. Files over TRANSCRIBE_MAX_UPLOAD_BYTES
+    are rejected with 413, audio longer than TRANSCRIBE_MAX_DURATION_SECONDS
+    with 400.
+    
     To use with Postman:
     1. Use POST request
     2. Select 'Body' tab and choose 'form-data'
     3. Add a key named 'file' and change type to 'File'
     4. Select your audio file
     """
+    too_large = Response(
+        {'error': f'Audio file is larger than {settings.TRANSCRIBE_MAX_UPLOAD_BYTES // (1024 * 1024)} MB'},
+        status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    )
     try:
+        if upload_too_large(request):
+            return too_large
+        
         file = request.FILES.get('file')
         
+        if upload_too_large(request):
+            logger.warning("Audio upload exceeded the size limit")
+            return too_large
+        
         if not file:
             logger.error("No audio file was uploaded in the request")
             return Response({'error': 'No audio file uploaded'}, status=status.HTTP_400_BAD_REQUEST)
             
         logger.info(f"Received audio file: {file.name}, size: {file.size} bytes, content type: {file.content_type}")
         
+        path = file.temporary_file_path()
+        duration = await asyncio.to_thread(audio_duration, path)
+        if duration is None:
+            # The size cap still bounds formats whose headers cannot be read
+            metrics.incr("transcribe.duration_unknown")
+            logger.info(f"Could not read the duration of {file.name}")
+        elif duration > settings.TRANSCRIBE_MAX_DURATION_SECONDS:
+            metrics.incr("transcribe.rejected_duration")
+            return Response(
+                {'error': f'Audio is longer than {settings.TRANSCRIBE_MAX_DURATION_SECONDS / 60:g} minutes'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
         api_key = os.getenv("DEEPGRAM_API_KEY")
         if not api_key:
             logger.error("DEEPGRAM_API_KEY not found in environment variables")
             return Response({'error': 'API configuration error'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
         # Using the Deepgram SDK
-        from deepgram import DeepgramClient, PrerecordedOptions, FileSource
+        from deepgram import DeepgramClient, PrerecordedOptions
         
         # Create a Deepgram client using the API key
         deepgram = DeepgramClient(api_key)
         
-        # Read file data into buffer
-        file_content = file.read()
-        
-        payload = {
-            "buffer": file_content,
-        }
-        
         # Configure transcription options
         options = PrerecordedOptions(
             model="nova-3",
@@ -137,7 +313,12 @@ def transcribe_audio(request):
         
         # Call the transcribe_file method
         logger.info("Sending audio to Deepgram API using SDK")
-        response = deepgram.listen.rest.v("1").transcribe_file(payload, options)
+        # The SDK posts a file object in fixed-size chunks read from disk;
+        # the call blocks, run it on the Deepgram workers
+        with open(path, "rb") as stream:
+            response = await deepgram_executor.run(
+                deepgram.listen.rest.v("1").transcribe_file, {"stream": stream}, options
+            )
         
         # Extract transcript with better error handling
         transcript = ""
@@ -152,6 +333,9 @@ def transcribe_audio(request):
         logger.info(f"Transcription successful, text length: {len(transcript)}")
         return Response({'transcript': transcript})
         
+    except ExecutorSaturated as e:
+        logger.warning(f"Deepgram executor saturated: {str(e)}")
+        return Response({'error': str(e)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
     except Exception as e:
         logger.exception(f"Error during audio transcription: {str(e)}")
         return Response(
@@ -1,18 +1,69 @@
-import google.generativeai as genai
+import asyncio
 import json
+import logging
 import os
-from pydantic import ValidationError
-from typing import Dict, Any
+import sys
+from pydantic import BaseModel, ValidationError
+from typing import Dict, Any, AsyncIterator, List, Optional, Type
 from dotenv import load_dotenv
+from django.conf import settings
 if __name__ == "__main__":
-    from schemas import ContentResponse, ContentSection
+    sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+    from schemas import (
+        AnalyzedContentResponse,
+        ContentResponse,
+        ContentSection,
+        TopicAnalysis,
+        json_generation_config,
+    )
+    from json_repair import loads_lenient
 else:
-    from .schemas import ContentResponse, ContentSection
+    from .schemas import (
+        AnalyzedContentResponse,
+        ContentResponse,
+        ContentSection,
+        TopicAnalysis,
+        json_generation_config,
+    )
+    from .json_repair import loads_lenient
+from core.llm import llm_clients
+from core.metrics import metrics
 
 load_dotenv()
 
-# Configure Gemini API
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+logger = logging.getLogger(__name__)
+
+# Model and prompt revision used for content generation. Both are part of the
+# storage address of generated content, so bump PROMPT_VERSION whenever the
+# prompts change in a way that should invalidate stored lessons.
+GEMINI_MODEL = "gemini-2.0-flash"
+PROMPT_VERSION = "1"
+
+# Generation modes: "two_step" analyzes the topic in a separate call before
+# generating the content, "single" asks for analysis and content in one call,
+# "fanout" generates every section of the analysis concurrently
+TWO_STEP_MODE = "two_step"
+SINGLE_CALL_MODE = "single"
+FANOUT_MODE = "fanout"
+GENERATION_MODES = [TWO_STEP_MODE, SINGLE_CALL_MODE, FANOUT_MODE]
+
+# Calls per fanout part (overview or section) before the lesson fails
+FANOUT_PART_ATTEMPTS = 2
+
+CONTENT_GENERATION_CONFIG = {
+    "temperature": 0.7,
+    "top_p": 0.95,
+    "max_output_tokens": 4096,
+}
+
+# Each fanout call only produces one section, but gets its own token budget
+SECTION_GENERATION_CONFIG = {
+    "temperature": 0.7,
+    "top_p": 0.95,
+    "max_output_tokens": 2048,
+}
+
 
 # Create a Gemini-based content generator (without using pydantic_ai.Agent)
 class ContentGenerator:
@@ -23,14 +74,38 @@ class ContentGenerator:
     1. Analyze the topic to determine appropriate content structure
     2. Generate comprehensive content in the required format
     3. Validate and refine the content
+
+    In "single" mode steps 1 and 2 are done in one model call, which returns
+    the analysis alongside the content in the same JSON object.
+
+    In "fanout" mode step 2 is split into one call per analyzed section (plus
+    one for the summary and references), run concurrently under a semaphore.
+    Wall-clock time follows the slowest section instead of the whole lesson,
+    and every section gets its own output token budget.
+
+    All model calls use the async Gemini client, so a generation never blocks
+    the event loop it runs on.
     """
 
-    def __init__(self, topic: str, difficulty: str = "intermediate"):
-        self.gemini_model = "gemini-2.0-flash"
+    def __init__(
+        self,
+        topic: str,
+        difficulty: str = "intermediate",
+        mode: str = TWO_STEP_MODE,
+        max_concurrency: Optional[int] = None,
+    ):
+        if mode not in GENERATION_MODES:
+            raise ValueError(f"Generation mode must be one of: {', '.join(GENERATION_MODES)}")
+        self.gemini_model = GEMINI_MODEL
         self.topic = topic
         self.difficulty = difficulty
+        self.mode = mode
+        # Concurrent calls per lesson in fanout mode
+        if max_concurrency is None:
+            max_concurrency = settings.CONTENT_FANOUT_CONCURRENCY
+        self.max_concurrency = max(1, max_concurrency)
 
-    def analyze_topic(self) -> Dict[str, Any]:
+    async def analyze_topic(self) -> Dict[str, Any]:
         """
         Analyze the topic to determine appropriate section structure
         """
@@ -52,27 +127,17 @@ class ContentGenerator:
         IMPORTANT: Return ONLY the JSON object with no explanation, no markdown formatting, and no backticks.
         """
 
-        model = genai.GenerativeModel(self.gemini_model)
+        model = llm_clients.generative_model(self.gemini_model)
         try:
-            response = model.generate_content(prompt)
-            response_text = response.text.strip()
+            response = await model.generate_content_async(
+                prompt, generation_config=json_generation_config(TopicAnalysis)
+            )
 
             # Print raw response for debugging
-            # print(f"Raw analyze_topic response: {response_text[:100]}...")
-
-            # Check if response is wrapped in code block markers
-            if response_text.startswith("```json"):
-                response_text = response_text.split("```json", 1)[1]
-            if response_text.startswith("```"):
-                response_text = response_text.split("```", 1)[1]
-            if response_text.endswith("```"):
-                response_text = response_text.rsplit("```", 1)[0]
-
-            # Trim whitespace
-            response_text = response_text.strip()
+            # print(f"Raw analyze_topic response: {response.text[:100]}...")
 
             # Try to parse JSON
-            return json.loads(response_text)
+            return loads_lenient(response.text)
         except Exception as e:
             print(f"Error parsing analysis: {str(e)}")
             # Return default structure
@@ -87,107 +152,300 @@ class ContentGenerator:
                 "key_concepts": [f"Important aspects of {self.topic}"],
             }
 
-    def generate_content(self) -> ContentResponse:
+    def content_prompt(self, analysis: Dict[str, Any]) -> str:
         """
-        Generate structured educational content based on topic analysis
+        Build the content generation prompt from the topic analysis
+        """
+        return f"""
+        You are a structured data generator.
+        
+        Generate comprehensive educational content about {self.topic} at a {self.difficulty} level.
+        
+        Structure your response as a valid JSON object with this exact format:
+        {{
+        "topic": "{self.topic}",
+        "summary": "A concise summary of the topic",
+        "sections": [
+            {{
+            "title": "Section title",
+            "content": "Detailed section content",
+            "key_points": ["Key point 1", "Key point 2", "Key point 3"]
+            }}
+        ],
+        "references": ["Reference 1", "Reference 2"],
+        "difficulty_level": "{self.difficulty}"
+        }}
+        
+        Make sure to include these key concepts: {analysis.get('key_concepts', [])}
+        
+        Make sure the content is:
+        1. Educational and accurate
+        2. Well-structured with logical sections
+        3. Includes at least 3 key points for each section
+        4. Appropriate for {self.difficulty} level learners
+        
+        IMPORTANT: Return ONLY the JSON object with no explanation, no markdown formatting, and no backticks.
         """
-        try:
-            # First analyze the topic
-            analysis = self.analyze_topic()
-
-            # Adjust difficulty based on analysis if needed
-            if "recommended_difficulty" in analysis:
-                self.difficulty = analysis.get(
-                    "recommended_difficulty", self.difficulty
-                )
 
-            # Build the content generation prompt
-            prompt = f"""
-            You are a structured data generator.
-            
-            Generate comprehensive educational content about {self.topic} at a {self.difficulty} level.
-            
-            Structure your response as a valid JSON object with this exact format:
+    def single_call_prompt(self) -> str:
+        """
+        Build a prompt that asks for the topic analysis and the content in one response
+        """
+        return f"""
+        You are a structured data generator.
+        
+        First analyze the topic '{self.topic}' and determine:
+        1. The appropriate difficulty level (beginner/intermediate/advanced), starting from {self.difficulty}
+        2. The logical sections that should be included
+        3. Key concepts that must be covered
+        
+        Then generate comprehensive educational content about {self.topic} at the recommended level,
+        covering every key concept from your analysis.
+        
+        Structure your response as a valid JSON object with this exact format:
+        {{
+        "analysis": {{
+            "recommended_difficulty": "{self.difficulty}",
+            "sections": ["Introduction", "Section 1", "Section 2", "Conclusion"],
+            "key_concepts": ["Concept 1", "Concept 2", "Concept 3"]
+        }},
+        "topic": "{self.topic}",
+        "summary": "A concise summary of the topic",
+        "sections": [
             {{
-            "topic": "{self.topic}",
-            "summary": "A concise summary of the topic",
-            "sections": [
-                {{
-                "title": "Section title",
-                "content": "Detailed section content",
-                "key_points": ["Key point 1", "Key point 2", "Key point 3"]
-                }}
-            ],
-            "references": ["Reference 1", "Reference 2"],
-            "difficulty_level": "{self.difficulty}"
+            "title": "Section title",
+            "content": "Detailed section content",
+            "key_points": ["Key point 1", "Key point 2", "Key point 3"]
             }}
-            
-            Make sure to include these key concepts: {analysis.get('key_concepts', [])}
-            
-            Make sure the content is:
-            1. Educational and accurate
-            2. Well-structured with logical sections
-            3. Includes at least 3 key points for each section
-            4. Appropriate for {self.difficulty} level learners
-            
-            IMPORTANT: Return ONLY the JSON object with no explanation, no markdown formatting, and no backticks.
-            """
+        ],
+        "references": ["Reference 1", "Reference 2"],
+        "difficulty_level": "the recommended difficulty"
+        }}
+        
+        Make sure the content is:
+        1. Educational and accurate
+        2. Well-structured with logical sections
+        3. Includes at least 3 key points for each section
+        4. Appropriate for learners at the recommended difficulty level
+        
+        IMPORTANT: Return ONLY the JSON object with no explanation, no markdown formatting, and no backticks.
+        """
+
+    async def generation_prompt(self) -> str:
+        """
+        Return the prompt for the content call of the selected mode.
+        In two_step mode this first runs the topic analysis call.
+        """
+        if self.mode == SINGLE_CALL_MODE:
+            return self.single_call_prompt()
+
+        analysis = await self.analyze_topic()
+        self.apply_analysis(analysis)
+        return self.content_prompt(analysis)
+
+    def response_schema(self) -> Type[BaseModel]:
+        """
+        Pydantic schema that constrains the content call of the selected mode
+        """
+        if self.mode == SINGLE_CALL_MODE:
+            return AnalyzedContentResponse
+        return ContentResponse
+
+    def apply_analysis(self, analysis: Dict[str, Any]) -> None:
+        """
+        Adjust difficulty based on analysis if needed
+        """
+        if "recommended_difficulty" in analysis:
+            self.difficulty = analysis.get(
+                "recommended_difficulty", self.difficulty
+            )
+
+    async def parse_content(self, response_text: str) -> ContentResponse:
+        """
+        Parse and validate the raw model output of the content prompt
+        """
+        try:
+            # Try to parse JSON; code fences, surrounding prose and
+            # truncated or slightly malformed output are repaired locally
+            content_json = loads_lenient(response_text)
+
+            # Attempt to validate with Pydantic
+            validated_content = ContentResponse(**content_json)
+            metrics.incr("content_generation.validated")
+            return validated_content
+        except json.JSONDecodeError as e:
+            print(f"JSON decode error: {e}")
+            print(f"Problematic text: {response_text[:200]}...")
+            raise
+        except ValidationError as e:
+            # If validation fails, try to fix the content
+            print(f"Validation error: {e}")
+            return await self.fix_content(content_json, str(e))
+
+    async def generate_content(self) -> ContentResponse:
+        """
+        Generate structured educational content based on topic analysis
+        """
+        try:
+            if self.mode == FANOUT_MODE:
+                analysis = await self.analyze_topic()
+                self.apply_analysis(analysis)
+                return await self.generate_sections_concurrently(analysis)
+
+            # Analyze the topic (two_step mode) and build the content prompt
+            prompt = await self.generation_prompt()
 
             # Generate the content
-            model = genai.GenerativeModel(self.gemini_model)
-            response = model.generate_content(
+            model = llm_clients.generative_model(self.gemini_model)
+            response = await model.generate_content_async(
                 prompt,
-                generation_config={
-                    "temperature": 0.7,
-                    "top_p": 0.95,
-                    "max_output_tokens": 4096,
-                },
+                generation_config=json_generation_config(self.response_schema(), CONTENT_GENERATION_CONFIG),
             )
 
-            # Get the response text and clean it
-            response_text = response.text.strip()
-
             # Print raw response for debugging
             # print(
-            #     f"Raw generate_content response (first 100 chars): {response_text[:100]}..."
+            #     f"Raw generate_content response (first 100 chars): {response.text[:100]}..."
             # )
 
-            # Check if response is wrapped in code block markers
-            if response_text.startswith("```json"):
-                response_text = response_text.split("```json", 1)[1]
-            if response_text.startswith("```"):
-                response_text = response_text.split("```", 1)[1]
-            if response_text.endswith("```"):
-                response_text = response_text.rsplit("```", 1)[0]
-
-            # Trim whitespace
-            response_text = response_text.strip()
-
-            try:
-                # Try to parse JSON
-                content_json = json.loads(response_text)
-
-                # Attempt to validate with Pydantic
-                validated_content = ContentResponse(**content_json)
-                return validated_content
-            except json.JSONDecodeError as e:
-                print(f"JSON decode error: {e}")
-                print(f"Problematic text: {response_text[:200]}...")
-                raise
-            except ValidationError as e:
-                # If validation fails, try to fix the content
-                print(f"Validation error: {e}")
-                return self.fix_content(content_json, str(e))
+            return await self.parse_content(response.text)
         except Exception as e:
             print(f"Error in generate_content: {e}")
             raise
 
-    def fix_content(
+    async def stream_content(self) -> AsyncIterator[str]:
+        """
+        Run the same generation as generate_content, but yield the raw
+        response text chunk by chunk as Gemini produces it.
+        The complete text should be passed to parse_content afterwards.
+        """
+        prompt = await self.generation_prompt()
+
+        model = llm_clients.generative_model(self.gemini_model)
+        response = await model.generate_content_async(
+            prompt,
+            generation_config=json_generation_config(self.response_schema(), CONTENT_GENERATION_CONFIG),
+            stream=True,
+        )
+        async for chunk in response:
+            try:
+                text = chunk.text
+            except ValueError:
+                # Chunks without text parts (e.g. the final finish_reason chunk)
+                continue
+            if text:
+                yield text
+
+    def overview_prompt(self, analysis: Dict[str, Any]) -> str:
+        """
+        Build the prompt for the summary and references of a fanout lesson
+        """
+        return f"""
+        You are a structured data generator.
+        
+        Write the overview of an educational lesson about {self.topic} at a {self.difficulty} level.
+        The lesson has these sections: {analysis.get('sections', [])}
+        
+        Return a valid JSON object with this exact format:
+        {{
+        "summary": "A concise summary of the topic",
+        "references": ["Reference 1", "Reference 2"]
+        }}
+        
+        IMPORTANT: Return ONLY the JSON object with no explanation, no markdown formatting, and no backticks.
+        """
+
+    def section_prompt(self, analysis: Dict[str, Any], title: str) -> str:
+        """
+        Build the prompt for a single section of a fanout lesson
+        """
+        return f"""
+        You are a structured data generator.
+        
+        You are writing one section of an educational lesson about {self.topic} at a {self.difficulty} level.
+        The lesson has these sections: {analysis.get('sections', [])}
+        Write ONLY the section titled "{title}". Do not repeat material that belongs to the other sections.
+        
+        Where relevant, cover these key concepts: {analysis.get('key_concepts', [])}
+        
+        Return a valid JSON object with this exact format:
+        {{
+        "title": "{title}",
+        "content": "Detailed section content",
+        "key_points": ["Key point 1", "Key point 2", "Key point 3"]
+        }}
+        
+        Make sure the section is educational, accurate and includes at least 3 key points.
+        
+        IMPORTANT: Return ONLY the JSON object with no explanation, no markdown formatting, and no backticks.
+        """
+
+    async def _generate_json(
+        self, semaphore: asyncio.Semaphore, part: str, prompt: str, schema: Optional[Type[BaseModel]] = None
+    ) -> Dict[str, Any]:
+        """
+        JSON of one fanout part, retried alone (up to FANOUT_PART_ATTEMPTS
+        calls) when its call fails or returns unparseable output
+        """
+        for attempt in range(1, FANOUT_PART_ATTEMPTS + 1):
+            try:
+                async with semaphore:
+                    model = llm_clients.generative_model(self.gemini_model)
+                    response = await model.generate_content_async(
+                        prompt,
+                        generation_config=json_generation_config(schema, SECTION_GENERATION_CONFIG),
+                    )
+                return loads_lenient(response.text)
+            except Exception as e:
+                metrics.incr("content_generation.part_failures")
+                logger.warning(
+                    f"Fanout {part} of '{self.topic}' failed (attempt {attempt}/{FANOUT_PART_ATTEMPTS}): {str(e)}"
+                )
+                if attempt == FANOUT_PART_ATTEMPTS:
+                    raise
+
+    async def generate_sections_concurrently(self, analysis: Dict[str, Any]) -> ContentResponse:
+        """
+        Generate the overview and every analyzed section concurrently and
+        assemble them into a ContentResponse, keeping the section order
+        """
+        titles: List[str] = analysis.get("sections") or ["Introduction", "Core Concepts", "Applications", "Conclusion"]
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        overview, *sections = await asyncio.gather(
+            self._generate_json(semaphore, "overview", self.overview_prompt(analysis)),
+            *(
+                self._generate_json(
+                    semaphore, f"section '{title}'", self.section_prompt(analysis, title), ContentSection
+                )
+                for title in titles
+            ),
+        )
+
+        content_json = {
+            "topic": self.topic,
+            "summary": overview.get("summary", ""),
+            "sections": sections,
+            "references": overview.get("references", []),
+            "difficulty_level": self.difficulty,
+        }
+        try:
+            validated_content = ContentResponse(**content_json)
+            metrics.incr("content_generation.validated")
+            return validated_content
+        except ValidationError as e:
+            logger.warning(f"Fanout content for '{self.topic}' failed validation: {str(e)}")
+            return await self.fix_content(content_json, str(e))
+
+    async def fix_content(
         self, content_json: Dict[str, Any], error_message: str
     ) -> ContentResponse:
         """
-        Fix content that failed validation
+        Fix content that failed validation.
+
+        With schema-constrained output this should rarely be needed; every call
+        is counted in the content_generation.repairs metric.
         """
+        metrics.incr("content_generation.repairs")
         fix_prompt = f"""
         The following content has validation errors:
         
@@ -214,20 +472,23 @@ class ContentGenerator:
         Return only the fixed JSON.
         """
 
-        model = genai.GenerativeModel(self.gemini_model)
-        response = model.generate_content(fix_prompt)
-        fixed_content = json.loads(response.text)
+        model = llm_clients.generative_model(self.gemini_model)
+        response = await model.generate_content_async(
+            fix_prompt, generation_config=json_generation_config(ContentResponse)
+        )
+        fixed_content = loads_lenient(response.text)
 
         return ContentResponse(**fixed_content)
 
 
-def generate_content_for_topic(topic, difficulty="beginner"):
+async def generate_content_for_topic(topic, difficulty="beginner", mode=TWO_STEP_MODE):
     """
     Generate structured educational content based on a topic
 
     Args:
         topic (str): The topic to generate content for
         difficulty (str): The difficulty level (beginner/intermediate/advanced)
+        mode (str): The generation mode (two_step/single/fanout)
 
     Returns:
         dict: The validated content response
@@ -237,8 +498,8 @@ def generate_content_for_topic(topic, difficulty="beginner"):
     """
     try:
         # Create and run the generator
-        generator = ContentGenerator(topic=topic, difficulty=difficulty)
-        content_response = generator.generate_content()
+        generator = ContentGenerator(topic=topic, difficulty=difficulty, mode=mode)
+        content_response = await generator.generate_content()
 
         # Return as dictionary
         return content_response.model_dump()
@@ -256,7 +517,7 @@ if __name__ == "__main__":
     difficulty = "intermediate"  # Changed from "easy" to an accepted value
 
     try:
-        content = generate_content_for_topic(topic, difficulty)
+        content = asyncio.run(generate_content_for_topic(topic, difficulty))
         print(json.dumps(content, indent=2))
     except ValueError as e:
         print(f"Error: {str(e)}")
@@ -0,0 +1,223 @@
+import json
+import re
+from typing import Any, List, Optional, Tuple
+
+from core.metrics import metrics
+
+_WHITESPACE = " \t\r\n"
+_STRING_ESCAPES = {"\n": "\\n", "\r": "\\r", "\t": "\\t"}
+# Characters inside a string that need attention; everything else is copied in bulk
+_STRING_SPECIAL = re.compile(r'["\\\n\r\t]')
+_STRING_SPECIAL_CHARS = '"\\\n\r\t'
+_WHITESPACE_RUN = re.compile(r"[ \t\r\n]+")
+
+
+def loads_lenient(text: str) -> Any:
+    """
+    Parse JSON produced by a language model.
+
+    Well-formed JSON takes the json.loads fast path. Otherwise the first JSON
+    value is extracted from the text (ignoring code fences and surrounding
+    prose) and repaired locally: trailing commas, missing commas between
+    values, // comments, unescaped quotes and raw newlines inside strings, and
+    output truncated in the middle of a string, array or object.
+
+    Raises json.JSONDecodeError if the text cannot be turned into JSON.
+    """
+    try:
+        return json.loads(text)
+    except (json.JSONDecodeError, TypeError):
+        if not isinstance(text, str):
+            raise
+
+    start = _find_json_start(text)
+    if start is None:
+        metrics.incr("json_repair.failed")
+        raise json.JSONDecodeError("No JSON object or array found", text, 0)
+
+    # Leading prose or code fences, but otherwise valid JSON
+    try:
+        value, _ = json.JSONDecoder().raw_decode(text, start)
+        metrics.incr("json_repair.extracted")
+        return value
+    except json.JSONDecodeError:
+        pass
+
+    repaired = repair_json(text[start:])
+    try:
+        value = json.loads(repaired)
+    except json.JSONDecodeError:
+        metrics.incr("json_repair.failed")
+        raise
+    metrics.incr("json_repair.repaired")
+    return value
+
+
+def _find_json_start(text: str) -> Optional[int]:
+    starts = [i for i in (text.find("{"), text.find("[")) if i != -1]
+    return min(starts) if starts else None
+
+
+def _next_significant(text: str, i: int) -> str:
+    n = len(text)
+    while i < n and text[i] in _WHITESPACE:
+        i += 1
+    return text[i] if i < n else ""
+
+
+def repair_json(text: str) -> str:
+    """
+    Rewrite text starting with "{" or "[" into valid JSON where possible.
+
+    Single left-to-right pass. For every open container the scanner tracks
+    whether it expects a key, a colon, a value or a comma, and remembers the
+    last point at which the output could be closed cleanly. Truncated output
+    is cut back to that point and the open containers are closed.
+    """
+    out: List[str] = []
+    stack: List[List[str]] = []  # [bracket, state]
+    safe: Tuple[int, Tuple[str, ...]] = (0, ())
+    in_string = False
+    string_is_key = False
+    escape = False
+    i = 0
+    n = len(text)
+
+    def mark_safe():
+        nonlocal safe
+        safe = (len(out), tuple(frame[0] for frame in stack))
+
+    def value_done():
+        if stack:
+            stack[-1][1] = "comma"
+        mark_safe()
+
+    while i < n:
+        ch = text[i]
+
+        if in_string:
+            if not escape and ch not in _STRING_SPECIAL_CHARS:
+                match = _STRING_SPECIAL.search(text, i)
+                j = match.start() if match else n
+                out.append(text[i:j])
+                i = j
+                continue
+            if escape:
+                escape = False
+                out.append(ch)
+            elif ch == "\\":
+                escape = True
+                out.append(ch)
+            elif ch == '"':
+                following = _next_significant(text, i + 1)
+                closes = following in ("", ":") if string_is_key else following in ("", ",", "}", "]")
+                if not closes and following == '"':
+                    # Pretty-printed values with a missing comma
+                    next_quote = text.find('"', i + 1)
+                    closes = "\n" in text[i + 1:next_quote]
+                if closes:
+                    in_string = False
+                    out.append(ch)
+                    if string_is_key:
+                        stack[-1][1] = "colon"
+                    else:
+                        value_done()
+                else:
+                    out.append('\\"')
+            else:
+                out.append(_STRING_ESCAPES.get(ch, ch))
+            i += 1
+            continue
+
+        if ch in _WHITESPACE:
+            j = _WHITESPACE_RUN.match(text, i).end()
+            out.append(text[i:j])
+            i = j
+            continue
+
+        # Line comments are not JSON
+        if ch == "/" and text.startswith("//", i):
+            newline = text.find("\n", i)
+            i = n if newline == -1 else newline
+            continue
+
+        state = stack[-1][1] if stack else "value"
+
+        if ch in "}]":
+            if not stack:
+                break
+            # Drop a trailing comma before the closing bracket
+            while out and out[-1] in _WHITESPACE:
+                out.pop()
+            if out and out[-1] == ",":
+                out.pop()
+            # Close whatever is open, even if the model used the wrong bracket
+            bracket = stack.pop()[0]
+            out.append("}" if bracket == "{" else "]")
+            if not stack:
+                mark_safe()
+                break
+            value_done()
+            i += 1
+            continue
+
+        if ch == ",":
+            if stack and state == "comma":
+                out.append(ch)
+                stack[-1][1] = "key" if stack[-1][0] == "{" else "value"
+            i += 1
+            continue
+
+        if ch == ":":
+            if stack and state == "colon":
+                out.append(ch)
+                stack[-1][1] = "value"
+            i += 1
+            continue
+
+        # Start of a key or value: insert a missing comma if needed
+        if stack and state == "comma":
+            out.append(",")
+            stack[-1][1] = "key" if stack[-1][0] == "{" else "value"
+            state = stack[-1][1]
+
+        if ch == '"':
+            in_string = True
+            string_is_key = bool(stack) and stack[-1][0] == "{" and state == "key"
+            out.append(ch)
+            i += 1
+            continue
+
+        if ch in "{[":
+            stack.append([ch, "key" if ch == "{" else "value"])
+            out.append(ch)
+            mark_safe()
+            i += 1
+            continue
+
+        # Bare literal (number, true, false, null)
+        j = i
+        while j < n and text[j] not in _WHITESPACE and text[j] not in ",:]}[{\"":
+            j += 1
+        token = text[i:j]
+        out.append({"True": "true", "False": "false", "None": "null"}.get(token, token))
+        i = j
+        if j < n:
+            value_done()
+
+    if in_string and not string_is_key:
+        # Output was cut off inside a value: keep what we have of it
+        if escape:
+            out.pop()
+        out.append('"')
+        value_done()
+
+    if stack:
+        length, open_brackets = safe
+        out = out[:length]
+        while out and (out[-1] in _WHITESPACE or out[-1] == ","):
+            out.pop()
+        for bracket in reversed(open_brackets):
+            out.append("}" if bracket == "{" else "]")
+
+    return "".join(out)
@@ -0,0 +1,38 @@
+import hashlib
+import json
+
+
+def normalize_topic(topic: str) -> str:
+    """
+    Normalize a topic so that trivially different spellings of the same
+    request ("Ray  Optics", "ray optics ") map to the same key.
+    """
+    return " ".join(str(topic).split()).lower()
+
+
+def content_address(topic: str, difficulty: str, model_name: str, prompt_version: str) -> str:
+    """
+    SHA-256 address of a generated lesson, derived from everything that
+    determines its output: normalized topic, difficulty, model and prompt version.
+    """
+    key = json.dumps(
+        [normalize_topic(topic), str(difficulty).strip().lower(), model_name, prompt_version],
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+def content_hash(content) -> str:
+    """
+    SHA-256 of a lesson's canonical JSON (sorted keys, no insignificant
+    whitespace), so the same lesson hashes identically however it was
+    formatted or ordered by the client. Strings holding JSON are parsed
+    first; any other string is hashed as-is.
+    """
+    if isinstance(content, str):
+        try:
+            content = json.loads(content)
+        except json.JSONDecodeError:
+            content = content.strip()
+    canonical = json.dumps(content, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
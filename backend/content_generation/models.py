@@ -1,21 +1,47 @@
 from django.db import models
 
+DIFFICULTY_CHOICES = [
+    ('beginner', 'Beginner'),
+    ('intermediate', 'Intermediate'),
+    ('advanced', 'Advanced')
+]
+
+class ContentBlob(models.Model):
+    """
+    Content-addressed store for generated lesson JSON.
+
+    Each blob is addressed by a hash of the normalized topic, the difficulty,
+    the model and the prompt version that produced it, so every user asking
+    for the same lesson shares a single stored copy.
+    """
+    content_hash = models.CharField(max_length=64, unique=True)
+    topic = models.CharField(max_length=255)
+    difficulty_level = models.CharField(max_length=20, choices=DIFFICULTY_CHOICES)
+    model_name = models.CharField(max_length=64)
+    prompt_version = models.CharField(max_length=16)
+    content = models.JSONField(help_text="The full generated content in JSON format")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Content Blob"
+        verbose_name_plural = "Content Blobs"
+
+    def __str__(self):
+        return f"{self.topic} ({self.difficulty_level}) [{self.content_hash[:12]}]"
+
 class GeneratedContent(models.Model):
     """
-    Model to store educational content generated for topics.
+    Link between a user and a piece of generated educational content.
     
-    This stores the full JSON response from content generation,
-    allowing for efficient retrieval of previously generated content.
+    The JSON itself lives in a shared ContentBlob; this row only records
+    that the user asked for the topic, allowing for efficient retrieval of
+    previously generated content without storing it twice.
     """
     topic = models.CharField(max_length=255, db_index=True)
-    content = models.JSONField(help_text="The full generated content in JSON format")
+    blob = models.ForeignKey(ContentBlob, on_delete=models.PROTECT, related_name='links')
     difficulty_level = models.CharField(
         max_length=20, 
-        choices=[
-            ('beginner', 'Beginner'),
-            ('intermediate', 'Intermediate'),
-            ('advanced', 'Advanced')
-        ],
+        choices=DIFFICULTY_CHOICES,
         default='intermediate'
     )
     user = models.ForeignKey('user_profiles.CustomUser', on_delete=models.CASCADE, related_name='generated_contents')
@@ -25,10 +51,55 @@ class GeneratedContent(models.Model):
     class Meta:
         verbose_name = "Generated Content"
         verbose_name_plural = "Generated Contents"
-        # Create an index for topic + difficulty for faster lookups
-        unique_together = ['topic', 'difficulty_level']
+        # One link per user for a topic + difficulty
+        unique_together = ['user', 'topic', 'difficulty_level']
         # Order by most recently created first
         ordering = ['-created_at']
+
+    @property
+    def content(self):
+        return self.blob.content
     
     def __str__(self):
-        return f"{self.topic} ({self.difficulty_level})"
\ No newline at end of file
+        return f"{self.topic} ({self.difficulty_level})"
+
+class TranslationSegment(models.Model):
+    """
+    Translation memory: one translated text segment of a lesson (a title,
+    paragraph, key point, ...), keyed by the SHA-256 of the source text and
+    the target language, so a segment is translated once no matter how many
+    lessons contain it.
+    """
+    source_hash = models.CharField(max_length=64)
+    language = models.CharField(max_length=20)
+    source_text = models.TextField()
+    translated_text = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Translation Segment"
+        verbose_name_plural = "Translation Segments"
+        unique_together = ['source_hash', 'language']
+
+    def __str__(self):
+        return f"{self.source_text[:40]} [{self.language}]"
+
+class ContentTranslation(models.Model):
+    """
+    A translated variant of a shared ContentBlob.
+
+    Blobs are immutable and content-addressed, so a translation never goes
+    stale and every user linked to the lesson reads the same stored copy.
+    """
+    blob = models.ForeignKey(ContentBlob, on_delete=models.CASCADE, related_name='translations')
+    language = models.CharField(max_length=20)
+    translated_content = models.JSONField(help_text="The translated content in JSON format")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Content Translation"
+        verbose_name_plural = "Content Translations"
+        unique_together = ['blob', 'language']
+
+    def __str__(self):
+        return f"{self.blob} [{self.language}]"
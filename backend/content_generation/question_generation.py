@@ -1,56 +1,233 @@
 import os
+import sys
 import asyncio
 import json
 import logging
-from pydantic_ai.providers.google_gla import GoogleGLAProvider
-from pydantic_ai.models.gemini import GeminiModel
 from pydantic_ai import Agent
-from typing import List
+from typing import Any, Dict, List, Optional
 from dotenv import load_dotenv
+from django.conf import settings
 
 if __name__ == "__main__":
+    sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
     from schemas import ResponseQuestions
 else:
     from .schemas import ResponseQuestions
+from core.llm import llm_clients
+from quizzes.similarity import SimilarityIndex, question_text
+from core.metrics import metrics
 
 
 load_dotenv()
 
+# The system prompt is static so a single Agent (and its result schema) is
+# built once per process; the lesson text and settings go in the user message
+QUESTION_SYSTEM_PROMPT = (
+    "You are a teacher tasked with creating multiple-choice questions on the information provided by the user. "
+    "Each question should have four options (a, b, c, d) and a correct answer. "
+    "Focus your questions on the core text provided, using the additional information only for context and enrichment. "
+    "The questions should be clear, concise, and relevant to the text."
+)
+
+question_agent = Agent(
+    result_type=List[ResponseQuestions],
+    system_prompt=QUESTION_SYSTEM_PROMPT,
+)
+
+
+def question_prompt(text: str, num_questions: int, difficulty: str) -> str:
+    """
+    Build the per-request user message for the question agent
+    """
+    return (
+        f"Create {num_questions} multiple-choice questions on the following information.\n"
+        f"Make sure the difficulty of each question is {difficulty}.\n\n"
+        f"{text}"
+    )
+
+
+# Question generation modes: "single" sends the whole lesson in one call,
+# "chunked" generates questions for groups of sections concurrently and
+# merges them (lessons without sections fall back to a single call)
+SINGLE_QUESTION_MODE = "single"
+CHUNKED_QUESTION_MODE = "chunked"
+QUESTION_GENERATION_MODES = [SINGLE_QUESTION_MODE, CHUNKED_QUESTION_MODE]
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough token count of a prompt (about 4 characters per token)
+    """
+    return (len(text) + 3) // 4
+
+
+def _lesson_dict(content: Any) -> Optional[Dict[str, Any]]:
+    if isinstance(content, str):
+        try:
+            content = json.loads(content)
+        except json.JSONDecodeError:
+            return None
+    return content if isinstance(content, dict) else None
+
+
+def lesson_text(content: Any) -> str:
+    """
+    Text of a lesson for a prompt: JSON for structured lessons instead of a Python repr
+    """
+    if isinstance(content, (dict, list)):
+        return json.dumps(content, ensure_ascii=False)
+    return str(content)
+
+
+def _section_text(section: Any) -> str:
+    if not isinstance(section, dict):
+        return str(section)
+    lines = [f"Section: {section.get('title', '')}", str(section.get("content", ""))]
+    key_points = section.get("key_points") or []
+    if key_points:
+        lines.append("Key points:")
+        lines.extend(f"- {point}" for point in key_points)
+    return "\n".join(lines)
+
+
+def lesson_chunks(content: Any, max_chunks: int) -> List[str]:
+    """
+    Split a lesson into at most max_chunks prompts of consecutive sections.
+    Returns an empty list for content without a "sections" list.
+    """
+    lesson = _lesson_dict(content)
+    sections = lesson.get("sections") if lesson else None
+    if not isinstance(sections, list) or not sections:
+        return []
+
+    header = f"Lesson: {lesson.get('topic', '')}\n\n"
+    chunk_count = max(1, min(len(sections), max_chunks))
+    size = -(-len(sections) // chunk_count)
+    return [
+        header + "\n\n".join(_section_text(section) for section in sections[start:start + size])
+        for start in range(0, len(sections), size)
+    ]
+
+
+def merge_questions(batches: List[List[ResponseQuestions]], num_questions: int) -> List[ResponseQuestions]:
+    """
+    Interleave per-chunk batches so every chunk is represented, drop
+    near-duplicate questions and keep the first num_questions
+    """
+    merged = []
+    index = SimilarityIndex()
+    for round_ in range(max((len(batch) for batch in batches), default=0)):
+        for batch in batches:
+            if round_ >= len(batch):
+                continue
+            question = batch[round_]
+            answer = getattr(question, f"option_{question.answer_option.strip().lower()}", "")
+            if index.add_if_new(len(merged), question_text(question.question, answer)):
+                merged.append(question)
+    return merged[:num_questions]
+
+
+class TokenBudget:
+    """
+    Token accounting for one question generation request.
+
+    Input tokens are estimated locally from the prompt text; request and
+    response tokens are the usage reported by the model (0 if unavailable).
+    single_call_estimated_input_tokens is what one call carrying the whole
+    lesson would have sent, for comparison with chunked mode.
+    """
+
+    def __init__(self, mode: str, content: Any):
+        self.mode = mode
+        self.calls: List[Dict[str, int]] = []
+        self.single_call_estimate = estimate_tokens(
+            QUESTION_SYSTEM_PROMPT + question_prompt(lesson_text(content), 0, "")
+        )
+
+    def record(self, prompt: str, usage: Any, questions: int) -> None:
+        call = {
+            "estimated_input_tokens": estimate_tokens(QUESTION_SYSTEM_PROMPT + prompt),
+            "request_tokens": getattr(usage, "request_tokens", None) or 0,
+            "response_tokens": getattr(usage, "response_tokens", None) or 0,
+            "questions": questions,
+        }
+        self.calls.append(call)
+        metrics.incr("question_generation.calls")
+        metrics.incr("question_generation.request_tokens", call["request_tokens"])
+        metrics.incr("question_generation.response_tokens", call["response_tokens"])
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "calls": len(self.calls),
+            "estimated_input_tokens": sum(call["estimated_input_tokens"] for call in self.calls),
+            "single_call_estimated_input_tokens": self.single_call_estimate,
+            "request_tokens": sum(call["request_tokens"] for call in self.calls),
+            "response_tokens": sum(call["response_tokens"] for call in self.calls),
+            "per_call": self.calls,
+        }
+
+
 class QuestionGeneratorAgent:
     def __init__(self):
-        self.model = GeminiModel(
-            "gemini-2.0-flash",
-            provider=GoogleGLAProvider(
-                api_key=os.getenv("GEMINI_API_KEY"),
-            ),
-        )
+        self.model_name = "gemini-2.0-flash"
         self.headers = {
             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
         }
 
     async def generate_questions(
-        self, text: str, num_questions: int = 5, difficulty: str = "easy"
+        self,
+        text: str,
+        num_questions: int = 5,
+        difficulty: str = "easy",
+        budget: Optional[TokenBudget] = None,
     ) -> List[ResponseQuestions]:
         """
         Generates multiple-choice questions based on the given text.
         If use_rag is True, enhances the input with web content.
         """
-
-        agent = Agent(
-            self.model,
-            result_type=List[ResponseQuestions],
-            system_prompt=(
-                f"You are a teacher tasked with creating {num_questions} multiple-choice questions on the following information: {text} "
-                "Each question should have four options (a, b, c, d) and a correct answer."
-                f"Make sure the difficulty of each question is {difficulty}. "
-                f"Focus your questions on the core text provided, using the additional information only for context and enrichment."
-                "The questions should be clear, concise, and relevant to the text."
-            ),
+        prompt = question_prompt(text, num_questions, difficulty)
+        response = await question_agent.run(
+            prompt,
+            model=llm_clients.gemini_model(self.model_name),
         )
-
-        response = await agent.run(text)
+        if budget is not None:
+            budget.record(prompt, response.usage(), len(response.data))
         return response.data
 
+    async def generate_questions_chunked(
+        self,
+        content: Any,
+        num_questions: int = 5,
+        difficulty: str = "easy",
+        budget: Optional[TokenBudget] = None,
+        max_concurrency: Optional[int] = None,
+    ) -> List[ResponseQuestions]:
+        """
+        Map-reduce question generation for long lessons.
+
+        The lesson's sections are grouped into at most num_questions chunks,
+        questions are generated for every chunk concurrently, then merged and
+        deduplicated down to num_questions. Each call only carries its own
+        sections instead of the whole lesson. At most max_concurrency calls
+        (the QUESTION_CHUNK_CONCURRENCY setting by default) run at a time.
+        """
+        chunks = lesson_chunks(content, num_questions)
+        if len(chunks) < 2:
+            return await self.generate_questions(lesson_text(content), num_questions, difficulty, budget)
+
+        per_chunk = -(-num_questions // len(chunks))
+        if max_concurrency is None:
+            max_concurrency = settings.QUESTION_CHUNK_CONCURRENCY
+        semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+        async def generate_chunk(chunk: str) -> List[ResponseQuestions]:
+            async with semaphore:
+                return await self.generate_questions(chunk, per_chunk, difficulty, budget)
+
+        batches = await asyncio.gather(*(generate_chunk(chunk) for chunk in chunks))
+        return merge_questions(batches, num_questions)
+
 
 if __name__ == "__main__":
 
@@ -1,6 +1,10 @@
-from typing import List, Optional
+import copy
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Type
 from pydantic import BaseModel, Field, field_validator 
 
+DIFFICULTY_LEVELS = ["beginner", "intermediate", "advanced"]
+
 # Response schema for the generated questions
 class ResponseQuestions(BaseModel):
     question: str
@@ -15,7 +19,7 @@ class ResponseQuestions(BaseModel):
 class ContentSection(BaseModel):
     title: str
     content: str
-    key_points: List[str] = Field(default_factory=list)
+    key_points: List[str] = Field(default_factory=list, json_schema_extra={"minItems": 2})
 
     @field_validator("key_points")  # Updated to field_validator
     def ensure_key_points(cls, v):
@@ -29,11 +33,11 @@ class ContentResponse(BaseModel):
     summary: str
     sections: List[ContentSection]
     references: Optional[List[str]] = Field(default_factory=list)
-    difficulty_level: str = "intermediate"
+    difficulty_level: str = Field("intermediate", json_schema_extra={"enum": DIFFICULTY_LEVELS})
 
     @field_validator("difficulty_level")  # Updated to field_validator
     def validate_difficulty(cls, v):
-        valid_levels = ["beginner", "intermediate", "advanced"]
+        valid_levels = DIFFICULTY_LEVELS
         if v.lower() not in valid_levels:
             raise ValueError(f"Difficulty level must be one of {valid_levels}")
         return v.lower()
@@ -44,6 +48,9 @@ class TranslationResponse(BaseModel):
     summary: str
     translated_content: dict  # Store the entire translated content as a dictionary
     language: str = "hindi"
+    complete: bool = True  # False if some segments were left untranslated
+    chunk_timings: List[Dict[str, Any]] = Field(default_factory=list)  # One entry per translated chunk
+    error: Optional[str] = None  # Set when the content could not be translated
 
     @field_validator("language")
     def validate_language(cls, v):
@@ -52,3 +59,91 @@ class TranslationResponse(BaseModel):
             return "hindi"  # Default to Hindi if invalid language
         return v.lower()
 
+# A text segment of a lesson translated by the model, identified by its position in the request
+class TranslatedSegment(BaseModel):
+    id: int
+    text: str
+
+# Response of a segment translation call
+class SegmentTranslations(BaseModel):
+    translations: List[TranslatedSegment]
+
+# Topic analysis returned by ContentGenerator.analyze_topic
+class TopicAnalysis(BaseModel):
+    recommended_difficulty: str = Field(json_schema_extra={"enum": DIFFICULTY_LEVELS})
+    sections: List[str]
+    key_concepts: List[str]
+
+# Response of the single-call generation mode: the analysis next to the content
+class AnalyzedContentResponse(ContentResponse):
+    analysis: TopicAnalysis
+
+
+@lru_cache(maxsize=None)
+def _cached_gemini_schema(model: Type[BaseModel]) -> Dict[str, Any]:
+    schema = model.model_json_schema()
+    defs = schema.pop("$defs", {})
+    return _to_gemini_schema(schema, defs)
+
+
+def gemini_response_schema(model: Type[BaseModel]) -> Dict[str, Any]:
+    """
+    Derive a Gemini response_schema from a Pydantic model.
+
+    Gemini accepts a subset of OpenAPI: no $refs, no titles or defaults, and
+    Optional fields expressed as nullable. Free-form dict fields cannot be
+    expressed and raise a ValueError.
+    """
+    return copy.deepcopy(_cached_gemini_schema(model))
+
+
+def _to_gemini_schema(node: Dict[str, Any], defs: Dict[str, Any]) -> Dict[str, Any]:
+    if "$ref" in node:
+        node = {**defs[node["$ref"].split("/")[-1]], **{k: v for k, v in node.items() if k != "$ref"}}
+
+    if "anyOf" in node:
+        variants = [v for v in node["anyOf"] if v.get("type") != "null"]
+        if len(variants) != 1:
+            raise ValueError("Only Optional[...] unions can be expressed as a Gemini schema")
+        result = _to_gemini_schema(variants[0], defs)
+        result["nullable"] = True
+        if "description" in node:
+            result["description"] = node["description"]
+        return result
+
+    if node.get("type") == "object" and not node.get("properties"):
+        raise ValueError("Free-form objects cannot be expressed as a Gemini schema")
+
+    result = {"type": node["type"]}
+    for key in ("format", "description", "enum"):
+        if key in node:
+            result[key] = node[key]
+    if "enum" in node:
+        result["format"] = "enum"
+    if "minItems" in node:
+        result["min_items"] = node["minItems"]
+    if "maxItems" in node:
+        result["max_items"] = node["maxItems"]
+    if "items" in node:
+        result["items"] = _to_gemini_schema(node["items"], defs)
+    if "properties" in node:
+        result["properties"] = {
+            name: _to_gemini_schema(value, defs) for name, value in node["properties"].items()
+        }
+        # Ask the model for every field, including those that have defaults
+        result["required"] = list(node["properties"].keys())
+    return result
+
+
+def json_generation_config(
+    schema: Optional[Type[BaseModel]] = None, base: Optional[Dict[str, Any]] = None
+) -> Dict[str, Any]:
+    """
+    Generation config asking Gemini for JSON output, constrained to the
+    response schema derived from the given Pydantic model
+    """
+    config = dict(base or {})
+    config["response_mime_type"] = "application/json"
+    if schema is not None:
+        config["response_schema"] = gemini_response_schema(schema)
+    return config
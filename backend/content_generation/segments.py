@@ -0,0 +1,77 @@
+import hashlib
+import re
+from typing import Dict, List
+
+# Fields holding identifiers rather than text
+UNTRANSLATED_KEYS = frozenset({"difficulty_level"})
+
+_URL = re.compile(r"^\s*(https?://|www\.)\S*\s*$", re.IGNORECASE)
+
+
+def _is_translatable(text: str) -> bool:
+    return bool(text.strip()) and not _URL.match(text) and any(char.isalpha() for char in text)
+
+
+def extract_segments(content) -> List[str]:
+    """
+    Translatable text segments of a lesson (or any JSON value): every string
+    leaf except identifiers, URLs and strings without letters. Each distinct
+    text is returned once, in document order.
+    """
+    segments = {}
+
+    def walk(value, key=None):
+        if isinstance(value, dict):
+            for child_key, child in value.items():
+                if child_key not in UNTRANSLATED_KEYS:
+                    walk(child, child_key)
+        elif isinstance(value, list):
+            for child in value:
+                walk(child, key)
+        elif isinstance(value, str) and _is_translatable(value):
+            segments.setdefault(value, None)
+
+    walk(content)
+    return list(segments)
+
+
+def segment_chunks(content) -> List[List[str]]:
+    """
+    Translatable segments of a lesson grouped into independent translation
+    jobs: everything outside the sections first, then one chunk per
+    section. Content without sections is a single chunk. A text repeated
+    across sections is only part of the first chunk it appears in.
+    """
+    if isinstance(content, dict) and isinstance(content.get("sections"), list):
+        parts = [{key: value for key, value in content.items() if key != "sections"}, *content["sections"]]
+    else:
+        parts = [content]
+
+    seen = set()
+    chunks = []
+    for part in parts:
+        chunk = [segment for segment in extract_segments(part) if segment not in seen]
+        seen.update(chunk)
+        chunks.append(chunk)
+    return [chunk for chunk in chunks if chunk]
+
+
+def apply_translations(content, translations: Dict[str, str]):
+    """
+    Copy of content with every string leaf replaced by its translation;
+    text without a translation is kept as-is
+    """
+    if isinstance(content, dict):
+        return {
+            key: value if key in UNTRANSLATED_KEYS else apply_translations(value, translations)
+            for key, value in content.items()
+        }
+    if isinstance(content, list):
+        return [apply_translations(value, translations) for value in content]
+    if isinstance(content, str):
+        return translations.get(content, content)
+    return content
+
+
+def segment_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
@@ -4,7 +4,21 @@ from .models import GeneratedContent
 class GeneratedContentSerializer(serializers.ModelSerializer):
     """
     Serializer for the GeneratedContent model.
+
+    When the context holds a "language" and "translations" (content id to
+    translated JSON), the content is returned in that language.
     """
+    content = serializers.SerializerMethodField()
+    language = serializers.SerializerMethodField()
+
     class Meta:
         model = GeneratedContent
-        fields = ['id', 'topic', 'content', 'difficulty_level', 'created_at', 'updated_at']
\ No newline at end of file
+        fields = ['id', 'topic', 'content', 'language', 'difficulty_level', 'created_at', 'updated_at']
+
+    def get_content(self, obj):
+        return self.context.get('translations', {}).get(obj.id, obj.blob.content)
+
+    def get_language(self, obj):
+        if obj.id in self.context.get('translations', {}):
+            return self.context['language']
+        return 'english'
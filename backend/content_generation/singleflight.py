@@ -0,0 +1,67 @@
+import asyncio
+import logging
+import threading
+from concurrent.futures import Future
+from core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share the same key.
+
+    The first caller for a key (the leader) runs the function; every caller
+    that arrives while it is still running waits for and receives the same
+    result (or exception) instead of doing the work again.
+
+    Waiters share a thread-safe future, so callers are coalesced even when
+    they run on different event loops (e.g. async views served under WSGI).
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def _join(self, key):
+        """
+        Return (future, leader) for key, registering a new call if none is running
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._calls[key] = future
+
+        if leader:
+            metrics.incr(f"{self.name}.executed")
+        else:
+            metrics.incr(f"{self.name}.coalesced")
+            logger.info(f"Coalesced {self.name} call for key {key}")
+        return future, leader
+
+    def _finish(self, key):
+        with self._lock:
+            self._calls.pop(key, None)
+
+    async def ado(self, key, fn, *args, **kwargs):
+        """
+        Await fn(*args, **kwargs) once for all concurrent callers of key
+        """
+        future, leader = self._join(key)
+        if not leader:
+            # Shield the shared future so a cancelled waiter does not cancel the leader's result
+            return await asyncio.shield(asyncio.wrap_future(future))
+
+        try:
+            result = await fn(*args, **kwargs)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            self._finish(key)
+
@@ -0,0 +1,119 @@
+import json
+from typing import Any, Dict, List, Tuple
+from rest_framework.renderers import BaseRenderer
+
+
+def sse_event(event: str, data: Any) -> str:
+    """
+    Format a server-sent event with a JSON payload
+    """
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+class EventStreamRenderer(BaseRenderer):
+    """
+    Lets DRF views negotiate "Accept: text/event-stream".
+    Regular (non-streaming) responses such as validation errors are
+    rendered as a single "error" event.
+    """
+    media_type = "text/event-stream"
+    format = "sse"
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return sse_event("error", data).encode(self.charset)
+
+
+class IncrementalContentParser:
+    """
+    Incrementally scans the streamed JSON of a ContentResponse and reports
+    the parts that are already complete.
+
+    Text is fed chunk by chunk as it arrives from the model. As soon as the
+    top-level "summary" string or an element of the top-level "sections"
+    array has been closed, it is returned as a ("summary", str) or
+    ("section", dict) event. Every character is scanned exactly once.
+    Leading code fences or prose before the first "{" are ignored.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self._pos = 0
+        self._stack = []
+        self._in_string = False
+        self._escape = False
+        self._string_start = None
+        self._expect_key = False
+        self._key = None
+        self._section_start = None
+
+    def feed(self, text: str) -> List[Tuple[str, Any]]:
+        """
+        Add a chunk of model output and return the events it completed
+        """
+        self.buffer += text
+        events = []
+        buf = self.buffer
+        for i in range(self._pos, len(buf)):
+            ch = buf[i]
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    self._on_string(buf[self._string_start:i + 1], events)
+                continue
+
+            # Ignore anything before the opening brace of the object
+            if not self._stack and ch != "{":
+                continue
+
+            if ch == '"':
+                self._in_string = True
+                self._string_start = i
+            elif ch in "{[":
+                self._stack.append(ch)
+                if len(self._stack) == 1:
+                    self._expect_key = True
+                elif (
+                    ch == "{"
+                    and len(self._stack) == 3
+                    and self._stack[1] == "["
+                    and self._key == "sections"
+                ):
+                    self._section_start = i
+            elif ch in "}]":
+                if ch == "}" and len(self._stack) == 3 and self._section_start is not None:
+                    self._on_section(buf[self._section_start:i + 1], events)
+                    self._section_start = None
+                self._stack.pop()
+            elif len(self._stack) == 1:
+                if ch == ",":
+                    self._expect_key = True
+                elif ch == ":":
+                    self._expect_key = False
+
+        self._pos = len(buf)
+        return events
+
+    def _on_string(self, raw: str, events: List[Tuple[str, Any]]) -> None:
+        if len(self._stack) != 1:
+            return
+        try:
+            value = json.loads(raw)
+        except json.JSONDecodeError:
+            return
+        if self._expect_key:
+            self._key = value
+        elif self._key == "summary":
+            events.append(("summary", value))
+
+    def _on_section(self, raw: str, events: List[Tuple[str, Any]]) -> None:
+        try:
+            section: Dict[str, Any] = json.loads(raw)
+        except json.JSONDecodeError:
+            return
+        events.append(("section", section))
@@ -1,3 +1,463 @@
-from django.test import TestCase
+import asyncio
+import json
+import random
+from typing import Any, Dict, List, Literal, Optional
+from unittest import mock
 
-# Create your tests here.
+from django.test import SimpleTestCase, TestCase, override_settings
+from pydantic import BaseModel, Field
+
+from user_profiles.models import CustomUser
+from .content_generation import FANOUT_MODE, ContentGenerator
+from .json_repair import loads_lenient
+from .models import ContentBlob, ContentTranslation, GeneratedContent
+from .schemas import TopicAnalysis, TranslationResponse, gemini_response_schema, json_generation_config
+from .segments import apply_translations, extract_segments, segment_chunks
+from .singleflight import SingleFlight
+from .streaming import IncrementalContentParser
+from .translater import TranslaterAgent
+from .views import _listing_translations, get_or_translate_blob, link_content_to_user
+
+
+class SingleFlightTests(SimpleTestCase):
+    async def test_concurrent_calls_run_once(self):
+        flight = SingleFlight("test")
+        calls = []
+
+        async def generate(topic):
+            calls.append(topic)
+            await asyncio.sleep(0.01)
+            return {"topic": topic}
+
+        results = await asyncio.gather(*(flight.ado("optics", generate, "Optics") for _ in range(5)))
+        self.assertEqual(calls, ["Optics"])
+        self.assertEqual(results, [{"topic": "Optics"}] * 5)
+
+        # Other keys, and later calls for the same key, run again
+        await asyncio.gather(flight.ado("optics", generate, "Optics"), flight.ado("lenses", generate, "Lenses"))
+        self.assertEqual(sorted(calls), ["Lenses", "Optics", "Optics"])
+
+    async def test_exceptions_are_shared(self):
+        flight = SingleFlight("test")
+        calls = []
+
+        async def fail():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            raise ValueError("model unavailable")
+
+        results = await asyncio.gather(*(flight.ado("optics", fail) for _ in range(3)), return_exceptions=True)
+        self.assertEqual(len(calls), 1)
+        self.assertTrue(all(isinstance(result, ValueError) for result in results))
+
+    async def test_a_cancelled_waiter_does_not_cancel_the_leader(self):
+        flight = SingleFlight("test")
+
+        async def generate():
+            await asyncio.sleep(0.02)
+            return "done"
+
+        leader = asyncio.ensure_future(flight.ado("optics", generate))
+        await asyncio.sleep(0)
+        waiter = asyncio.ensure_future(flight.ado("optics", generate))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await waiter
+        self.assertEqual(await leader, "done")
+
+
+class LoadsLenientTests(SimpleTestCase):
+    def test_valid_json(self):
+        self.assertEqual(loads_lenient('{"topic": "Optics", "sections": []}'), {"topic": "Optics", "sections": []})
+
+    def test_code_fence_and_prose_are_ignored(self):
+        text = 'Here is the lesson:\n```json\n{"topic": "Optics"}\n```\nHope it helps!'
+        self.assertEqual(loads_lenient(text), {"topic": "Optics"})
+
+    def test_trailing_commas(self):
+        self.assertEqual(loads_lenient('{"a": [1, 2, ], "b": 3, }'), {"a": [1, 2], "b": 3})
+
+    def test_missing_commas_between_values(self):
+        text = '{\n  "a": "x"\n  "b": "y"\n}'
+        self.assertEqual(loads_lenient(text), {"a": "x", "b": "y"})
+        self.assertEqual(loads_lenient('[1 2 3]'), [1, 2, 3])
+
+    def test_line_comments(self):
+        text = '{\n  "a": 1, // first\n  "b": 2\n}'
+        self.assertEqual(loads_lenient(text), {"a": 1, "b": 2})
+
+    def test_unescaped_quotes_and_newlines_in_strings(self):
+        text = '{"content": "He said "hello" to\nthe class", "title": "Intro"}'
+        self.assertEqual(loads_lenient(text), {"content": 'He said "hello" to\nthe class', "title": "Intro"})
+
+    def test_python_literals(self):
+        self.assertEqual(loads_lenient('{"a": True, "b": False, "c": None, }'), {"a": True, "b": False, "c": None})
+
+    def test_truncated_inside_a_string(self):
+        text = '{"topic": "Optics", "sections": [{"title": "Lenses", "content": "Light bends wh'
+        self.assertEqual(
+            loads_lenient(text),
+            {"topic": "Optics", "sections": [{"title": "Lenses", "content": "Light bends wh"}]},
+        )
+
+    def test_truncated_after_a_key_drops_the_key(self):
+        self.assertEqual(loads_lenient('{"topic": "Optics", "summary": '), {"topic": "Optics"})
+        self.assertEqual(loads_lenient('{"topic": "Optics", "summ'), {"topic": "Optics"})
+
+    def test_truncated_inside_nested_containers(self):
+        self.assertEqual(loads_lenient('{"a": [1, 2, {"b": [3, "c"'), {"a": [1, 2, {"b": [3, "c"]}]})
+        # A literal at the very end may itself be cut off ("4" of "42") and is dropped
+        self.assertEqual(loads_lenient('{"a": [1, 2, {"b": [3, 4'), {"a": [1, 2, {"b": [3]}]})
+
+    def test_text_without_json_raises(self):
+        with self.assertRaises(json.JSONDecodeError):
+            loads_lenient("The model refused to answer.")
+
+
+class SchemaSection(BaseModel):
+    title: str = Field(description="Section title")
+    level: Literal["easy", "hard"]
+
+
+class SchemaLesson(BaseModel):
+    topic: str
+    note: Optional[str] = Field(default=None, description="Optional note")
+    sections: List[SchemaSection] = Field(min_length=1, max_length=5)
+
+
+class FreeFormLesson(BaseModel):
+    topic: str
+    extra: Dict[str, Any]
+
+
+class GeminiSchemaTests(SimpleTestCase):
+    def test_refs_are_inlined(self):
+        schema = gemini_response_schema(SchemaLesson)
+        self.assertNotIn("$defs", json.dumps(schema))
+        self.assertNotIn("$ref", json.dumps(schema))
+        section = schema["properties"]["sections"]["items"]
+        self.assertEqual(section["type"], "object")
+        self.assertEqual(section["properties"]["title"], {"type": "string", "description": "Section title"})
+        self.assertEqual(section["required"], ["title", "level"])
+
+    def test_optional_becomes_nullable(self):
+        note = gemini_response_schema(SchemaLesson)["properties"]["note"]
+        self.assertEqual(note, {"type": "string", "nullable": True, "description": "Optional note"})
+
+    def test_array_bounds_and_required_fields(self):
+        schema = gemini_response_schema(SchemaLesson)
+        sections = schema["properties"]["sections"]
+        self.assertEqual((sections["min_items"], sections["max_items"]), (1, 5))
+        self.assertNotIn("minItems", sections)
+        # Fields with defaults are requested too
+        self.assertEqual(schema["required"], ["topic", "note", "sections"])
+        self.assertNotIn("title", schema)
+
+    def test_enums(self):
+        level = gemini_response_schema(SchemaLesson)["properties"]["sections"]["items"]["properties"]["level"]
+        self.assertEqual(level, {"type": "string", "enum": ["easy", "hard"], "format": "enum"})
+        difficulty = gemini_response_schema(TopicAnalysis)["properties"]["recommended_difficulty"]
+        self.assertEqual(difficulty["enum"], ["beginner", "intermediate", "advanced"])
+
+    def test_free_form_dicts_are_rejected(self):
+        with self.assertRaises(ValueError):
+            gemini_response_schema(FreeFormLesson)
+
+    def test_generation_config(self):
+        config = json_generation_config(SchemaLesson, base={"temperature": 0.2})
+        self.assertEqual(config["temperature"], 0.2)
+        self.assertEqual(config["response_mime_type"], "application/json")
+        config["response_schema"]["properties"].clear()
+        # Callers get a copy of the cached schema
+        self.assertIn("topic", gemini_response_schema(SchemaLesson)["properties"])
+        self.assertNotIn("response_schema", json_generation_config())
+
+
+LESSON_JSON = json.dumps({
+    "topic": "Optics",
+    "analysis": {"sections": [{"title": "Not a lesson section", "content": "x"}]},
+    "summary": 'Lenses {bend} "light" [a lot]\\',
+    "sections": [
+        {"title": "Lenses", "content": "A \"convex\" lens: {f > 0}", "key_points": ["]", "}"]},
+        {"title": "Mirrors", "content": "Reflection", "summary": "not the lesson summary"},
+    ],
+    "references": ["{\"ref\": 1}"],
+}, indent=2)
+
+EXPECTED_EVENTS = [
+    ("summary", 'Lenses {bend} "light" [a lot]\\'),
+    ("section", {"title": "Lenses", "content": "A \"convex\" lens: {f > 0}", "key_points": ["]", "}"]}),
+    ("section", {"title": "Mirrors", "content": "Reflection", "summary": "not the lesson summary"}),
+]
+
+
+class IncrementalContentParserTests(SimpleTestCase):
+    def _feed(self, text, cuts):
+        parser = IncrementalContentParser()
+        events = []
+        for start, end in zip([0] + cuts, cuts + [len(text)]):
+            events.extend(parser.feed(text[start:end]))
+        return events
+
+    def test_whole_document(self):
+        self.assertEqual(self._feed(LESSON_JSON, []), EXPECTED_EVENTS)
+
+    def test_every_single_split(self):
+        for cut in range(1, len(LESSON_JSON)):
+            self.assertEqual(self._feed(LESSON_JSON, [cut]), EXPECTED_EVENTS, cut)
+
+    def test_arbitrary_chunk_splits(self):
+        rng = random.Random(0)
+        for _ in range(50):
+            cuts = sorted(rng.sample(range(1, len(LESSON_JSON)), rng.randint(1, 40)))
+            self.assertEqual(self._feed(LESSON_JSON, cuts), EXPECTED_EVENTS)
+
+    def test_character_by_character(self):
+        self.assertEqual(self._feed(LESSON_JSON, list(range(1, len(LESSON_JSON)))), EXPECTED_EVENTS)
+
+    def test_leading_code_fence_and_prose(self):
+        text = "Sure, here is the lesson:\n```json\n" + LESSON_JSON + "\n```"
+        self.assertEqual(self._feed(text, [5, 30]), EXPECTED_EVENTS)
+
+    def test_events_are_reported_as_soon_as_complete(self):
+        parser = IncrementalContentParser()
+        end_of_summary = LESSON_JSON.index('",\n  "sections"') + 1
+        self.assertEqual(parser.feed(LESSON_JSON[:end_of_summary - 1]), [])
+        self.assertEqual(parser.feed(LESSON_JSON[end_of_summary - 1:end_of_summary]), EXPECTED_EVENTS[:1])
+
+
+TRANSLATABLE_LESSON = {
+    "topic": "Optics",
+    "summary": "Light and lenses",
+    "difficulty_level": "beginner",
+    "sections": [
+        {"title": "Lenses", "content": "Lenses bend light", "key_points": ["Convex lenses converge", "42"]},
+        {"title": "Mirrors", "content": "Mirrors reflect light", "key_points": ["Convex lenses converge"]},
+    ],
+    "references": ["https://example.com/optics", "Optics for beginners"],
+}
+
+
+class StubMemory:
+    def __init__(self, known):
+        self.known = dict(known)
+        self.stored = {}
+
+    async def lookup(self, texts, language):
+        return {text: self.known[text] for text in texts if text in self.known}
+
+    async def store(self, translations, language):
+        self.stored.update(translations)
+
+
+@mock.patch("content_generation.translater.llm_clients", mock.Mock())
+class SegmentTranslationTests(SimpleTestCase):
+    def _agent(self, drop=()):
+        """Agent whose model leaves out the texts in drop on their first call"""
+        agent = TranslaterAgent()
+        agent.sent = []
+        dropped = set()
+
+        async def translate_segments(texts, language_name):
+            agent.sent.append(list(texts))
+            result = {}
+            for text in texts:
+                if text in drop and text not in dropped:
+                    dropped.add(text)
+                    continue
+                result[text] = f"[{language_name}] {text}"
+            return result
+
+        agent.translate_segments = translate_segments
+        return agent
+
+    def test_segments_skip_identifiers_urls_and_numbers(self):
+        self.assertEqual(extract_segments(TRANSLATABLE_LESSON), [
+            "Optics", "Light and lenses", "Lenses", "Lenses bend light", "Convex lenses converge",
+            "Mirrors", "Mirrors reflect light", "Optics for beginners",
+        ])
+
+    def test_chunks_follow_sections_without_repeating_text(self):
+        self.assertEqual(segment_chunks(TRANSLATABLE_LESSON), [
+            ["Optics", "Light and lenses", "Optics for beginners"],
+            ["Lenses", "Lenses bend light", "Convex lenses converge"],
+            ["Mirrors", "Mirrors reflect light"],
+        ])
+
+    def test_reassembly_keeps_the_structure(self):
+        translated = apply_translations(TRANSLATABLE_LESSON, {"Optics": "prakash", "beginner": "x"})
+        self.assertEqual(translated["topic"], "prakash")
+        self.assertEqual(translated["difficulty_level"], "beginner")
+        self.assertEqual(translated["sections"][0]["key_points"], ["Convex lenses converge", "42"])
+        self.assertEqual(translated["references"][0], "https://example.com/optics")
+
+    async def test_memory_hits_are_never_sent(self):
+        agent = self._agent()
+        memory = StubMemory({"Optics": "prakashiki", "Mirrors reflect light": "darpan"})
+        response = await agent.translate_content(TRANSLATABLE_LESSON, "hindi", memory=memory)
+
+        sent = [text for call in agent.sent for text in call]
+        self.assertNotIn("Optics", sent)
+        self.assertNotIn("Mirrors reflect light", sent)
+        self.assertEqual(len(sent), len(set(sent)))
+        self.assertNotIn("Optics", memory.stored)
+        self.assertIn("Lenses bend light", memory.stored)
+
+        lesson = response.translated_content
+        self.assertTrue(response.complete)
+        self.assertEqual(lesson["topic"], "prakashiki")
+        self.assertEqual(lesson["sections"][1]["content"], "darpan")
+        self.assertEqual(lesson["sections"][1]["key_points"], ["[Hindi] Convex lenses converge"])
+        self.assertEqual(lesson["difficulty_level"], "beginner")
+        self.assertEqual(lesson["references"], ["https://example.com/optics", "[Hindi] Optics for beginners"])
+
+    async def test_a_dropped_segment_is_retried_alone(self):
+        agent = self._agent(drop={"Lenses bend light"})
+        response = await agent.translate_content(TRANSLATABLE_LESSON, "kannada", memory=StubMemory({}))
+
+        self.assertIn(["Lenses bend light"], agent.sent)
+        self.assertEqual(len(agent.sent), 4)
+        self.assertTrue(response.complete)
+        self.assertEqual(response.translated_content["sections"][0]["content"], "[Kannada] Lenses bend light")
+        attempts = {timing["chunk"]: timing["attempts"] for timing in response.chunk_timings}
+        self.assertEqual(attempts, {0: 1, 1: 2, 2: 1})
+
+    @override_settings(TRANSLATION_CHUNK_ATTEMPTS=3)
+    async def test_segments_missing_after_every_attempt_stay_in_english(self):
+        agent = self._agent()
+
+        async def never_returns_lenses(texts, language_name):
+            agent.sent.append(list(texts))
+            return {text: f"[{language_name}] {text}" for text in texts if text != "Lenses bend light"}
+
+        agent.translate_segments = never_returns_lenses
+        response = await agent.translate_content(TRANSLATABLE_LESSON, "hindi")
+        self.assertFalse(response.complete)
+        self.assertIsNone(response.error)
+        self.assertEqual(agent.sent.count(["Lenses bend light"]), 2)
+        self.assertEqual(response.translated_content["sections"][0]["content"], "Lenses bend light")
+        self.assertEqual(response.translated_content["sections"][0]["title"], "[Hindi] Lenses")
+
+    async def test_a_failed_call_is_retried(self):
+        agent = self._agent()
+        translate = agent.translate_segments
+        failures = []
+
+        async def fails_once(texts, language_name):
+            if not failures:
+                failures.append(texts)
+                raise json.JSONDecodeError("Expecting value", "", 0)
+            return await translate(texts, language_name)
+
+        agent.translate_segments = fails_once
+        chunks = [["Lenses", "Lenses bend light"]]
+        translations, timings, error = await agent.translate_chunks(chunks, "Hindi", max_concurrency=1, attempts=2)
+        self.assertEqual(translations, {"Lenses": "[Hindi] Lenses", "Lenses bend light": "[Hindi] Lenses bend light"})
+        self.assertEqual(timings[0]["attempts"], 2)
+        self.assertTrue(timings[0]["complete"])
+        self.assertIn("Invalid JSON", error)
+
+
+class StubTranslaterAgent:
+    calls = []
+
+    async def translate_content(self, content, language, memory=None):
+        self.calls.append(content["topic"])
+        return TranslationResponse(
+            topic=content["topic"],
+            summary=content["summary"],
+            translated_content={**content, "topic": f"{content['topic']} ({language})"},
+            language=language,
+        )
+
+
+@mock.patch("content_generation.views.TranslaterAgent", StubTranslaterAgent)
+class ContentTranslationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [CustomUser.objects.create_user(username=f"user{i}", password="pass") for i in range(2)]
+        cls.blobs = [
+            ContentBlob.objects.create(
+                content_hash=str(i) * 64, topic=f"Topic {i}", difficulty_level="beginner",
+                model_name="model", prompt_version="v1",
+                content={"topic": f"Topic {i}", "summary": "Summary", "sections": []},
+            )
+            for i in range(3)
+        ]
+
+    def setUp(self):
+        StubTranslaterAgent.calls = []
+
+    async def test_a_lesson_is_translated_once_for_every_reader(self):
+        # Two readers of the same shared lesson
+        for _ in self.users:
+            translated, _, error = await get_or_translate_blob(self.blobs[0], "hindi")
+            self.assertIsNone(error)
+            self.assertEqual(translated["topic"], "Topic 0 (hindi)")
+        self.assertEqual(StubTranslaterAgent.calls, ["Topic 0"])
+        self.assertEqual(await ContentTranslation.objects.acount(), 1)
+
+    @override_settings(USER_CONTENTS_MAX_TRANSLATIONS=1)
+    async def test_listing_reuses_stored_translations_and_bounds_new_ones(self):
+        await get_or_translate_blob(self.blobs[0], "kannada")
+        contents = []
+        for blob in self.blobs:
+            link = await GeneratedContent.objects.acreate(
+                user=self.users[1], topic=blob.topic, difficulty_level="beginner", blob=blob
+            )
+            link.blob = blob
+            contents.append(link)
+
+        translations = await _listing_translations(contents, "kannada")
+        self.assertEqual(sorted(translations), [contents[0].id, contents[1].id])
+        self.assertEqual(translations[contents[1].id]["topic"], "Topic 1 (kannada)")
+        self.assertEqual(StubTranslaterAgent.calls, ["Topic 0", "Topic 1"])
+
+
+class LinkContentTests(TestCase):
+    async def test_spellings_of_a_topic_share_one_link(self):
+        user = await CustomUser.objects.acreate_user(username="student", password="pass")
+        blob = await ContentBlob.objects.acreate(
+            content_hash="b" * 64, topic="Ray Optics", difficulty_level="beginner",
+            model_name="model", prompt_version="v1", content={"topic": "Ray Optics"},
+        )
+        first = await link_content_to_user(user, "Ray Optics", "beginner", blob)
+        second = await link_content_to_user(user, "ray  optics ", "beginner", blob)
+        self.assertEqual(first.pk, second.pk)
+        self.assertEqual(await GeneratedContent.objects.filter(user=user).acount(), 1)
+
+
+class StubFanoutModel:
+    """Returns a section for every section prompt, failing the first call for "Lenses" """
+
+    def __init__(self, calls):
+        self.calls = calls
+
+    async def generate_content_async(self, prompt, generation_config=None):
+        if 'section titled "Lenses"' in prompt:
+            self.calls.append("Lenses")
+            if self.calls.count("Lenses") == 1:
+                raise RuntimeError("503 model overloaded")
+            text = json.dumps({"title": "Lenses", "content": "Lenses bend light", "key_points": ["f", "converging"]})
+        elif 'section titled "Mirrors"' in prompt:
+            self.calls.append("Mirrors")
+            text = json.dumps({"title": "Mirrors", "content": "Mirrors reflect light", "key_points": ["r", "virtual image"]})
+        else:
+            self.calls.append("overview")
+            text = json.dumps({"summary": "Light", "references": []})
+        return mock.Mock(text=text)
+
+
+class FanoutGenerationTests(SimpleTestCase):
+    async def test_a_failed_section_is_retried_alone(self):
+        calls = []
+        with mock.patch("content_generation.content_generation.llm_clients") as clients:
+            clients.generative_model.return_value = StubFanoutModel(calls)
+            generator = ContentGenerator("Optics", "beginner", FANOUT_MODE)
+            with self.assertLogs("content_generation.content_generation", "WARNING") as logs:
+                content = await generator.generate_sections_concurrently({"sections": ["Lenses", "Mirrors"]})
+
+        self.assertEqual([section.title for section in content.sections], ["Lenses", "Mirrors"])
+        self.assertEqual(sorted(calls), ["Lenses", "Lenses", "Mirrors", "overview"])
+        self.assertIn("section 'Lenses'", logs.output[0])
@@ -1,40 +1,58 @@
-import os, logging, json
-import google.generativeai as genai
+import os, sys, logging, json
+from pydantic import ValidationError
 from dotenv import load_dotenv
+from django.conf import settings
 
 if __name__ == "__main__":
-    from schemas import TranslationResponse
+    sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+    from schemas import SegmentTranslations, TranslationResponse, json_generation_config
+    from json_repair import loads_lenient
+    from segments import apply_translations, segment_chunks
 else:
-    from .schemas import TranslationResponse
+    from .schemas import SegmentTranslations, TranslationResponse, json_generation_config
+    from .json_repair import loads_lenient
+    from .segments import apply_translations, segment_chunks
+from core.llm import llm_clients
+from core.metrics import metrics
 
 import asyncio
+import time
 
 # Load environment variables
 load_dotenv()
 
-# Configure Gemini API
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+# Languages content can be translated into
+SUPPORTED_LANGUAGES = ["hindi", "kannada"]
 
 class TranslaterAgent:
     def __init__(self):
-        self.model = genai.GenerativeModel("gemini-1.5-flash")
+        self.model = llm_clients.generative_model("gemini-1.5-flash")
+        self.generation_config = json_generation_config(SegmentTranslations)
     
-    async def translate_content(self, content, language="hindi"):
+    async def translate_content(self, content, language="hindi", memory=None):
         """
         Translates content to the specified language using Google Gemini.
+
+        The text segments of the content are translated individually and
+        reassembled into the original structure, so segments already in the
+        translation memory are not sent to the model again. The remaining
+        segments are translated per section, concurrently (see translate_chunks).
         
         Args:
             content: Dictionary containing content to translate
             language: Either "hindi" or "kannada" (defaults to "hindi")
+            memory: Optional translation memory (see translation_memory.TranslationMemory)
             
         Returns:
             TranslationResponse object with the translated content
         """
         # Validate language parameter
-        if language.lower() not in ["hindi", "kannada"]:
+        if language.lower() not in SUPPORTED_LANGUAGES:
             language = "hindi"  # Default to Hindi if invalid
         
-        language_name = "Hindi" if language.lower() == "hindi" else "Kannada"
+        language = language.lower()
+        language_name = "Hindi" if language == "hindi" else "Kannada"
         
         # Parse input content
         content_dict = content
@@ -46,73 +64,143 @@ class TranslaterAgent:
                     topic="Error",
                     summary=f"Failed to parse content as JSON",
                     translated_content={"error": "Invalid JSON input"},
-                    language=language
+                    language=language,
+                    error="Invalid JSON input"
                 )
         
-        # Create a simpler prompt that's easier for the model to handle
+        # Only segments missing from the translation memory are sent to the
+        # model, one job per section
+        chunks = segment_chunks(content_dict)
+        segments = [segment for chunk in chunks for segment in chunk]
+        known = await memory.lookup(segments, language) if memory is not None else {}
+        jobs = [[segment for segment in chunk if segment not in known] for chunk in chunks]
+        jobs = [job for job in jobs if job]
+        missing = sum(len(job) for job in jobs)
+
+        translated, timings, error = await self.translate_chunks(jobs, language_name)
+        if missing and not translated and error is not None:
+            # Every call failed
+            logging.error(f"Translation error: {error}")
+            return TranslationResponse(
+                topic=content_dict.get("topic", "Translation Error"),
+                summary=f"Error translating content to {language_name}: {error}",
+                translated_content={"error": error, "original": content_dict},
+                language=language,
+                chunk_timings=timings,
+                error=error
+            )
+
+        if memory is not None:
+            await memory.store(translated, language)
+        metrics.incr("translation.completed")
+        metrics.incr("translation.segments_sent", missing)
+        if len(translated) < missing:
+            # Left in English rather than failing the whole lesson
+            metrics.incr("translation.untranslated_segments", missing - len(translated))
+
+        # Reassemble the lesson locally from the translated segments, in document order
+        translated_dict = apply_translations(content_dict, {**known, **translated})
+        return TranslationResponse(
+            topic=translated_dict.get("topic", content_dict.get("topic", "")),
+            summary=translated_dict.get("summary", content_dict.get("summary", "")),
+            translated_content=translated_dict,
+            language=language,
+            complete=len(translated) == missing,
+            chunk_timings=timings
+        )
+
+    async def translate_chunks(
+        self,
+        chunks,
+        language_name,
+        max_concurrency=None,
+        attempts=None,
+    ):
+        """
+        Translates chunks of segments concurrently, at most max_concurrency
+        model calls at a time. A chunk whose call fails, or whose response
+        leaves segments out, is retried with only the segments still missing,
+        up to attempts calls per chunk. Both default to the
+        TRANSLATION_CHUNK_CONCURRENCY and TRANSLATION_CHUNK_ATTEMPTS settings.
+
+        Returns (translations, timings, last error): translations maps source
+        texts to their translation, timings holds one entry per chunk in
+        chunk order.
+        """
+        if max_concurrency is None:
+            max_concurrency = settings.TRANSLATION_CHUNK_CONCURRENCY
+        if attempts is None:
+            attempts = settings.TRANSLATION_CHUNK_ATTEMPTS
+        semaphore = asyncio.Semaphore(max(1, max_concurrency))
+        errors = []
+
+        async def translate_chunk(index, texts):
+            translated = {}
+            pending = texts
+            tries = 0
+            async with semaphore:
+                start = time.perf_counter()
+                while pending and tries < attempts:
+                    tries += 1
+                    try:
+                        translated.update(await self.translate_segments(pending, language_name))
+                    except (json.JSONDecodeError, ValidationError) as e:
+                        metrics.incr("translation.parse_failures")
+                        errors.append(f"Invalid JSON in translation response: {str(e)}")
+                    except Exception as e:
+                        errors.append(str(e))
+                    pending = [text for text in pending if text not in translated]
+                    if pending and tries < attempts:
+                        metrics.incr("translation.chunk_retries")
+                duration_ms = (time.perf_counter() - start) * 1000
+
+            metrics.incr("translation.chunks")
+            if pending:
+                metrics.incr("translation.chunk_failures")
+                logging.warning(f"Chunk {index}: {len(pending)} of {len(texts)} segments left untranslated")
+            return translated, {
+                "chunk": index,
+                "segments": len(texts),
+                "attempts": tries,
+                "duration_ms": round(duration_ms, 1),
+                "complete": not pending,
+            }
+
+        results = await asyncio.gather(*(translate_chunk(i, chunk) for i, chunk in enumerate(chunks)))
+        translations = {}
+        for translated, _ in results:
+            translations.update(translated)
+        return translations, [timing for _, timing in results], errors[-1] if errors else None
+
+    async def translate_segments(self, texts, language_name):
+        """
+        Translates a list of text segments with one model call.
+
+        Returns a dictionary mapping each source text to its translation;
+        segments the model left out are missing from it.
+        """
+        request = [{"id": i, "text": text} for i, text in enumerate(texts)]
         prompt = f"""
-Translate the following content from English to {language_name}.
-The content is educational material in JSON format.
-Return ONLY the translated content in the same JSON structure.
+Translate the text of each of the following segments of educational material from English to {language_name}.
 
-Content to translate:
-{json.dumps(content_dict, ensure_ascii=False, indent=2)}
+Segments:
+{json.dumps(request, ensure_ascii=False, separators=(",", ":"))}
 
 Rules:
-1. Maintain the exact same JSON structure
-2. Translate ALL text fields (topic, summary, section titles, content, key points)
-3. Do not translate URLs or code blocks
-4. Return ONLY valid JSON (no explanations or formatting)
+1. Return every segment with its id and the translated text
+2. Do not translate URLs or code blocks
+3. Return ONLY valid JSON (no explanations or formatting)
 """
+        # Native async call on the event loop's own client (see core.llm), no worker thread
+        response = await self.model.generate_content_async(prompt, generation_config=self.generation_config)
 
-        try:
-            # Run the translation as a synchronous call to avoid complexity
-            loop = asyncio.get_event_loop()
-            response = await loop.run_in_executor(
-                None, 
-                lambda: self.model.generate_content(prompt)
-            )
-            
-            # Extract and clean the response text
-            response_text = response.text.strip()
-            
-            # Remove any markdown code block syntax
-            if "```json" in response_text:
-                response_text = response_text.split("```json", 1)[1]
-            if "```" in response_text:
-                if response_text.startswith("```"):
-                    response_text = response_text.split("```", 1)[1]
-                if response_text.endswith("```"):
-                    response_text = response_text.rsplit("```", 1)[0]
-            
-            # Try to parse the JSON response
-            try:
-                translated_dict = json.loads(response_text.strip())
-                
-                # Create the simple response object
-                return TranslationResponse(
-                    topic=translated_dict.get("topic", content_dict.get("topic", "")),
-                    summary=translated_dict.get("summary", content_dict.get("summary", "")),
-                    translated_content=translated_dict,
-                    language=language
-                )
-            except json.JSONDecodeError as e:
-                logging.error(f"Failed to parse translation response as JSON: {str(e)}")
-                return TranslationResponse(
-                    topic=content_dict.get("topic", "Translation Error"),
-                    summary=f"Error parsing translation response as JSON",
-                    translated_content={"error": "Invalid JSON in translation response", "original": content_dict},
-                    language=language
-                )
-                
-        except Exception as e:
-            logging.error(f"Translation error: {str(e)}")
-            return TranslationResponse(
-                topic=content_dict.get("topic", "Translation Error"),
-                summary=f"Error translating content to {language_name}: {str(e)}",
-                translated_content={"error": str(e), "original": content_dict},
-                language=language
-            )
+        # Fences, prose and truncation are repaired locally
+        result = SegmentTranslations(**loads_lenient(response.text))
+        return {
+            texts[segment.id]: segment.text
+            for segment in result.translations
+            if 0 <= segment.id < len(texts) and segment.text.strip()
+        }
 
 
 # Test script for the TranslaterAgent
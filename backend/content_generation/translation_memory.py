@@ -0,0 +1,49 @@
+import logging
+from typing import Dict, Iterable
+
+from core.metrics import metrics
+from .models import TranslationSegment
+from .segments import segment_hash
+
+logger = logging.getLogger(__name__)
+
+
+class TranslationMemory:
+    """
+    Database-backed translation memory used by TranslaterAgent: segments
+    found here are reused, only the rest are sent to the model.
+    """
+
+    async def lookup(self, texts: Iterable[str], language: str) -> Dict[str, str]:
+        """Known translations of texts, keyed by source text"""
+        by_hash = {segment_hash(text): text for text in texts}
+        found = {}
+        rows = TranslationSegment.objects.filter(
+            language=language, source_hash__in=list(by_hash)
+        ).values_list("source_hash", "translated_text")
+        async for source_hash, translated_text in rows:
+            found[by_hash[source_hash]] = translated_text
+        metrics.incr("translation_memory.hits", len(found))
+        metrics.incr("translation_memory.misses", len(by_hash) - len(found))
+        return found
+
+    async def store(self, translations: Dict[str, str], language: str) -> None:
+        """Remember new translations; segments stored concurrently are kept"""
+        if not translations:
+            return
+        await TranslationSegment.objects.abulk_create(
+            [
+                TranslationSegment(
+                    source_hash=segment_hash(text),
+                    language=language,
+                    source_text=text,
+                    translated_text=translated,
+                )
+                for text, translated in translations.items()
+            ],
+            ignore_conflicts=True,
+        )
+        logger.info(f"Stored {len(translations)} translated segments for {language}")
+
+
+translation_memory = TranslationMemory()
@@ -1,8 +1,9 @@
 from django.urls import path
-from .views import generate_content, generate_questions, user_contents, generate_and_download_pdf, translate_content_view
+from .views import generate_content, generate_content_stream, generate_questions, user_contents, generate_and_download_pdf, translate_content_view
 
 urlpatterns = [
     path('generate-content/', generate_content, name='generate_content'),
+    path('generate-content/stream/', generate_content_stream, name='generate_content_stream'),
     path('generate-questions/', generate_questions, name='generate_questions'),
     path('user-contents/', user_contents, name='user_contents'),
     path('generate-lesson-pdf/', generate_and_download_pdf, name='generate_lesson_pdf'),
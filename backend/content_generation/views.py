@@ -1,14 +1,29 @@
 from adrf.decorators import api_view as drf_api_view
-from rest_framework.decorators import permission_classes, api_view
+from rest_framework.decorators import permission_classes, renderer_classes
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.response import Response
 from rest_framework import status
-from .content_generation import generate_content_for_topic
-from .question_generation import QuestionGeneratorAgent
-from .translater import TranslaterAgent
-from .models import GeneratedContent
+from rest_framework.renderers import JSONRenderer
+from django.http import StreamingHttpResponse
+from django.conf import settings
+from .content_generation import (
+    ContentGenerator,
+    generate_content_for_topic,
+    GEMINI_MODEL,
+    PROMPT_VERSION,
+    GENERATION_MODES,
+    FANOUT_MODE,
+)
+from quizzes.bank import get_questions, parse_question_options
+from core.metrics import metrics
+from .translater import TranslaterAgent, SUPPORTED_LANGUAGES
+from .translation_memory import translation_memory
+from .models import ContentBlob, ContentTranslation, GeneratedContent
 from .serializers import GeneratedContentSerializer
 from .utils import generate_lesson_pdf_from_topic
+from .keys import content_address, normalize_topic
+from .singleflight import SingleFlight
+from .streaming import EventStreamRenderer, IncrementalContentParser, sse_event
 import json
 import logging
 import asyncio
@@ -16,81 +31,212 @@ import asyncio
 # Set up logging
 logger = logging.getLogger(__name__)
 
-# Helper function to get or create an event loop safely
-def get_or_create_eventloop():
-    try:
-        return asyncio.get_event_loop()
-    except RuntimeError as ex:
-        if "There is no current event loop in thread" in str(ex):
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            return loop
-        raise
-
-@api_view(['POST'])
+# Concurrent requests for the same content address share a single generation
+content_generation_flight = SingleFlight("generate_content")
+# Concurrent requests for the same translation share a single model call
+translation_flight = SingleFlight("translate_content")
+
+async def _generate_blob(topic, difficulty, mode, content_hash):
+    """
+    Generate content for a topic and store it in the shared blob table.
+    Runs once per in-flight content address.
+    """
+    logger.info(f"Generating new content for topic: '{topic}' at {difficulty} level")
+    content = await generate_content_for_topic(topic, difficulty, mode)
+    return await store_blob(topic, difficulty, content_hash, content)
+
+async def store_blob(topic, difficulty, content_hash, content):
+    """
+    Store generated content under its content address
+    """
+    # Another worker process may have stored the same address in the meantime
+    blob, created = await ContentBlob.objects.aget_or_create(
+        content_hash=content_hash,
+        defaults={
+            "topic": topic,
+            "difficulty_level": difficulty,
+            "model_name": GEMINI_MODEL,
+            "prompt_version": PROMPT_VERSION,
+            "content": content,
+        },
+    )
+    logger.info(f"Saved new content to database for topic: '{topic}'")
+    return blob
+
+async def get_or_generate_blob(topic, difficulty, mode):
+    """
+    Return the shared ContentBlob for a topic and difficulty, generating it
+    only if no user has requested it before.
+    """
+    content_hash = content_address(topic, difficulty, GEMINI_MODEL, PROMPT_VERSION)
+    blob = await ContentBlob.objects.filter(content_hash=content_hash).afirst()
+    if blob is not None:
+        logger.info(f"Retrieved existing content for topic: '{topic}' at {difficulty} level")
+        return blob
+
+    # Identical requests that arrive while a generation is running wait for its result
+    return await content_generation_flight.ado(
+        content_hash, _generate_blob, topic, difficulty, mode, content_hash
+    )
+
+async def link_content_to_user(user, topic, difficulty, blob):
+    """
+    Record that the user requested this content, pointing the link at the
+    current blob for the topic. Links are keyed by the normalized topic, as
+    blobs are, so "Ray Optics" and "ray optics " share one link.
+    """
+    link, created = await GeneratedContent.objects.aget_or_create(
+        user=user,
+        topic=normalize_topic(topic),
+        difficulty_level=difficulty,
+        defaults={"blob": blob},
+    )
+    if not created and link.blob_id != blob.id:
+        link.blob = blob
+        await link.asave(update_fields=["blob", "updated_at"])
+    return link
+
+def server_timing(timings):
+    """
+    Server-Timing header value for the per-chunk timings of a translation
+    """
+    return ", ".join(
+        f'translate-chunk-{t["chunk"]};dur={t["duration_ms"]};desc="{t["segments"]} segments, {t["attempts"]} attempts"'
+        for t in timings
+    )
+
+async def _translate_and_store(blob, language):
+    translation = await TranslaterAgent().translate_content(blob.content, language, memory=translation_memory)
+    translated = translation.translated_content
+    if translation.error is not None or not translation.complete:
+        # Failed or partial translations are returned but not stored
+        return translated, translation.chunk_timings, translation.error
+    # Another worker process may have stored the same translation in the meantime
+    await ContentTranslation.objects.aget_or_create(
+        blob=blob,
+        language=language,
+        defaults={"translated_content": translated},
+    )
+    return translated, translation.chunk_timings, None
+
+async def get_or_translate_blob(blob, language):
+    """
+    Return a shared ContentBlob in the given language, translating and
+    storing it only if no user has read it in that language before.
+
+    Returns (translated content, per-chunk timings, error); timings are
+    empty when the stored translation was used, error is None unless the
+    content could not be translated.
+    """
+    stored = await ContentTranslation.objects.filter(blob=blob, language=language).afirst()
+    if stored is not None:
+        metrics.incr("content_translation.hits")
+        return stored.translated_content, [], None
+
+    metrics.incr("content_translation.misses")
+    return await translation_flight.ado(f"{blob.content_hash}:{language}", _translate_and_store, blob, language)
+
+async def _listing_translations(contents, language):
+    """
+    Translations of a user's listed contents (content id to translated
+    JSON): every stored translation of their blobs, plus a bounded number
+    of new ones. Contents left out are listed untranslated.
+    """
+    blobs = {content.blob_id: content.blob for content in contents}
+    translated_blobs = {}
+    rows = ContentTranslation.objects.filter(blob_id__in=blobs, language=language).values_list(
+        'blob_id', 'translated_content'
+    )
+    async for blob_id, translated_content in rows:
+        translated_blobs[blob_id] = translated_content
+    metrics.incr("content_translation.hits", len(translated_blobs))
+
+    missing = [blob for blob_id, blob in blobs.items() if blob_id not in translated_blobs]
+    to_translate = missing[:settings.USER_CONTENTS_MAX_TRANSLATIONS]
+    if len(missing) > len(to_translate):
+        metrics.incr("content_translation.deferred", len(missing) - len(to_translate))
+
+    semaphore = asyncio.Semaphore(settings.USER_CONTENTS_TRANSLATION_CONCURRENCY)
+
+    async def translate(blob):
+        async with semaphore:
+            return await get_or_translate_blob(blob, language)
+
+    results = await asyncio.gather(*(translate(blob) for blob in to_translate))
+    for blob, (translated, _, error) in zip(to_translate, results):
+        if error is None:
+            translated_blobs[blob.id] = translated
+    return {
+        content.id: translated_blobs[content.blob_id]
+        for content in contents
+        if content.blob_id in translated_blobs
+    }
+
+def _parse_generation_request(data):
+    """
+    Extract topic, difficulty and generation mode from a content generation request.
+    Returns (topic, difficulty, mode, None) or (None, None, None, error_response).
+    """
+    topic = data.get('topic')
+    
+    # Validate input
+    if not topic:
+        return None, None, None, Response(
+            {"error": "A topic is required"}, 
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    # Get optional difficulty parameter (default to intermediate)
+    difficulty = data.get('difficulty', 'intermediate')
+    
+    # Validate difficulty
+    valid_difficulties = ["beginner", "intermediate", "advanced"]
+    if difficulty.lower() not in valid_difficulties:
+        return None, None, None, Response(
+            {"error": f"Difficulty must be one of: {', '.join(valid_difficulties)}"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    # Get optional generation mode (defaults to the CONTENT_GENERATION_MODE setting)
+    mode = data.get('mode', settings.CONTENT_GENERATION_MODE)
+    if mode not in GENERATION_MODES:
+        return None, None, None, Response(
+            {"error": f"Mode must be one of: {', '.join(GENERATION_MODES)}"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    return topic, difficulty.lower(), mode, None
+
+@drf_api_view(['POST'])
 @permission_classes([IsAuthenticated])
-def generate_content(request):
+async def generate_content(request):
     """
     Generate educational content based on a provided topic.
     
     Expected POST data:
     {
         "topic": "The topic to generate content for",
-        "difficulty": "beginner|intermediate|advanced" (optional)
+        "difficulty": "beginner|intermediate|advanced" (optional),
+        "mode": "two_step|single|fanout" (optional, defaults to the CONTENT_GENERATION_MODE setting)
     }
     
-    If the content for a topic with the specified difficulty level already exists
-    for the current user, it will be retrieved from the database instead of generating new content.
+    If the content for a topic with the specified difficulty level has already been
+    generated (by any user), it will be retrieved from the database instead of generating
+    new content. Concurrent requests for the same topic and difficulty are coalesced
+    into a single generation.
     """
     try:
-        # Extract data from request
-        data = request.data
-        topic = data.get('topic')
-        
-        # Validate input
-        if not topic:
-            return Response(
-                {"error": "A topic is required"}, 
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
-        # Get optional difficulty parameter (default to intermediate)
-        difficulty = data.get('difficulty', 'intermediate')
-        
-        # Validate difficulty
-        valid_difficulties = ["beginner", "intermediate", "advanced"]
-        if difficulty.lower() not in valid_difficulties:
-            return Response(
-                {"error": f"Difficulty must be one of: {', '.join(valid_difficulties)}"},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-            
-        # Check if content already exists for this topic and difficulty
-        try:
-            existing_content = GeneratedContent.objects.get(
-                topic=topic,
-                difficulty_level=difficulty.lower(),
-                user=request.user
-            )
-            logger.info(f"Retrieved existing content for topic: '{topic}' at {difficulty} level")
-            return Response(existing_content.content, status=status.HTTP_200_OK)
-        except GeneratedContent.DoesNotExist:
-            # Generate new content if it doesn't exist
-            logger.info(f"Generating new content for topic: '{topic}' at {difficulty} level")
-            content = generate_content_for_topic(topic, difficulty.lower())
-            
-            # Store the generated content in the database
-            new_content = GeneratedContent(
-                topic=topic,
-                content=content,
-                difficulty_level=difficulty.lower(),
-                user=request.user
-            )
-            new_content.save()
-            logger.info(f"Saved new content to database for topic: '{topic}'")
+        # Extract and validate data from request
+        topic, difficulty, mode, error_response = _parse_generation_request(request.data)
+        if error_response is not None:
+            return error_response
             
-            # Return the generated content
-            return Response(content, status=status.HTTP_200_OK)
+        # Content is shared between users: any previously generated lesson for this
+        # topic and difficulty is served from the database instead of regenerating it
+        blob = await get_or_generate_blob(topic, difficulty, mode)
+        await link_content_to_user(request.user, topic, difficulty, blob)
+
+        return Response(blob.content, status=status.HTTP_200_OK)
         
     except ValueError as e:
         # Handle expected errors from content generation
@@ -107,78 +253,114 @@ def generate_content(request):
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
         )
     
+async def _content_event_stream(topic, difficulty, mode, user):
+    """
+    Yield server-sent events for a lesson while it is being generated
+    """
+    content_hash = content_address(topic, difficulty, GEMINI_MODEL, PROMPT_VERSION)
+
+    # Previously generated content is replayed straight from the database
+    blob = await ContentBlob.objects.filter(content_hash=content_hash).afirst()
+    if blob is not None:
+        logger.info(f"Streaming existing content for topic: '{topic}' at {difficulty} level")
+        await link_content_to_user(user, topic, difficulty, blob)
+        yield sse_event("summary", blob.content.get("summary", ""))
+        for section in blob.content.get("sections", []):
+            yield sse_event("section", section)
+        yield sse_event("done", blob.content)
+        return
+
+    try:
+        logger.info(f"Streaming new content for topic: '{topic}' at {difficulty} level")
+        generator = ContentGenerator(topic=topic, difficulty=difficulty, mode=mode)
+        parser = IncrementalContentParser()
+        async for chunk in generator.stream_content():
+            for event, data in parser.feed(chunk):
+                yield sse_event(event, data)
+
+        # Validate the complete response and persist it like generate_content does
+        content = (await generator.parse_content(parser.buffer)).model_dump()
+        blob = await store_blob(topic, difficulty, content_hash, content)
+        await link_content_to_user(user, topic, difficulty, blob)
+        yield sse_event("done", blob.content)
+    except Exception as e:
+        logger.exception(f"Error streaming content for topic '{topic}': {str(e)}")
+        yield sse_event("error", {"error": f"Content generation failed: {str(e)}"})
+
+@drf_api_view(['POST'])
+@permission_classes([IsAuthenticated])
+@renderer_classes([JSONRenderer, EventStreamRenderer])
+async def generate_content_stream(request):
+    """
+    Stream educational content for a topic as server-sent events.
+    
+    Expects the same POST data as generate_content ("fanout" mode is not
+    supported and is rejected). Emits:
+        summary: the lesson summary, as soon as it has been generated
+        section: each content section, as soon as it has been generated
+        done:    the full validated content, after it has been stored
+        error:   {"error": "..."} if generation fails
+    
+    Previously generated content is replayed from the database immediately.
+    """
+    topic, difficulty, mode, error_response = _parse_generation_request(request.data)
+    if error_response is not None:
+        return error_response
+    if mode == FANOUT_MODE:
+        return Response(
+            {"error": "Streaming does not support the fanout mode"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    response = StreamingHttpResponse(
+        _content_event_stream(topic, difficulty, mode, request.user),
+        content_type="text/event-stream",
+    )
+    response["Cache-Control"] = "no-cache"
+    # Disable proxy buffering so events reach the client as they are produced
+    response["X-Accel-Buffering"] = "no"
+    return response
+    
 @drf_api_view(['POST'])
 @permission_classes([AllowAny])
 async def generate_questions(request):
     """
     Generate multiple-choice questions based on provided content.
     
+    Questions are kept in a question bank keyed by the content hash and
+    difficulty. Requests are served by sampling from the bank, and only the
+    questions it is missing are generated. This is the practice bank: the
+    answers returned here are never those of quiz questions (see quizzes.views).
+    
     Expected POST data:
     {
         "content": "The content to generate questions from",
-        "num_questions": 5, (5 by default)
-        "difficulty": "beginner|intermediate|advanced" (optional)
+        "num_questions": 5, (5 by default, at most MAX_QUESTIONS)
+        "difficulty": "beginner|intermediate|advanced" (optional, defaults to beginner),
+        "mode": "single|chunked" (optional, defaults to the QUESTION_GENERATION_MODE setting)
     }
+    
+    In "chunked" mode questions are generated per group of lesson sections
+    in parallel and merged, so no call carries the whole lesson. The response
+    includes a token budget report of the generation ("token_budget", null
+    when every question came from the bank).
     """
     try:
-        agent = QuestionGeneratorAgent()
         data = request.data
         content = data.get('content', '')
-        num_questions = data.get('num_questions', 5)
-        difficulty = data.get('difficulty', 'easy')
-        
-        # Try to use the existing event loop safely
-        try:
-            # Get the current event loop or create a new one if needed
-            loop = get_or_create_eventloop()
-            questions = await agent.generate_questions(
-                str(content),
-                num_questions=num_questions,
-                difficulty=difficulty
-            )
-        except Exception as loop_error:
-            # If there's an event loop error, create a new one and try again
-            if "Event loop is closed" in str(loop_error):
-                logger.info("Event loop was closed. Creating a new one...")
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
-                questions = await agent.generate_questions(
-                    str(content),
-                    num_questions=num_questions,
-                    difficulty=difficulty
-                )
-            else:
-                # Re-raise if it's not an event loop issue
-                raise
+        options, error = parse_question_options(data)
+        if error is not None:
+            return Response({"error": error}, status=status.HTTP_400_BAD_REQUEST)
+        num_questions, difficulty, mode = options
         
-        # Convert each ResponseQuestions object to a dictionary
-        serialized_questions = []
-        for question in questions:
-            # Determine the answer string based on the selected option
-            if question.answer_option.lower() == 'a':
-                answer_text = question.option_a
-            elif question.answer_option.lower() == 'b':
-                answer_text = question.option_b
-            elif question.answer_option.lower() == 'c':
-                answer_text = question.option_c
-            elif question.answer_option.lower() == 'd':
-                answer_text = question.option_d
-            else:
-                answer_text = ""
-                
-            question_dict = {
-                'question': question.question,
-                'option_a': question.option_a,
-                'option_b': question.option_b,
-                'option_c': question.option_c,
-                'option_d': question.option_d,
-                'answer_option': question.answer_option,
-                'answer_string': answer_text
-            }
-            serialized_questions.append(question_dict)
+        # Questions come from the bank for this lesson; only the shortfall is generated
+        serialized_questions, token_budget = await get_questions(content, num_questions, difficulty, mode)
         
         # Return the serialized questions
-        return Response({"questions": serialized_questions}, status=status.HTTP_200_OK)
+        return Response(
+            {"questions": serialized_questions, "token_budget": token_budget},
+            status=status.HTTP_200_OK
+        )
         
     except Exception as e:
         logger.exception(f"Error generating questions: {str(e)}")
@@ -187,23 +369,45 @@ async def generate_questions(request):
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
         )
 
-@api_view(['GET'])
+@drf_api_view(['GET'])
 @permission_classes([IsAuthenticated])
-def user_contents(request):
+async def user_contents(request):
     """
     Retrieve all GeneratedContent objects related to the authenticated user.
     
     This endpoint returns all educational content generated by the current user.
+    With ?language=hindi|kannada the content is returned translated, from
+    the translations stored for the shared lessons. At most
+    USER_CONTENTS_MAX_TRANSLATIONS other lessons are translated per request,
+    USER_CONTENTS_TRANSLATION_CONCURRENCY at a time; the rest are listed in
+    English ("language": "english") and translated by later requests.
     """
     try:
         # Get the current authenticated user
         user = request.user
+        language = request.query_params.get('language', '').strip().lower() or None
+        if language is not None and language not in SUPPORTED_LANGUAGES:
+            return Response(
+                {"error": f"Language must be one of: {', '.join(SUPPORTED_LANGUAGES)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
-        # Retrieve all GeneratedContent objects for this user
-        contents = GeneratedContent.objects.filter(user=user)
+        # Retrieve all GeneratedContent objects for this user, evaluating the
+        # queryset asynchronously so serialization does not hit the database
+        contents = [
+            content
+            async for content in GeneratedContent.objects.filter(user=user).select_related('blob')
+        ]
         
+        context = {}
+        if language is not None:
+            context = {
+                "language": language,
+                "translations": await _listing_translations(contents, language),
+            }
+
         # Serialize the data
-        serializer = GeneratedContentSerializer(contents, many=True)
+        serializer = GeneratedContentSerializer(contents, many=True, context=context)
         
         # Return the serialized data
         return Response(serializer.data, status=status.HTTP_200_OK)
@@ -215,9 +419,9 @@ def user_contents(request):
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
         )
 
-@api_view(["POST"])
+@drf_api_view(["POST"])
 @permission_classes([IsAuthenticated])
-def generate_and_download_pdf(request):
+async def generate_and_download_pdf(request):
     try:
         # Try to safely get the request data
         try:
@@ -272,7 +476,8 @@ def generate_and_download_pdf(request):
                 if isinstance(q, dict) and 'answer_option' in q and 'answer' not in q:
                     q['answer'] = q['answer_option'].lower()
 
-        return generate_lesson_pdf_from_topic(topic, content_json, questions)
+        # Rendering the PDF is CPU-bound, keep it off the event loop
+        return await asyncio.to_thread(generate_lesson_pdf_from_topic, topic, content_json, questions)
 
     except Exception as e:
         logger.exception(f"PDF generation error: {str(e)}")
@@ -286,6 +491,9 @@ async def translate_content_view(request):
     
     Expected POST data:
     {
+        "content_id": 12, (id of one of the user's generated contents; the
+                           translation stored for its lesson is reused)
+        or
         "content": {
             "topic": "Topic title",
             "summary": "Content summary",
@@ -313,6 +521,25 @@ async def translate_content_view(request):
         content = data.get('content', data)  # If 'content' key doesn't exist, use entire data object
         language = data.get('language', 'hindi').lower()
         
+        content_id = data.get('content_id')
+        if content_id is not None:
+            if language not in SUPPORTED_LANGUAGES:
+                language = "hindi"  # Default to Hindi if invalid, as for inline content
+            try:
+                link = await GeneratedContent.objects.select_related('blob').aget(pk=content_id, user=request.user)
+            except (GeneratedContent.DoesNotExist, ValueError):
+                return Response({"error": "Content not found"}, status=status.HTTP_404_NOT_FOUND)
+            translated, timings, error = await get_or_translate_blob(link.blob, language)
+            if error is not None:
+                return Response(
+                    {"error": f"Translation failed: {error}"},
+                    status=status.HTTP_500_INTERNAL_SERVER_ERROR
+                )
+            response = Response(translated, status=status.HTTP_200_OK)
+            if timings:
+                response["Server-Timing"] = server_timing(timings)
+            return response
+
         # Create an instance of the TranslaterAgent
         agent = TranslaterAgent()
         
@@ -320,11 +547,15 @@ async def translate_content_view(request):
         logger.info(f"Starting translation to {language}...")
         try:
             # Get translation response
-            translation = await agent.translate_content(content, language)
+            translation = await agent.translate_content(content, language, memory=translation_memory)
             logger.info(f"Translation to {language} completed successfully")
             
-            # Return the translated content directly from the response
-            return Response(translation.translated_content, status=status.HTTP_200_OK)
+            # Return the translated content directly from the response,
+            # with the time spent on every section in the Server-Timing header
+            response = Response(translation.translated_content, status=status.HTTP_200_OK)
+            if translation.chunk_timings:
+                response["Server-Timing"] = server_timing(translation.chunk_timings)
+            return response
             
         except Exception as e:
             logger.error(f"Translation error: {str(e)}")
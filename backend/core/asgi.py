@@ -13,4 +13,15 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from django.conf import settings  # noqa: E402
+from django.urls import reverse  # noqa: E402
+
+from chatbot.audio import MULTIPART_ALLOWANCE_BYTES  # noqa: E402
+from core.body_limits import BodySizeLimitMiddleware  # noqa: E402
+
+# Uploads are capped before Django spools the request body to disk
+application = BodySizeLimitMiddleware(django_application, {
+    reverse('chatbot:transcribe_audio'): settings.TRANSCRIBE_MAX_UPLOAD_BYTES + MULTIPART_ALLOWANCE_BYTES,
+})
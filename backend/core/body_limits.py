@@ -0,0 +1,86 @@
+import json
+import logging
+from typing import Dict, Optional
+
+from .metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class BodyTooLarge(Exception):
+    """Raised from receive() once a request body grows past its limit"""
+
+
+class BodySizeLimitMiddleware:
+    """
+    ASGI middleware capping request bodies per path prefix.
+
+    Django's ASGIHandler reads the whole body into a temporary file before
+    any view or upload handler runs, so a limit checked there only applies
+    after the client has written everything to disk. This rejects a body
+    with 413 as soon as its Content-Length, or the bytes actually received,
+    exceed the limit of its path.
+    """
+
+    def __init__(self, app, limits: Dict[str, int]):
+        self.app = app
+        self.limits = limits
+
+    def _limit(self, path: str) -> Optional[int]:
+        for prefix, limit in self.limits.items():
+            if path.startswith(prefix):
+                return limit
+        return None
+
+    async def __call__(self, scope, receive, send):
+        limit = self._limit(scope["path"]) if scope["type"] == "http" else None
+        if limit is None:
+            return await self.app(scope, receive, send)
+
+        headers = dict(scope.get("headers") or [])
+        try:
+            content_length = int(headers.get(b"content-length", b"0"))
+        except ValueError:
+            content_length = 0
+        if content_length > limit:
+            return await self._reject(scope, send, limit)
+
+        received = 0
+        response_started = False
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    raise BodyTooLarge()
+            return message
+
+        async def tracked_send(message):
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, tracked_send)
+        except BodyTooLarge:
+            if response_started:
+                raise
+            await self._reject(scope, send, limit)
+
+    async def _reject(self, scope, send, limit: int) -> None:
+        metrics.incr("request_body.rejected_size")
+        logger.warning(f"Rejected request body over {limit} bytes for {scope['path']}")
+        body = json.dumps({"error": f"Request body is larger than {limit // (1024 * 1024)} MB"}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 413,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"connection", b"close"),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,116 @@
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+from .metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class ExecutorSaturated(Exception):
+    """Raised when a provider's executor already has its maximum number of calls queued"""
+
+
+class ProviderExecutor:
+    """
+    Named, bounded thread pool for the blocking client of one external
+    provider.
+
+    Each provider gets its own workers, so a slow or hanging provider can
+    only exhaust its own pool instead of the event loop's default executor
+    shared by everything else in the process. Calls beyond max_queue waiting
+    for a worker are rejected with ExecutorSaturated rather than piling up.
+
+    Counters executor.<name>.submitted / completed / failed / rejected and
+    the total time calls waited for a worker (wait_ms) go to core.metrics;
+    the current queue depth is reported by gauges().
+    """
+
+    def __init__(self, name: str, max_workers: int, max_queue: int):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"{name}-executor")
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._running = 0
+        self._peak_queued = 0
+
+    def _metric(self, name: str) -> str:
+        return f"executor.{self.name}.{name}"
+
+    async def run(self, fn, *args, **kwargs):
+        """Run a blocking call on this provider's workers and await its result"""
+        with self._lock:
+            if self._queued >= self.max_queue:
+                metrics.incr(self._metric("rejected"))
+                raise ExecutorSaturated(f"Too many pending {self.name} requests, try again later")
+            self._queued += 1
+            self._peak_queued = max(self._peak_queued, self._queued)
+        metrics.incr(self._metric("submitted"))
+        submitted_at = time.perf_counter()
+
+        # A call cancelled while still queued is abandoned and never runs
+        state = {"started": False, "abandoned": False}
+
+        def call():
+            wait_ms = (time.perf_counter() - submitted_at) * 1000
+            with self._lock:
+                if state["abandoned"]:
+                    return None
+                state["started"] = True
+                self._queued -= 1
+                self._running += 1
+            metrics.incr(self._metric("wait_ms"), int(wait_ms))
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self._running -= 1
+
+        loop = asyncio.get_running_loop()
+        try:
+            result = await loop.run_in_executor(self._executor, call)
+        except Exception:
+            metrics.incr(self._metric("failed"))
+            raise
+        finally:
+            with self._lock:
+                if not state["started"]:
+                    state["abandoned"] = True
+                    self._queued -= 1
+        metrics.incr(self._metric("completed"))
+        return result
+
+    def gauges(self) -> dict:
+        """Current queue depth, running calls and the deepest queue seen"""
+        with self._lock:
+            return {
+                self._metric("queued"): self._queued,
+                self._metric("running"): self._running,
+                self._metric("peak_queued"): self._peak_queued,
+                self._metric("max_workers"): self.max_workers,
+            }
+
+
+# Gemini is called through its native async clients (see core.llm) and needs no executor
+deepgram_executor = ProviderExecutor(
+    "deepgram", max_workers=settings.DEEPGRAM_EXECUTOR_WORKERS, max_queue=settings.DEEPGRAM_EXECUTOR_MAX_QUEUE
+)
+youtube_executor = ProviderExecutor(
+    "youtube", max_workers=settings.YOUTUBE_EXECUTOR_WORKERS, max_queue=settings.YOUTUBE_EXECUTOR_MAX_QUEUE
+)
+
+EXECUTORS = {executor.name: executor for executor in (deepgram_executor, youtube_executor)}
+
+
+def executor_gauges() -> dict:
+    """Gauges of every provider executor, keyed like the metrics counters"""
+    gauges = {}
+    for executor in EXECUTORS.values():
+        gauges.update(executor.gauges())
+    return gauges
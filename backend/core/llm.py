@@ -0,0 +1,139 @@
+import asyncio
+import logging
+import os
+import threading
+import weakref
+
+import google.generativeai as genai
+from google.generativeai import client as genai_client
+import httpx
+from django.conf import settings
+from dotenv import load_dotenv
+from pydantic_ai.models.gemini import GeminiModel
+from pydantic_ai.providers.google_gla import GoogleGLAProvider
+
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+# Configure Gemini API once per process
+genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+
+# Idle connections in the pool shared by every pydantic-ai agent talking to
+# Gemini are kept alive this long, so requests skip the TCP/TLS handshake
+HTTP_KEEPALIVE_EXPIRY = 60
+# Same timeouts pydantic-ai uses for its default client
+HTTP_TIMEOUT = httpx.Timeout(timeout=600, connect=5)
+
+# HTTP/2 multiplexes concurrent requests over one connection, but needs the optional h2 package
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+class LLMClientRegistry:
+    """
+    Process-wide registry of long-lived LLM clients.
+
+    Async clients hold connections bound to the event loop that opened them
+    (google-generativeai's cached gRPC channel fails with "Event loop is
+    closed" once used from a second loop), so they are kept per running
+    loop and closed when that loop shuts down. Connections are only reused
+    across requests under ASGI (core.asgi), where every request runs on the
+    worker's loop. Async views served under WSGI get a fresh loop per
+    request, so their clients live for one request and are closed with it.
+
+    google-generativeai models use a dedicated gRPC async client per loop.
+    pydantic-ai models share one pooled httpx.AsyncClient per loop.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._generative_models = {}
+        self._loop_clients = weakref.WeakKeyDictionary()
+
+    def _clients(self) -> dict:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            clients = self._loop_clients.get(loop)
+            if clients is None:
+                clients = {"generative": {}, "gemini": {}, "provider": None, "http": None, "grpc": None}
+                clients["closer"] = loop.create_task(self._close_on_shutdown(loop, clients))
+                self._loop_clients[loop] = clients
+            return clients
+
+    async def _close_on_shutdown(self, loop, clients) -> None:
+        """
+        Wait for the loop to shut down, then close its clients. asyncio.run
+        (which asgiref uses for every request under WSGI) and ASGI servers
+        cancel the tasks still pending before closing their loop.
+        """
+        try:
+            await loop.create_future()
+        except asyncio.CancelledError:
+            pass
+        with self._lock:
+            self._loop_clients.pop(loop, None)
+        if clients["http"] is not None:
+            await clients["http"].aclose()
+        if clients["grpc"] is not None:
+            await clients["grpc"].transport.close()
+
+    def generative_model(self, model_name: str) -> genai.GenerativeModel:
+        """
+        Return the shared google-generativeai model for model_name.
+        Inside a coroutine the model belongs to the running event loop.
+        """
+        try:
+            clients = self._clients()
+        except RuntimeError:
+            # Synchronous callers share one model per process
+            with self._lock:
+                model = self._generative_models.get(model_name)
+                if model is None:
+                    model = genai.GenerativeModel(model_name)
+                    self._generative_models[model_name] = model
+                return model
+
+        with self._lock:
+            model = clients["generative"].get(model_name)
+            if model is None:
+                if clients["grpc"] is None:
+                    # The library default is a single process-wide async client and
+                    # it has no public way to pass another one: these private hooks
+                    # are checked by core/tests.py against the version pinned in
+                    # requirements.txt (google-generativeai==0.8.4)
+                    clients["grpc"] = genai_client._client_manager.make_client("generative_async")
+                model = genai.GenerativeModel(model_name)
+                model._async_client = clients["grpc"]
+                clients["generative"][model_name] = model
+            return model
+
+    def gemini_model(self, model_name: str) -> GeminiModel:
+        """
+        Return the shared pydantic-ai model for model_name.
+        Must be called from a coroutine running on the loop that will use it.
+        """
+        clients = self._clients()
+        with self._lock:
+            model = clients["gemini"].get(model_name)
+            if model is None:
+                if clients["provider"] is None:
+                    limits = httpx.Limits(
+                        max_connections=settings.LLM_MAX_CONNECTIONS,
+                        max_keepalive_connections=settings.LLM_MAX_KEEPALIVE_CONNECTIONS,
+                        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+                    )
+                    clients["http"] = httpx.AsyncClient(limits=limits, timeout=HTTP_TIMEOUT, http2=HTTP2_AVAILABLE)
+                    clients["provider"] = GoogleGLAProvider(
+                        api_key=os.getenv("GEMINI_API_KEY"), http_client=clients["http"]
+                    )
+                    logger.info(f"Created Gemini HTTP client (http2={HTTP2_AVAILABLE})")
+                model = GeminiModel(model_name, provider=clients["provider"])
+                clients["gemini"][model_name] = model
+            return model
+
+
+llm_clients = LLMClientRegistry()
@@ -0,0 +1,37 @@
+import threading
+from collections import defaultdict
+
+
+class Metrics:
+    """
+    Process-wide counters used to observe caching and coalescing behaviour.
+
+    Values are kept in memory per worker process and can be read through
+    the /api/metrics/ endpoint (staff only).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = defaultdict(int)
+
+    def incr(self, name, amount=1):
+        """Increment a named counter"""
+        with self._lock:
+            self._counters[name] += amount
+
+    def get(self, name):
+        """Return the current value of a counter (0 if never incremented)"""
+        with self._lock:
+            return self._counters.get(name, 0)
+
+    def snapshot(self):
+        """Return a copy of all counters"""
+        with self._lock:
+            return dict(self._counters)
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+
+
+metrics = Metrics()
@@ -20,6 +20,80 @@ ALLOWED_HOSTS = []
 GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
 YOUTUBE_API_KEY = os.getenv('YOUTUBE_API_KEY')
 
+# Connection pool shared by every pydantic-ai agent talking to Gemini (per event loop)
+LLM_MAX_CONNECTIONS = int(os.getenv('LLM_MAX_CONNECTIONS', '100'))
+LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv('LLM_MAX_KEEPALIVE_CONNECTIONS', '20'))
+
+# Threads running blocking provider client calls (core.executors), and how many
+# calls may wait for one before requests are turned away with 503
+DEEPGRAM_EXECUTOR_WORKERS = int(os.getenv('DEEPGRAM_EXECUTOR_WORKERS', '4'))
+DEEPGRAM_EXECUTOR_MAX_QUEUE = int(os.getenv('DEEPGRAM_EXECUTOR_MAX_QUEUE', '32'))
+YOUTUBE_EXECUTOR_WORKERS = int(os.getenv('YOUTUBE_EXECUTOR_WORKERS', '4'))
+YOUTUBE_EXECUTOR_MAX_QUEUE = int(os.getenv('YOUTUBE_EXECUTOR_MAX_QUEUE', '32'))
+
+# Content generation
+# "two_step" (separate topic analysis call), "single" (analysis and content in one call)
+# or "fanout" (one concurrent call per section, bounded by CONTENT_FANOUT_CONCURRENCY);
+# can be overridden per request with the "mode" field
+CONTENT_GENERATION_MODE = os.getenv('CONTENT_GENERATION_MODE', 'two_step')
+
+# Maximum number of concurrent Gemini calls per lesson in fanout mode
+CONTENT_FANOUT_CONCURRENCY = int(os.getenv('CONTENT_FANOUT_CONCURRENCY', '4'))
+
+# Question generation mode: "single" (the whole lesson in one call) or "chunked"
+# (concurrent calls per group of sections, bounded by QUESTION_CHUNK_CONCURRENCY);
+# can be overridden per request with the "mode" field
+QUESTION_GENERATION_MODE = os.getenv('QUESTION_GENERATION_MODE', 'chunked')
+
+# Maximum number of concurrent Gemini calls per question request in chunked mode
+QUESTION_CHUNK_CONCURRENCY = int(os.getenv('QUESTION_CHUNK_CONCURRENCY', '4'))
+
+# Most questions one quiz or practice request may ask for; generated questions stay in the bank
+MAX_QUESTIONS = int(os.getenv('MAX_QUESTIONS', '20'))
+
+# Seconds after which a worker rebuilds its in-memory leaderboard from the database,
+# picking up scores submitted to other workers
+LEADERBOARD_REFRESH_SECONDS = int(os.getenv('LEADERBOARD_REFRESH_SECONDS', '300'))
+
+# Listing a user's contents with ?language=: lessons without a stored translation
+# translated per request (the rest are listed in English until a later request)
+# and how many of them are translated at once
+USER_CONTENTS_MAX_TRANSLATIONS = int(os.getenv('USER_CONTENTS_MAX_TRANSLATIONS', '5'))
+USER_CONTENTS_TRANSLATION_CONCURRENCY = int(os.getenv('USER_CONTENTS_TRANSLATION_CONCURRENCY', '2'))
+
+# Translation: concurrent Gemini calls per translated lesson (one per section), and
+# calls per section before its remaining segments are left untranslated
+TRANSLATION_CHUNK_CONCURRENCY = int(os.getenv('TRANSLATION_CHUNK_CONCURRENCY', '4'))
+TRANSLATION_CHUNK_ATTEMPTS = int(os.getenv('TRANSLATION_CHUNK_ATTEMPTS', '2'))
+
+# Chat sessions: latest messages sent verbatim with every question, and the batch
+# size in which older ones are folded into the session summary (so the summary is
+# not rewritten on every turn). One summary call folds at most CHAT_SUMMARY_MAX_FOLD
+# messages, so a backlog left by failed summaries is caught up over a few turns.
+CHAT_HISTORY_MESSAGES = int(os.getenv('CHAT_HISTORY_MESSAGES', '6'))
+CHAT_SUMMARY_BATCH = int(os.getenv('CHAT_SUMMARY_BATCH', '4'))
+CHAT_SUMMARY_MAX_FOLD = int(os.getenv('CHAT_SUMMARY_MAX_FOLD', str(4 * CHAT_SUMMARY_BATCH)))
+
+# Chatbot answer cache: answers kept per worker process (least recently used are
+# evicted first) and seconds an answer is served. CHAT_ANSWER_CACHE_SIMILARITY is
+# the cosine similarity at which a differently worded question about the same
+# lesson is served the cached answer (0.85 matches rewordings of the same question
+# but not questions about different terms); unset disables paraphrase matching.
+CHAT_ANSWER_CACHE_MAX_ENTRIES = int(os.getenv('CHAT_ANSWER_CACHE_MAX_ENTRIES', '5000'))
+CHAT_ANSWER_CACHE_TTL = int(os.getenv('CHAT_ANSWER_CACHE_TTL', str(24 * 60 * 60)))
+CHAT_ANSWER_CACHE_SIMILARITY = os.getenv('CHAT_ANSWER_CACHE_SIMILARITY')
+CHAT_ANSWER_CACHE_SIMILARITY = float(CHAT_ANSWER_CACHE_SIMILARITY) if CHAT_ANSWER_CACHE_SIMILARITY else None
+
+# Chatbot retrieval: passages sent with a question, content size (estimated tokens)
+# up to which the whole content is sent instead, and lesson indexes kept per worker
+CHAT_RETRIEVAL_TOP_K = int(os.getenv('CHAT_RETRIEVAL_TOP_K', '4'))
+CHAT_RETRIEVAL_MIN_TOKENS = int(os.getenv('CHAT_RETRIEVAL_MIN_TOKENS', '800'))
+CHAT_RETRIEVAL_INDEX_CACHE_SIZE = int(os.getenv('CHAT_RETRIEVAL_INDEX_CACHE_SIZE', '256'))
+
+# Audio transcription: largest upload accepted, in bytes, and longest audio, in seconds
+TRANSCRIBE_MAX_UPLOAD_BYTES = int(os.getenv('TRANSCRIBE_MAX_UPLOAD_BYTES', str(50 * 1024 * 1024)))
+TRANSCRIBE_MAX_DURATION_SECONDS = float(os.getenv('TRANSCRIBE_MAX_DURATION_SECONDS', str(15 * 60)))
+
 # Application definition
 INSTALLED_APPS = [
     'django.contrib.admin',
@@ -35,6 +109,7 @@ INSTALLED_APPS = [
     'videos',
     'chatbot',
     'user_profiles',
+    'quizzes',
 ]
 
 MIDDLEWARE = [
@@ -0,0 +1,180 @@
+import asyncio
+import os
+import threading
+from unittest import mock
+
+import google.ai.generativelanguage as glm
+import google.generativeai as genai
+from django.test import SimpleTestCase
+from google.generativeai import client as genai_client
+
+from .body_limits import BodySizeLimitMiddleware
+from .executors import ExecutorSaturated, ProviderExecutor
+from .llm import llm_clients
+
+
+@mock.patch.dict(os.environ, {"GEMINI_API_KEY": "test-key"})
+class LLMClientRegistryTests(SimpleTestCase):
+    def setUp(self):
+        genai.configure(api_key="test-key")
+        self.addCleanup(genai.configure, api_key=os.getenv("GEMINI_API_KEY"))
+
+    def test_generative_model_uses_the_loop_client(self):
+        # generative_model() relies on private google-generativeai hooks, this
+        # fails when an upgrade stops honouring GenerativeModel._async_client
+        async def generate():
+            model = llm_clients.generative_model("gemini-1.5-flash")
+            self.assertIsInstance(model._async_client, glm.GenerativeServiceAsyncClient)
+            with mock.patch.object(
+                model._async_client, "generate_content",
+                new=mock.AsyncMock(return_value=glm.GenerateContentResponse()),
+            ) as generate_content, mock.patch.object(
+                genai_client, "get_default_generative_async_client",
+                side_effect=AssertionError("the process-wide client was used"),
+            ):
+                await model.generate_content_async("Hello")
+            generate_content.assert_awaited_once()
+
+        asyncio.run(generate())
+
+    def test_models_are_shared_within_a_loop(self):
+        async def models():
+            return (
+                llm_clients.gemini_model("gemini-2.0-flash"),
+                llm_clients.gemini_model("gemini-2.0-flash"),
+                llm_clients.generative_model("gemini-1.5-flash"),
+                llm_clients.generative_model("gemini-1.5-flash"),
+            )
+
+        first, second, third, fourth = asyncio.run(models())
+        self.assertIs(first, second)
+        self.assertIs(third, fourth)
+        self.assertIsNot(first, asyncio.run(models())[0])
+
+    def test_clients_are_closed_with_their_loop(self):
+        async def use():
+            llm_clients.gemini_model("gemini-2.0-flash")
+            llm_clients.generative_model("gemini-1.5-flash")
+            return asyncio.get_running_loop(), llm_clients._clients()
+
+        loop, clients = asyncio.run(use())
+        self.assertTrue(clients["http"].is_closed)
+        self.assertNotIn(loop, llm_clients._loop_clients)
+
+
+class BodySizeLimitMiddlewareTests(SimpleTestCase):
+    def setUp(self):
+        self.received = []
+
+        async def app(scope, receive, send):
+            while True:
+                message = await receive()
+                self.received.append(message)
+                if not message.get("more_body"):
+                    break
+            await send({"type": "http.response.start", "status": 200, "headers": []})
+            await send({"type": "http.response.body", "body": b"ok"})
+
+        self.middleware = BodySizeLimitMiddleware(app, {"/api/upload/": 10})
+
+    def call(self, path, chunks, content_length=None):
+        headers = [] if content_length is None else [(b"content-length", str(content_length).encode())]
+        scope = {"type": "http", "path": path, "headers": headers}
+        messages = [
+            {"type": "http.request", "body": chunk, "more_body": i < len(chunks) - 1}
+            for i, chunk in enumerate(chunks)
+        ]
+        sent = []
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message)
+
+        asyncio.run(self.middleware(scope, receive, send))
+        return sent[0]["status"]
+
+    def test_body_under_the_limit_is_passed_through(self):
+        self.assertEqual(self.call("/api/upload/", [b"12345", b"67890"], content_length=10), 200)
+        self.assertEqual(len(self.received), 2)
+
+    def test_declared_content_length_over_the_limit_is_rejected_unread(self):
+        self.assertEqual(self.call("/api/upload/", [b"x" * 11], content_length=11), 413)
+        self.assertEqual(self.received, [])
+
+    def test_body_is_counted_as_it_arrives(self):
+        # No (or a false) Content-Length: rejected at the chunk that crosses the limit
+        self.assertEqual(self.call("/api/upload/", [b"123456", b"789012", b"345678"]), 413)
+        self.assertEqual(self.call("/api/upload/", [b"123456", b"789012"], content_length=4), 413)
+
+    def test_other_paths_are_not_limited(self):
+        self.assertEqual(self.call("/api/other/", [b"x" * 100], content_length=100), 200)
+
+
+class ProviderExecutorTests(SimpleTestCase):
+    def setUp(self):
+        self.executor = ProviderExecutor("test", max_workers=1, max_queue=2)
+        self.release = threading.Event()
+        self.addCleanup(self.release.set)
+        self.ran = []
+
+    def _blocking(self, name):
+        self.ran.append(name)
+        self.release.wait(5)
+        return name
+
+    def _gauge(self, name):
+        return self.executor.gauges()[f"executor.test.{name}"]
+
+    async def _until(self, condition):
+        for _ in range(500):
+            if condition():
+                return
+            await asyncio.sleep(0.01)
+        self.fail("condition not reached")
+
+    async def test_calls_beyond_max_queue_are_rejected(self):
+        running = asyncio.ensure_future(self.executor.run(self._blocking, "running"))
+        await self._until(lambda: self._gauge("running") == 1)
+        queued = [asyncio.ensure_future(self.executor.run(self._blocking, f"queued{i}")) for i in range(2)]
+        await self._until(lambda: self._gauge("queued") == 2)
+
+        with self.assertRaises(ExecutorSaturated):
+            await self.executor.run(self._blocking, "rejected")
+
+        self.release.set()
+        self.assertEqual(await asyncio.gather(running, *queued), ["running", "queued0", "queued1"])
+        self.assertNotIn("rejected", self.ran)
+
+    async def test_a_cancelled_queued_call_never_runs(self):
+        running = asyncio.ensure_future(self.executor.run(self._blocking, "running"))
+        await self._until(lambda: self._gauge("running") == 1)
+        queued = asyncio.ensure_future(self.executor.run(self._blocking, "cancelled"))
+        await self._until(lambda: self._gauge("queued") == 1)
+
+        queued.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await queued
+        self.assertEqual(self._gauge("queued"), 0)
+
+        self.release.set()
+        await running
+        # The abandoned call's slot is drained by the worker without running it
+        await self.executor.run(lambda: None)
+        self.assertEqual(self.ran, ["running"])
+
+    async def test_gauges_return_to_zero(self):
+        def fail():
+            raise RuntimeError("provider error")
+
+        self.release.set()
+        results = await asyncio.gather(
+            *(self.executor.run(self._blocking, i) for i in range(2)),
+            self.executor.run(fail),
+            return_exceptions=True,
+        )
+        self.assertEqual(results[:2], [0, 1])
+        self.assertIsInstance(results[2], RuntimeError)
+        self.assertEqual((self._gauge("queued"), self._gauge("running")), (0, 0))
+        self.assertGreaterEqual(self._gauge("peak_queued"), 1)
@@ -1,5 +1,6 @@
 from django.contrib import admin
 from django.urls import path, include
+from .views import metrics_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -7,4 +8,6 @@ urlpatterns = [
     path('api/', include('videos.urls')),
     path('api/', include('user_profiles.urls')),
     path('api/', include('chatbot.urls')),
+    path('api/', include('quizzes.urls')),
+    path('api/metrics/', metrics_view, name='metrics'),
 ]
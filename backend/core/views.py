@@ -0,0 +1,18 @@
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework import status
+from .executors import executor_gauges
+from .metrics import metrics
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def metrics_view(request):
+    """
+    Return the in-process counters of this worker and the current
+    queue depths of its provider executors (staff only).
+    """
+    snapshot = metrics.snapshot()
+    snapshot.update(executor_gauges())
+    return Response(snapshot, status=status.HTTP_200_OK)
@@ -0,0 +1,245 @@
+import hashlib
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+from django.conf import settings
+
+from content_generation.keys import content_hash as lesson_hash
+from content_generation.question_generation import (
+    CHUNKED_QUESTION_MODE,
+    QUESTION_GENERATION_MODES,
+    QuestionGeneratorAgent,
+    TokenBudget,
+    lesson_text,
+)
+from content_generation.schemas import DIFFICULTY_LEVELS, ResponseQuestions
+from content_generation.singleflight import SingleFlight
+from core.metrics import metrics
+from .models import Question
+from .similarity import SimilarityIndex, diverse_subset, question_text
+
+logger = logging.getLogger(__name__)
+
+# Concurrent requests that find the same bank short share a single generation
+question_bank_flight = SingleFlight("question_bank")
+
+# Generation rounds per request; another round is needed when near-duplicates
+# were rejected and the bank is still short
+FILL_ATTEMPTS = 2
+
+# Fills a request may wait for or lead; a fill led by a concurrent smaller
+# request can leave the bank short of this one
+FILL_ROUNDS = 3
+
+DEFAULT_DIFFICULTY = "beginner"
+
+
+def parse_question_options(data) -> Tuple[Optional[Tuple[int, str, str]], Optional[str]]:
+    """
+    Validated (num_questions, difficulty, mode) of a question or quiz request.
+    Returns (options, None) or (None, error message).
+    """
+    try:
+        num_questions = int(data.get('num_questions', 5))
+    except (TypeError, ValueError):
+        num_questions = None
+    if num_questions is None or not 1 <= num_questions <= settings.MAX_QUESTIONS:
+        return None, f"num_questions must be an integer from 1 to {settings.MAX_QUESTIONS}"
+
+    difficulty = str(data.get('difficulty', DEFAULT_DIFFICULTY)).strip().lower()
+    if difficulty not in DIFFICULTY_LEVELS:
+        return None, f"Difficulty must be one of: {', '.join(DIFFICULTY_LEVELS)}"
+
+    mode = data.get('mode', settings.QUESTION_GENERATION_MODE)
+    if mode not in QUESTION_GENERATION_MODES:
+        return None, f"Mode must be one of: {', '.join(QUESTION_GENERATION_MODES)}"
+
+    return (num_questions, difficulty, mode), None
+
+
+def question_hash(text: str) -> str:
+    """
+    SHA-256 of a question's normalized text (case and whitespace insensitive)
+    """
+    normalized = " ".join(str(text).split()).lower()
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+def answer_text(question: ResponseQuestions) -> str:
+    """
+    Text of the option selected by answer_option ("" if it is not a-d)
+    """
+    option = question.answer_option.strip().lower()
+    if option in ("a", "b", "c", "d"):
+        return getattr(question, f"option_{option}")
+    return ""
+
+
+def serialize_question(question: Question) -> Dict[str, Any]:
+    return {
+        'question': question.question,
+        'option_a': question.option_a,
+        'option_b': question.option_b,
+        'option_c': question.option_c,
+        'option_d': question.option_d,
+        'answer_option': question.answer_option,
+        'answer_string': question.answer_string,
+    }
+
+
+async def _bank_index(bank: str, content_hash: str, difficulty: str) -> SimilarityIndex:
+    """
+    Near-duplicate index over the questions banked for a lesson and difficulty
+    """
+    index = SimilarityIndex()
+    async for pk, question, answer in Question.objects.filter(
+        bank=bank, content_hash=content_hash, difficulty=difficulty
+    ).values_list('id', 'question', 'answer_string'):
+        index.add(pk, question_text(question, answer))
+    return index
+
+
+async def store_questions(
+    bank: str, content_hash: str, difficulty: str, questions: List[ResponseQuestions]
+) -> int:
+    """
+    Add generated questions to the bank, rejecting near-duplicates of banked
+    questions (and of each other). Returns the number of questions stored.
+    """
+    index = await _bank_index(bank, content_hash, difficulty)
+    accepted = []
+    for position, question in enumerate(questions):
+        if index.add_if_new(("new", position), question_text(question.question, answer_text(question))):
+            accepted.append(question)
+        else:
+            metrics.incr("question_bank.near_duplicates")
+            logger.info(f"Rejected near-duplicate question: {question.question}")
+
+    rows = [
+        Question(
+            bank=bank,
+            content_hash=content_hash,
+            difficulty=difficulty,
+            question_hash=question_hash(question.question),
+            question=question.question,
+            option_a=question.option_a,
+            option_b=question.option_b,
+            option_c=question.option_c,
+            option_d=question.option_d,
+            answer_option=question.answer_option.strip().lower()[:1],
+            answer_string=answer_text(question),
+        )
+        for question in accepted
+    ]
+    await Question.objects.abulk_create(rows, ignore_conflicts=True)
+    return len(rows)
+
+
+async def sample_questions(bank: str, content_hash: str, difficulty: str, count: int) -> List[Question]:
+    """
+    Draw up to count questions from the bank for a lesson and difficulty,
+    picking a maximally diverse subset (randomized between requests)
+    """
+    candidates = [
+        (pk, question_text(question, answer))
+        async for pk, question, answer in Question.objects.filter(
+            bank=bank, content_hash=content_hash, difficulty=difficulty
+        ).values_list('id', 'question', 'answer_string')
+    ]
+    chosen = diverse_subset(candidates, count)
+    questions = await Question.objects.ain_bulk(chosen)
+    return [questions[pk] for pk in chosen]
+
+
+async def _fill_bank(
+    bank: str, content: Any, content_hash: str, difficulty: str, count: int, mode: str
+) -> Optional[Dict[str, Any]]:
+    """
+    Generate only the questions the bank is missing to hold count of them.
+    Returns the token budget report of the generation, or None if nothing was generated.
+    """
+    agent = QuestionGeneratorAgent()
+    budget = TokenBudget(mode, content)
+    for _ in range(FILL_ATTEMPTS):
+        banked = await Question.objects.filter(
+            bank=bank, content_hash=content_hash, difficulty=difficulty
+        ).acount()
+        shortfall = count - banked
+        if shortfall <= 0:
+            break
+
+        logger.info(f"Generating {shortfall} questions for content {content_hash[:12]} ({difficulty}, {mode})")
+        if mode == CHUNKED_QUESTION_MODE:
+            generated = await agent.generate_questions_chunked(content, shortfall, difficulty, budget)
+        else:
+            generated = await agent.generate_questions(lesson_text(content), shortfall, difficulty, budget)
+        metrics.incr("question_bank.generated", len(generated))
+        await store_questions(bank, content_hash, difficulty, generated)
+
+    if not budget.calls:
+        return None
+
+    report = budget.report()
+    logger.info(f"Question generation token budget for {content_hash[:12]}: {report}")
+    return report
+
+
+async def get_bank_questions(
+    content: Any, num_questions: int, difficulty: str, mode: str = CHUNKED_QUESTION_MODE,
+    bank: str = Question.QUIZ_BANK,
+) -> Tuple[List[Question], Optional[Dict[str, Any]]]:
+    """
+    Return num_questions questions for a lesson, served from the given
+    question bank (quiz questions by default). Only the shortfall is generated when the bank holds fewer, so
+    repeat tests on the same lesson cost no model call.
+
+    Concurrent requests for a lesson share one fill. A request that waited
+    for a fill sized for fewer questions checks the bank again and fills
+    the rest itself.
+
+    Returns the questions and the token budget report of the generation this
+    request ran (None when it was served from the bank or by another
+    request's generation).
+    """
+    content_hash = lesson_hash(content)
+    difficulty = str(difficulty).strip().lower()
+    token_budget = None
+
+    questions = await sample_questions(bank, content_hash, difficulty, num_questions)
+    if len(questions) < num_questions:
+        metrics.incr("question_bank.misses")
+        for _ in range(FILL_ROUNDS):
+            led = False
+
+            async def fill():
+                nonlocal led
+                led = True
+                return await _fill_bank(bank, content, content_hash, difficulty, num_questions, mode)
+
+            report = await question_bank_flight.ado(f"{bank}:{content_hash}:{difficulty}", fill)
+            questions = await sample_questions(bank, content_hash, difficulty, num_questions)
+            if led:
+                # Our own fill already retried the shortfall FILL_ATTEMPTS times
+                token_budget = report
+                break
+            if len(questions) >= num_questions:
+                break
+    else:
+        metrics.incr("question_bank.hits")
+
+    metrics.incr("question_bank.served", len(questions))
+    return questions, token_budget
+
+
+async def get_questions(
+    content: Any, num_questions: int, difficulty: str, mode: str = CHUNKED_QUESTION_MODE
+) -> Tuple[List[Dict[str, Any]], Optional[Dict[str, Any]]]:
+    """
+    Practice questions for a lesson, serialized with their answers. They are
+    drawn from the practice bank, so the answers of quiz questions are never
+    revealed before a quiz is scored.
+    """
+    questions, token_budget = await get_bank_questions(
+        content, num_questions, difficulty, mode, bank=Question.PRACTICE_BANK
+    )
+    return [serialize_question(question) for question in questions], token_budget
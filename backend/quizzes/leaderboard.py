@@ -0,0 +1,212 @@
+import bisect
+import logging
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+
+from core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Average scores (0-100) are ranked at this resolution: 0.01 points
+SCORE_SCALE = 100
+MAX_SCORE = 100
+
+
+def score_bucket(average_score: float) -> int:
+    return int(round(min(max(average_score or 0.0, 0.0), MAX_SCORE) * SCORE_SCALE))
+
+
+class FenwickTree:
+    """
+    Binary indexed tree of counts over buckets 0..size-1, with O(log n)
+    point updates, prefix sums and k-th element search.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self._tree = [0] * (size + 1)
+        self._top_bit = 1 << (size.bit_length() - 1) if size else 0
+
+    @classmethod
+    def from_counts(cls, counts: List[int]) -> "FenwickTree":
+        """Build from per-bucket counts in O(n)"""
+        tree = cls(len(counts))
+        values = tree._tree
+        for i, count in enumerate(counts, start=1):
+            values[i] += count
+            parent = i + (i & -i)
+            if parent <= tree.size:
+                values[parent] += values[i]
+        return tree
+
+    def add(self, bucket: int, delta: int) -> None:
+        i = bucket + 1
+        while i <= self.size:
+            self._tree[i] += delta
+            i += i & -i
+
+    def prefix(self, bucket: int) -> int:
+        """Total count of buckets 0..bucket"""
+        total = 0
+        i = bucket + 1
+        while i > 0:
+            total += self._tree[i]
+            i -= i & -i
+        return total
+
+    def total(self) -> int:
+        return self.prefix(self.size - 1)
+
+    def find(self, k: int) -> int:
+        """Smallest bucket whose prefix count is at least k (1-based k)"""
+        position = 0
+        step = self._top_bit
+        while step:
+            nxt = position + step
+            if nxt <= self.size and self._tree[nxt] < k:
+                position = nxt
+                k -= self._tree[nxt]
+            step >>= 1
+        return position
+
+
+class Leaderboard:
+    """
+    In-memory ranking of users by average quiz score.
+
+    Users are counted per score bucket in a Fenwick tree, so a user's rank
+    (1 + the number of users with a higher score) and the bucket holding the
+    k-th best user are found in O(log n) without sorting. Each bucket keeps
+    its users sorted by username (quiz averages cluster on a few values, so
+    a bucket can hold a large share of all users), so top() reads the first
+    users of a bucket without sorting it. It is built from
+    the database on first use, kept current by update() when a quiz is
+    submitted in this process, and rebuilt every LEADERBOARD_REFRESH_SECONDS
+    to pick up changes made by other worker processes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._built_at: Optional[float] = None
+        self._tree = FenwickTree(MAX_SCORE * SCORE_SCALE + 1)
+        # user id -> (bucket, username, average_score, tests_taken)
+        self._users: Dict[int, Tuple[int, str, float, int]] = {}
+        # bucket -> (username, user id) of its users, kept sorted so the
+        # first users of a bucket are read without sorting it
+        self._buckets: Dict[int, List[Tuple[str, int]]] = {}
+
+    def _load(self, rows) -> None:
+        counts = [0] * self._tree.size
+        users = {}
+        buckets = {}
+        for user_id, username, average_score, tests_taken in rows:
+            bucket = score_bucket(average_score)
+            users[user_id] = (bucket, username, average_score, tests_taken)
+            buckets.setdefault(bucket, []).append((username, user_id))
+            counts[bucket] += 1
+        for members in buckets.values():
+            members.sort()
+        self._tree = FenwickTree.from_counts(counts)
+        self._users = users
+        self._buckets = buckets
+        self._built_at = time.monotonic()
+
+    def rebuild(self) -> None:
+        """Reload every ranked user (at least one quiz taken) from the database"""
+        from user_profiles.models import CustomUser
+
+        start = time.perf_counter()
+        rows = CustomUser.objects.filter(tests_taken__gt=0).values_list(
+            'id', 'username', 'average_score', 'tests_taken'
+        ).iterator(chunk_size=5000)
+        with self._lock:
+            self._load(rows)
+        metrics.incr("leaderboard.rebuilds")
+        logger.info(f"Leaderboard rebuilt with {len(self._users)} users in {time.perf_counter() - start:.2f}s")
+
+    def _ensure_built(self) -> None:
+        refresh = getattr(settings, 'LEADERBOARD_REFRESH_SECONDS', 300)
+        if self._built_at is None or time.monotonic() - self._built_at > refresh:
+            self.rebuild()
+
+    def _remove(self, user_id: int) -> None:
+        entry = self._users.pop(user_id, None)
+        if entry is None:
+            return
+        bucket, username = entry[0], entry[1]
+        self._tree.add(bucket, -1)
+        members = self._buckets[bucket]
+        del members[bisect.bisect_left(members, (username, user_id))]
+        if not members:
+            del self._buckets[bucket]
+
+    def update(self, user_id: int, username: str, average_score: float, tests_taken: int) -> None:
+        """Move a user to the bucket of their new average score"""
+        if self._built_at is None:
+            # Not built yet: the first read loads the current scores anyway
+            return
+        with self._lock:
+            self._remove(user_id)
+            if tests_taken > 0:
+                bucket = score_bucket(average_score)
+                self._users[user_id] = (bucket, username, average_score, tests_taken)
+                bisect.insort(self._buckets.setdefault(bucket, []), (username, user_id))
+                self._tree.add(bucket, 1)
+        metrics.incr("leaderboard.updates")
+
+    def remove(self, user_id: int) -> None:
+        with self._lock:
+            self._remove(user_id)
+
+    def _entry(self, rank: int, user_id: int) -> dict:
+        _, username, average_score, tests_taken = self._users[user_id]
+        return {
+            'rank': rank,
+            'user_id': user_id,
+            'username': username,
+            'average_score': round(average_score, 2),
+            'tests_taken': tests_taken,
+        }
+
+    def _rank_of_bucket(self, bucket: int) -> int:
+        # Users in higher buckets, plus one
+        return self._tree.total() - self._tree.prefix(bucket) + 1
+
+    def rank(self, user_id: int) -> Optional[dict]:
+        """Rank entry of a user, or None if they have not taken a quiz"""
+        self._ensure_built()
+        with self._lock:
+            entry = self._users.get(user_id)
+            if entry is None:
+                return None
+            return self._entry(self._rank_of_bucket(entry[0]), user_id)
+
+    def top(self, limit: int) -> List[dict]:
+        """
+        The limit best users. Users with the same score share a rank and
+        are listed by username.
+        """
+        self._ensure_built()
+        with self._lock:
+            total = self._tree.total()
+            result = []
+            seen = 0
+            while seen < min(limit, total):
+                # Bucket holding the (seen + 1)-th best user, counted from the top
+                bucket = self._tree.find(total - seen)
+                members = self._buckets[bucket]
+                rank = seen + 1
+                for _, user_id in members[: limit - seen]:
+                    result.append(self._entry(rank, user_id))
+                seen += len(members)
+            return result
+
+    def __len__(self):
+        self._ensure_built()
+        return len(self._users)
+
+
+leaderboard = Leaderboard()
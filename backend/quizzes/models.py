@@ -1,3 +1,84 @@
 from django.db import models
 
-# Create your models here.
+
+class Question(models.Model):
+    """
+    A generated multiple-choice question in the question bank.
+
+    Questions are keyed by the hash of the lesson they were generated from
+    (see content_generation.keys.content_hash) and the requested difficulty,
+    so every student taking a test on the same lesson draws from one bank.
+    Quiz questions are kept apart from practice questions, whose answers are
+    returned to anyone by the generate-questions endpoint.
+    """
+    QUIZ_BANK = "quiz"
+    PRACTICE_BANK = "practice"
+    BANK_CHOICES = [(QUIZ_BANK, "Quiz"), (PRACTICE_BANK, "Practice")]
+
+    bank = models.CharField(max_length=10, choices=BANK_CHOICES, default=QUIZ_BANK)
+    content_hash = models.CharField(max_length=64)
+    difficulty = models.CharField(max_length=20)
+    # SHA-256 of the normalized question text, so regenerated duplicates are not stored twice
+    question_hash = models.CharField(max_length=64)
+    question = models.TextField()
+    option_a = models.TextField()
+    option_b = models.TextField()
+    option_c = models.TextField()
+    option_d = models.TextField()
+    answer_option = models.CharField(max_length=1)
+    answer_string = models.TextField(blank=True, default="")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Question"
+        verbose_name_plural = "Questions"
+        unique_together = ['bank', 'content_hash', 'difficulty', 'question_hash']
+        indexes = [models.Index(fields=['bank', 'content_hash', 'difficulty'])]
+
+    def __str__(self):
+        return f"{self.question[:60]} [{self.bank}/{self.content_hash[:12]}/{self.difficulty}]"
+
+
+class QuizSession(models.Model):
+    """
+    A quiz taken by a user: the questions served from the bank and, once
+    submitted, the score computed on the server.
+    """
+    user = models.ForeignKey('user_profiles.CustomUser', on_delete=models.CASCADE, related_name='quiz_sessions')
+    content_hash = models.CharField(max_length=64)
+    difficulty = models.CharField(max_length=20)
+    questions = models.ManyToManyField(Question, through='QuizAnswer', related_name='sessions')
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Set exactly once, when the answers are submitted
+    submitted_at = models.DateTimeField(null=True, blank=True)
+    correct_answers = models.PositiveIntegerField(default=0)
+    score = models.FloatField(null=True, blank=True, help_text="Percentage of correct answers")
+
+    class Meta:
+        verbose_name = "Quiz Session"
+        verbose_name_plural = "Quiz Sessions"
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Quiz {self.pk} for {self.user} ({self.difficulty})"
+
+
+class QuizAnswer(models.Model):
+    """
+    A question of a quiz session, in the order it was served, with the
+    option the user selected
+    """
+    session = models.ForeignKey(QuizSession, on_delete=models.CASCADE, related_name='answers')
+    question = models.ForeignKey(Question, on_delete=models.CASCADE, related_name='answers')
+    position = models.PositiveIntegerField()
+    selected_option = models.CharField(max_length=1, blank=True, default="")
+    is_correct = models.BooleanField(default=False)
+
+    class Meta:
+        verbose_name = "Quiz Answer"
+        verbose_name_plural = "Quiz Answers"
+        unique_together = ['session', 'question']
+        ordering = ['position']
+
+    def __str__(self):
+        return f"Quiz {self.session_id} question {self.position}"
@@ -0,0 +1,83 @@
+import logging
+from typing import Dict, Tuple
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from core.metrics import metrics
+from user_profiles.models import CustomUser
+from .leaderboard import leaderboard
+from .models import QuizAnswer, QuizSession
+
+logger = logging.getLogger(__name__)
+
+
+class QuizAlreadySubmitted(Exception):
+    """Raised when answers are submitted for a quiz session a second time"""
+
+
+def _normalize_option(option) -> str:
+    option = str(option or "").strip().lower()
+    return option[:1] if option[:1] in ("a", "b", "c", "d") else ""
+
+
+def record_user_score(user_id: int, score: float) -> None:
+    """
+    Fold a quiz score into the user's running average.
+
+    Both assignments are evaluated by the database against the row's
+    current values in a single UPDATE, so concurrent submissions can never
+    overwrite each other's contribution (no read-modify-write in Python).
+    """
+    CustomUser.objects.filter(pk=user_id).update(
+        average_score=(F('average_score') * F('tests_taken') + score) / (F('tests_taken') + 1),
+        tests_taken=F('tests_taken') + 1,
+    )
+
+
+def submit_quiz(session_id: int, user, submitted: Dict[str, str]) -> Tuple[QuizSession, list]:
+    """
+    Score submitted answers against the stored answer options and update the
+    user's statistics.
+
+    submitted maps question ids (as strings or ints) to the selected option
+    ("a"-"d"); unanswered questions count as wrong. A session can be
+    submitted once: the session row is claimed with a conditional UPDATE
+    inside the transaction, so a second (or concurrent) submission raises
+    QuizAlreadySubmitted instead of counting the quiz twice.
+
+    The user instance is refreshed with the new statistics and moved on the
+    leaderboard. Raises QuizSession.DoesNotExist if the session does not
+    belong to the user.
+    """
+    submitted = {str(question_id): option for question_id, option in submitted.items()}
+
+    with transaction.atomic():
+        # Claim the session before reading anything, so the transaction takes
+        # its write lock up front and concurrent submissions queue behind it
+        claimed = QuizSession.objects.filter(
+            pk=session_id, user=user, submitted_at__isnull=True
+        ).update(submitted_at=timezone.now())
+        if not claimed:
+            if QuizSession.objects.filter(pk=session_id, user=user).exists():
+                raise QuizAlreadySubmitted(f"Quiz session {session_id} was already submitted")
+            raise QuizSession.DoesNotExist(f"Quiz session {session_id} not found")
+
+        answers = list(QuizAnswer.objects.filter(session_id=session_id).select_related('question'))
+        for answer in answers:
+            answer.selected_option = _normalize_option(submitted.get(str(answer.question_id)))
+            answer.is_correct = bool(answer.selected_option) and answer.selected_option == answer.question.answer_option
+        correct = sum(answer.is_correct for answer in answers)
+        score = round(correct / len(answers) * 100, 2) if answers else 0.0
+
+        QuizSession.objects.filter(pk=session_id).update(correct_answers=correct, score=score)
+        QuizAnswer.objects.bulk_update(answers, ['selected_option', 'is_correct'])
+        record_user_score(user.pk, score)
+
+    user.refresh_from_db(fields=['tests_taken', 'average_score'])
+    leaderboard.update(user.pk, user.username, user.average_score, user.tests_taken)
+
+    metrics.incr("quizzes.submitted")
+    logger.info(f"Quiz session {session_id} scored {correct}/{len(answers)} for user {user.pk}")
+    return QuizSession.objects.get(pk=session_id), answers
@@ -0,0 +1,148 @@
+import random
+import re
+from collections import defaultdict
+from functools import lru_cache
+from typing import Dict, FrozenSet, Hashable, List, Optional, Sequence, Tuple
+
+# Questions at least this similar (Jaccard over shingles) count as near-duplicates
+NEAR_DUPLICATE_THRESHOLD = 0.6
+
+_WORD = re.compile(r"\w+")
+
+# Words that carry no meaning on their own
+_STOPWORDS = frozenset(
+    "a an the is are was were be of in on at to for by with and or which what who whom "
+    "whose when where why how does do did this that these those it its".split()
+)
+
+
+def _stem(word: str) -> str:
+    # Light suffix stripping so "plays"/"played"/"playing" share a shingle
+    for suffix in ("ing", "ed", "es", "s"):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            return word[: -len(suffix)]
+    return word
+
+
+@lru_cache(maxsize=50_000)
+def shingles(text: str) -> FrozenSet[str]:
+    """
+    Shingle set of a question: its stemmed content words.
+
+    Word order is ignored on purpose, so rewordings of the same question
+    ("RCB is a team in which league?" / "In which league does RCB play?")
+    share most of their shingles. Index the question together with its
+    correct answer, so questions with the same stem but different answers
+    stay apart.
+    """
+    return frozenset(
+        _stem(word) for word in _WORD.findall(text.lower()) if word not in _STOPWORDS
+    )
+
+
+def question_text(question: str, answer: str) -> str:
+    """
+    Text a question is compared by: the question and its correct answer
+    """
+    return f"{question} {answer}"
+
+
+def jaccard(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    if not a and not b:
+        return 1.0
+    intersection = len(a & b)
+    return intersection / (len(a) + len(b) - intersection)
+
+
+class SimilarityIndex:
+    """
+    In-memory near-duplicate index over question texts.
+
+    An inverted index from shingle to entries narrows every lookup to the
+    entries sharing at least one shingle, and only those are scored with the
+    exact Jaccard similarity, so a lookup stays well under a millisecond for
+    a lesson's question bank.
+    """
+
+    def __init__(self, threshold: float = NEAR_DUPLICATE_THRESHOLD):
+        self.threshold = threshold
+        self._shingles: Dict[Hashable, FrozenSet[str]] = {}
+        self._postings: Dict[str, List[Hashable]] = defaultdict(list)
+
+    def __len__(self):
+        return len(self._shingles)
+
+    def add(self, key: Hashable, text: str) -> None:
+        shingle_set = shingles(text)
+        self._shingles[key] = shingle_set
+        for shingle in shingle_set:
+            self._postings[shingle].append(key)
+
+    def most_similar(self, text: str) -> Optional[Tuple[Hashable, float]]:
+        """
+        Return (key, similarity) of the closest indexed entry, or None if no
+        entry shares a shingle with text
+        """
+        query = shingles(text)
+        candidates = {key for shingle in query for key in self._postings.get(shingle, ())}
+        best = None
+        for key in candidates:
+            score = jaccard(query, self._shingles[key])
+            if best is None or score > best[1]:
+                best = (key, score)
+        return best
+
+    def find_duplicate(self, text: str) -> Optional[Hashable]:
+        """
+        Return the key of an indexed near-duplicate of text, if any
+        """
+        match = self.most_similar(text)
+        if match is not None and match[1] >= self.threshold:
+            return match[0]
+        return None
+
+    def add_if_new(self, key: Hashable, text: str) -> bool:
+        """
+        Index text unless it is a near-duplicate of an indexed entry.
+        Returns True if it was added.
+        """
+        if self.find_duplicate(text) is not None:
+            return False
+        self.add(key, text)
+        return True
+
+
+def diverse_subset(items: Sequence[Tuple[Hashable, str]], count: int) -> List[Hashable]:
+    """
+    Pick count keys from (key, text) items that are as different from each
+    other as possible.
+
+    Greedy farthest-point selection: starting from a random item, repeatedly
+    take the item whose highest similarity to anything already selected is
+    the lowest. Ties are broken randomly, so repeated tests still vary.
+    """
+    if count <= 0:
+        return []
+    if count >= len(items):
+        keys = [key for key, _ in items]
+        random.shuffle(keys)
+        return keys
+
+    remaining = list(items)
+    random.shuffle(remaining)
+    shingle_sets = {key: shingles(text) for key, text in remaining}
+
+    first_key = remaining.pop()[0]
+    selected = [first_key]
+    # Highest similarity of every remaining item to the selected set
+    closest = {key: jaccard(shingle_sets[key], shingle_sets[first_key]) for key, _ in remaining}
+
+    while len(selected) < count:
+        key = min(closest, key=closest.get)
+        del closest[key]
+        selected.append(key)
+        for other in closest:
+            score = jaccard(shingle_sets[other], shingle_sets[key])
+            if score > closest[other]:
+                closest[other] = score
+    return selected
@@ -1,3 +1,256 @@
-from django.test import TestCase
+import asyncio
+import itertools
+import random
+from unittest import mock
 
-# Create your tests here.
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from content_generation.schemas import ResponseQuestions
+from user_profiles.models import CustomUser
+from .bank import get_bank_questions, get_questions, parse_question_options
+from .leaderboard import FenwickTree, Leaderboard, score_bucket
+from .models import Question, QuizAnswer, QuizSession
+from .scoring import QuizAlreadySubmitted, submit_quiz
+from .similarity import SimilarityIndex, diverse_subset, jaccard, question_text, shingles
+
+
+@override_settings(QUESTION_GENERATION_MODE="chunked")
+class ParseQuestionOptionsTests(SimpleTestCase):
+    def test_defaults(self):
+        self.assertEqual(parse_question_options({}), ((5, "beginner", "chunked"), None))
+
+    def test_values_are_normalized(self):
+        options, error = parse_question_options({"num_questions": "10", "difficulty": " Advanced ", "mode": "single"})
+        self.assertIsNone(error)
+        self.assertEqual(options, (10, "advanced", "single"))
+
+    @override_settings(MAX_QUESTIONS=12)
+    def test_num_questions_must_be_an_integer_in_range(self):
+        for value in ["ten", None, 0, -3, 13, 10 ** 6]:
+            options, error = parse_question_options({"num_questions": value})
+            self.assertIsNone(options, value)
+            self.assertIn("num_questions", error)
+        self.assertIsNone(parse_question_options({"num_questions": 12})[1])
+
+    def test_difficulty_must_be_a_known_level(self):
+        options, error = parse_question_options({"difficulty": "easy"})
+        self.assertIsNone(options)
+        self.assertIn("Difficulty", error)
+
+    def test_mode_must_be_known(self):
+        options, error = parse_question_options({"mode": "fanout"})
+        self.assertIsNone(options)
+        self.assertIn("Mode", error)
+
+
+class StubQuestionAgent:
+    """Generates count distinct questions after a short delay"""
+    numbers = itertools.count()
+    calls = []
+
+    async def generate_questions(self, text, count, difficulty, budget):
+        self.calls.append(count)
+        await asyncio.sleep(0.05)
+        budget.record(text, None, count)
+        questions = []
+        for _ in range(count):
+            n = next(self.numbers)
+            questions.append(ResponseQuestions(
+                question=f"What is quantity{n}?", option_a=f"value{n}", option_b="b", option_c="c", option_d="d",
+                answer_option="a",
+            ))
+        return questions
+
+
+@mock.patch("quizzes.bank.QuestionGeneratorAgent", StubQuestionAgent)
+class BankFillTests(TestCase):
+    def setUp(self):
+        StubQuestionAgent.calls = []
+
+    async def test_concurrent_requests_for_more_questions_are_filled(self):
+        content = {"topic": "Optics", "summary": "Light and lenses", "sections": []}
+        (small, small_budget), (large, large_budget) = await asyncio.gather(
+            get_bank_questions(content, 3, "beginner", "single"),
+            get_bank_questions(content, 15, "beginner", "single"),
+        )
+        self.assertEqual(len(small), 3)
+        self.assertEqual(len(large), 15)
+        self.assertEqual(StubQuestionAgent.calls, [3, 12])
+        # Each request reports only the generation it ran itself
+        self.assertEqual(small_budget["per_call"][0]["questions"], 3)
+        self.assertEqual(large_budget["per_call"][0]["questions"], 12)
+
+    async def test_a_full_bank_is_served_without_generation(self):
+        content = {"topic": "Lenses", "summary": "Focal length", "sections": []}
+        await get_bank_questions(content, 5, "beginner", "single")
+        questions, budget = await get_bank_questions(content, 4, "beginner", "single")
+        self.assertEqual(len(questions), 4)
+        self.assertIsNone(budget)
+        self.assertEqual(StubQuestionAgent.calls, [5])
+
+    async def test_practice_questions_never_come_from_the_quiz_bank(self):
+        content = {"topic": "Prisms", "summary": "Dispersion", "sections": []}
+        quiz, _ = await get_bank_questions(content, 3, "beginner", "single")
+        practice, _ = await get_questions(content, 3, "beginner", "single")
+        self.assertEqual(StubQuestionAgent.calls, [3, 3])
+        self.assertTrue(all(question["answer_option"] for question in practice))
+        self.assertFalse({question.question for question in quiz} & {question["question"] for question in practice})
+
+
+class SimilarityTests(SimpleTestCase):
+    def test_rewordings_share_shingles(self):
+        first = shingles(question_text("RCB is a team in which league?", "IPL"))
+        second = shingles(question_text("In which league does RCB play?", "IPL"))
+        self.assertGreaterEqual(jaccard(first, second), 0.6)
+
+    def test_index_finds_near_duplicates_only(self):
+        index = SimilarityIndex()
+        self.assertTrue(index.add_if_new(1, question_text("What does a convex lens do to parallel rays?", "Converges them")))
+        self.assertFalse(index.add_if_new(2, question_text("What do parallel rays do through a convex lens?", "Converges them")))
+        self.assertTrue(index.add_if_new(3, question_text("What is the unit of power of a lens?", "Dioptre")))
+        self.assertEqual(len(index), 2)
+        self.assertIsNone(index.most_similar("photosynthesis chlorophyll"))
+
+    def test_diverse_subset_takes_one_question_per_cluster(self):
+        clusters = {
+            "lens": "convex lens converges parallel light rays",
+            "mirror": "plane mirror reflection image virtual",
+            "prism": "prism dispersion spectrum white colours",
+        }
+        items = [(f"{name}-{i}", text) for name, text in clusters.items() for i in range(4)]
+        for seed in range(20):
+            random.seed(seed)
+            picked = diverse_subset(items, 3)
+            self.assertEqual(sorted(key.split("-")[0] for key in picked), sorted(clusters))
+
+    def test_diverse_subset_edge_counts(self):
+        items = [(i, f"question {i}") for i in range(5)]
+        self.assertEqual(diverse_subset(items, 0), [])
+        self.assertEqual(sorted(diverse_subset(items, 10)), list(range(5)))
+        picked = diverse_subset(items, 4)
+        self.assertEqual(len(picked), len(set(picked)))
+
+
+class SubmitQuizTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(username="student", password="pass")
+        cls.questions = [
+            Question.objects.create(
+                content_hash="h" * 64, difficulty="beginner", question_hash=str(i) * 64,
+                question=f"Question {i}", option_a="A", option_b="B", option_c="C", option_d="D",
+                answer_option="a",
+            )
+            for i in range(4)
+        ]
+
+    def _session(self, user=None):
+        session = QuizSession.objects.create(user=user or self.user, content_hash="h" * 64, difficulty="beginner")
+        for position, question in enumerate(self.questions):
+            QuizAnswer.objects.create(session=session, question=question, position=position)
+        return session
+
+    def test_answers_are_scored_on_the_server(self):
+        session = self._session()
+        submitted = {self.questions[0].pk: "A", str(self.questions[1].pk): " a ", self.questions[2].pk: "b"}
+        session, answers = submit_quiz(session.pk, self.user, submitted)
+        self.assertEqual(session.correct_answers, 2)
+        self.assertEqual(session.score, 50.0)
+        self.assertIsNotNone(session.submitted_at)
+        self.assertEqual([answer.selected_option for answer in answers], ["a", "a", "b", ""])
+        self.assertEqual([answer.is_correct for answer in answers], [True, True, False, False])
+
+    def test_a_session_is_counted_once(self):
+        session = self._session()
+        submit_quiz(session.pk, self.user, {question.pk: "a" for question in self.questions})
+        with self.assertRaises(QuizAlreadySubmitted):
+            submit_quiz(session.pk, self.user, {})
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.tests_taken, 1)
+        self.assertEqual(self.user.average_score, 100.0)
+        self.assertEqual(QuizSession.objects.get(pk=session.pk).score, 100.0)
+
+    def test_running_average_is_updated_in_the_database(self):
+        submit_quiz(self._session().pk, self.user, {question.pk: "a" for question in self.questions})
+        submit_quiz(self._session().pk, self.user, {self.questions[0].pk: "a"})
+        self.assertEqual(self.user.tests_taken, 2)
+        self.assertAlmostEqual(self.user.average_score, 62.5)
+
+    def test_another_users_session_is_not_found(self):
+        other = CustomUser.objects.create_user(username="other", password="pass")
+        session = self._session(user=other)
+        with self.assertRaises(QuizSession.DoesNotExist):
+            submit_quiz(session.pk, self.user, {})
+        self.assertIsNone(QuizSession.objects.get(pk=session.pk).submitted_at)
+
+
+class FenwickTreeTests(SimpleTestCase):
+    def test_prefix_total_and_find(self):
+        rng = random.Random(0)
+        counts = [rng.randint(0, 3) for _ in range(50)]
+        built = FenwickTree.from_counts(counts)
+        added = FenwickTree(len(counts))
+        for bucket, count in enumerate(counts):
+            added.add(bucket, count)
+        for tree in (built, added):
+            self.assertEqual(tree.total(), sum(counts))
+            for bucket in range(len(counts)):
+                self.assertEqual(tree.prefix(bucket), sum(counts[: bucket + 1]))
+            for k in range(1, sum(counts) + 1):
+                expected = next(b for b in range(len(counts)) if sum(counts[: b + 1]) >= k)
+                self.assertEqual(tree.find(k), expected)
+
+
+class LeaderboardTests(SimpleTestCase):
+    def setUp(self):
+        self.board = Leaderboard()
+        # (id, username, average_score, tests_taken), as rebuild() loads them
+        self.board._load([
+            (1, "carol", 90.0, 3),
+            (2, "alice", 75.5, 2),
+            (3, "bob", 90.0, 1),
+            (4, "dave", 40.0, 5),
+            (5, "erin", 75.504, 4),
+        ])
+
+    def test_score_bucket_is_clamped(self):
+        self.assertEqual(score_bucket(-5), 0)
+        self.assertEqual(score_bucket(None), 0)
+        self.assertEqual(score_bucket(120), 100 * 100)
+        self.assertEqual(score_bucket(75.504), score_bucket(75.5))
+
+    def test_equal_scores_share_a_rank(self):
+        self.assertEqual(self.board.rank(1)["rank"], 1)
+        self.assertEqual(self.board.rank(3)["rank"], 1)
+        self.assertEqual(self.board.rank(2)["rank"], 3)
+        self.assertEqual(self.board.rank(5)["rank"], 3)
+        self.assertEqual(self.board.rank(4)["rank"], 5)
+        self.assertIsNone(self.board.rank(99))
+
+    def test_top_lists_ties_by_username(self):
+        top = self.board.top(10)
+        self.assertEqual([entry["username"] for entry in top], ["bob", "carol", "alice", "erin", "dave"])
+        self.assertEqual([entry["rank"] for entry in top], [1, 1, 3, 3, 5])
+        self.assertEqual([entry["username"] for entry in self.board.top(3)], ["bob", "carol", "alice"])
+        self.assertEqual(self.board.top(0), [])
+
+    def test_update_moves_a_user(self):
+        self.board.update(4, "dave", 95.0, 6)
+        self.assertEqual(self.board.rank(4)["rank"], 1)
+        self.assertEqual(self.board.rank(1)["rank"], 2)
+        self.assertEqual(self.board.top(1)[0]["username"], "dave")
+        self.board.update(6, "frank", 10.0, 1)
+        self.assertEqual(len(self.board), 6)
+        self.assertEqual(self.board.rank(6)["rank"], 6)
+
+    def test_remove(self):
+        self.board.remove(3)
+        self.board.remove(99)
+        self.assertIsNone(self.board.rank(3))
+        self.assertEqual([entry["username"] for entry in self.board.top(2)], ["carol", "alice"])
+        self.assertEqual(self.board.rank(4)["rank"], 4)
+
+    def test_update_before_build_is_ignored(self):
+        board = Leaderboard()
+        board.update(1, "carol", 90.0, 3)
+        self.assertEqual(board._users, {})
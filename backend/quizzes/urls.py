@@ -0,0 +1,8 @@
+from django.urls import path
+from .views import get_leaderboard, start_quiz, submit_quiz_answers
+
+urlpatterns = [
+    path('quizzes/start/', start_quiz, name='start_quiz'),
+    path('quizzes/<int:session_id>/submit/', submit_quiz_answers, name='submit_quiz'),
+    path('leaderboard/', get_leaderboard, name='leaderboard'),
+]
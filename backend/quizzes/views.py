@@ -0,0 +1,169 @@
+from adrf.decorators import api_view as drf_api_view
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework import status
+from content_generation.keys import content_hash as lesson_hash
+from .bank import get_bank_questions, parse_question_options
+from .leaderboard import leaderboard
+from .models import QuizAnswer, QuizSession
+from .scoring import QuizAlreadySubmitted, submit_quiz
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def _public_question(question):
+    """
+    A question as shown while the quiz is running, without its answer
+    """
+    return {
+        'id': question.id,
+        'question': question.question,
+        'option_a': question.option_a,
+        'option_b': question.option_b,
+        'option_c': question.option_c,
+        'option_d': question.option_d,
+    }
+
+
+@drf_api_view(['POST'])
+@permission_classes([IsAuthenticated])
+async def start_quiz(request):
+    """
+    Start a quiz on a lesson. Questions are served from the question bank
+    and stored with the session; answers are not sent to the client.
+
+    Expected POST data:
+    {
+        "content": "The lesson to take the quiz on",
+        "num_questions": 5, (5 by default, at most MAX_QUESTIONS)
+        "difficulty": "beginner|intermediate|advanced" (optional, defaults to beginner),
+        "mode": "single|chunked" (optional, see generate-questions)
+    }
+    """
+    try:
+        data = request.data
+        content = data.get('content')
+        if not content:
+            return Response(
+                {"error": "Content is required"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        options, error = parse_question_options(data)
+        if error is not None:
+            return Response({"error": error}, status=status.HTTP_400_BAD_REQUEST)
+        num_questions, difficulty, mode = options
+
+        questions, _ = await get_bank_questions(content, num_questions, difficulty, mode)
+        if not questions:
+            return Response(
+                {"error": "No questions could be generated for this content"},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+        session = await QuizSession.objects.acreate(
+            user=request.user,
+            content_hash=lesson_hash(content),
+            difficulty=difficulty,
+        )
+        await QuizAnswer.objects.abulk_create([
+            QuizAnswer(session=session, question=question, position=position)
+            for position, question in enumerate(questions)
+        ])
+
+        return Response(
+            {
+                "session_id": session.id,
+                "questions": [_public_question(question) for question in questions],
+            },
+            status=status.HTTP_201_CREATED
+        )
+
+    except ValueError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    except Exception as e:
+        logger.exception(f"Error starting quiz: {str(e)}")
+        return Response(
+            {"error": f"Failed to start quiz: {str(e)}"},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def submit_quiz_answers(request, session_id):
+    """
+    Submit the answers of a quiz session and get it scored on the server.
+    The user's tests_taken and average_score are updated atomically.
+
+    Expected POST data:
+    {
+        "answers": {"<question id>": "a|b|c|d", ...}
+    }
+    """
+    answers = request.data.get('answers')
+    if not isinstance(answers, dict):
+        return Response(
+            {"error": "Answers must be an object mapping question ids to options"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    try:
+        session, scored_answers = submit_quiz(session_id, request.user, answers)
+    except QuizSession.DoesNotExist:
+        return Response({"error": "Quiz session not found"}, status=status.HTTP_404_NOT_FOUND)
+    except QuizAlreadySubmitted as e:
+        return Response({"error": str(e)}, status=status.HTTP_409_CONFLICT)
+    except Exception as e:
+        logger.exception(f"Error submitting quiz {session_id}: {str(e)}")
+        return Response(
+            {"error": f"Failed to submit quiz: {str(e)}"},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+    return Response(
+        {
+            "session_id": session.id,
+            "score": session.score,
+            "correct_answers": session.correct_answers,
+            "total_questions": len(scored_answers),
+            "results": [
+                {
+                    'id': answer.question_id,
+                    'selected_option': answer.selected_option,
+                    'answer_option': answer.question.answer_option,
+                    'answer_string': answer.question.answer_string,
+                    'is_correct': answer.is_correct,
+                }
+                for answer in scored_answers
+            ],
+            "tests_taken": request.user.tests_taken,
+            "average_score": request.user.average_score,
+        },
+        status=status.HTTP_200_OK
+    )
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_leaderboard(request):
+    """
+    Top users by average quiz score and the requesting user's own rank.
+
+    Query parameters:
+        limit: number of top users to return (10 by default, at most 100)
+    """
+    try:
+        limit = min(max(int(request.query_params.get('limit', 10)), 1), 100)
+    except ValueError:
+        return Response({"error": "Limit must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+
+    return Response(
+        {
+            "top": leaderboard.top(limit),
+            "me": leaderboard.rank(request.user.pk),
+            "total_ranked": len(leaderboard),
+        },
+        status=status.HTTP_200_OK
+    )
@@ -7,6 +7,8 @@ class UserSerializer(serializers.ModelSerializer):
     class Meta:
         model = CustomUser
         fields = ['id', 'username', 'email', 'password', 'first_name', 'last_name', 'tests_taken', 'average_score']
+        # Maintained by the quiz scoring on the server
+        read_only_fields = ['tests_taken', 'average_score']
         
     def create(self, validated_data):
         # Remove password from validated data to handle separately
@@ -8,6 +8,7 @@ from .serializers import UserSerializer
 from .models import CustomUser as User
 from rest_framework.authtoken.models import Token
 from django.shortcuts import get_object_or_404
+from quizzes.leaderboard import leaderboard
 import logging
 
 logger = logging.getLogger(__name__)
@@ -141,9 +142,11 @@ def delete_account(request):
     try:
         user = request.user
         username = user.username
+        user_id = user.pk
         
         # Delete the user
         user.delete()
+        leaderboard.remove(user_id)
         
         return Response(
             {"message": f"User account '{username}' was successfully deleted"},
@@ -1,12 +1,19 @@
-from rest_framework.decorators import permission_classes, api_view
+from adrf.decorators import api_view
+from rest_framework.decorators import permission_classes
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.response import Response
 from rest_framework import status
+from core.executors import ExecutorSaturated, youtube_executor
 from .utils import YouTubeService
 
+
+def search_youtube(topic, max_results):
+    # The API client is not thread-safe, so every search builds its own
+    return YouTubeService().search_videos(query=topic, max_results=max_results)
+
 @api_view(['POST'])
 @permission_classes([AllowAny])
-def video_links(request):
+async def video_links(request):
     """
     Fetch YouTube video links based on the provided topic.
     
@@ -23,14 +30,11 @@ def video_links(request):
         )
     
     try:
-        # Initialize the YouTube service
-        youtube_service = YouTubeService()
-        
         # Get max_results parameter if provided (default to 5)
         max_results = request.data.get('max_results', 5)
         
-        # Search for videos related to the topic
-        videos = youtube_service.search_videos(query=topic, max_results=max_results)
+        # Search for videos related to the topic on the YouTube workers
+        videos = await youtube_executor.run(search_youtube, topic, max_results)
         
         # Return the video data
         return Response({
@@ -38,6 +42,8 @@ def video_links(request):
             'videos': videos
         }, status=status.HTTP_200_OK)
     
+    except ExecutorSaturated as e:
+        return Response({'error': str(e)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
     except Exception as e:
         return Response(
             {'error': f'Error fetching videos: {str(e)}'},
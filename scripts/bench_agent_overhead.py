@@ -0,0 +1,104 @@
+"""
+Microbenchmark of the per-request overhead of the pydantic-ai agents used by
+QuestionGeneratorAgent and ChatBotAgent.
+
+"per-call" rebuilds the Agent with the request data baked into its system
+prompt on every request, as the agents used to. "shared" runs the
+module-level agents with a static system prompt and the request data in the
+user message. Both run against pydantic-ai's TestModel, so the numbers are
+pure local overhead: agent construction, result schema setup and the run
+itself, without any network time.
+
+Usage:
+    python scripts/bench_agent_overhead.py [--requests 300]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from typing import List
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "backend")))
+
+from pydantic_ai import Agent  # noqa: E402
+from pydantic_ai.models.test import TestModel  # noqa: E402
+
+from chatbot.schemas import ChatResponse  # noqa: E402
+from chatbot.utils import chat_agent, chat_prompt  # noqa: E402
+from content_generation.question_generation import question_agent, question_prompt  # noqa: E402
+from content_generation.schemas import ResponseQuestions  # noqa: E402
+
+LESSON = "Ray optics models light as rays that travel in straight lines. " * 40
+QUESTION = "Why does a straw look bent in a glass of water?"
+
+
+async def questions_per_call(model, i):
+    agent = Agent(
+        model,
+        result_type=List[ResponseQuestions],
+        system_prompt=(
+            f"You are a teacher tasked with creating 5 multiple-choice questions on the following information: {LESSON} {i} "
+            "Each question should have four options (a, b, c, d) and a correct answer."
+            "Make sure the difficulty of each question is easy. "
+        ),
+    )
+    return await agent.run(f"{LESSON} {i}")
+
+
+async def questions_shared(model, i):
+    return await question_agent.run(question_prompt(f"{LESSON} {i}", 5, "easy"), model=model)
+
+
+async def chat_per_call(model, i):
+    agent = Agent(
+        model,
+        result_type=ChatResponse,
+        system_prompt=(
+            "You are a helpful assistant that provides accurate information. "
+            f"Answer the following question: {QUESTION} {i} "
+            f"Use the provided content for reference: {LESSON}"
+        ),
+    )
+    return await agent.run(f"{QUESTION} {i}")
+
+
+async def chat_shared(model, i):
+    return await chat_agent.run(chat_prompt(f"{QUESTION} {i}", LESSON), model=model)
+
+
+async def measure(fn, requests):
+    model = TestModel()
+    # Warm up imports and caches that are paid once per process either way
+    await fn(model, -1)
+    timings = []
+    for i in range(requests):
+        start = time.perf_counter()
+        await fn(model, i)
+        timings.append((time.perf_counter() - start) * 1e6)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=300)
+    args = parser.parse_args()
+
+    cases = [
+        ("questions per-call", questions_per_call),
+        ("questions shared", questions_shared),
+        ("chat per-call", chat_per_call),
+        ("chat shared", chat_shared),
+    ]
+    print(f"{'agent':<20} {'p50 us':>10} {'p95 us':>10} {'mean us':>10}")
+    for name, fn in cases:
+        timings = sorted(asyncio.run(measure(fn, args.requests)))
+        print(
+            f"{name:<20} {statistics.median(timings):>10.0f} "
+            f"{timings[int(len(timings) * 0.95) - 1]:>10.0f} {statistics.mean(timings):>10.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
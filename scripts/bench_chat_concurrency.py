@@ -0,0 +1,107 @@
+"""
+Benchmark chatbot throughput under concurrent requests, before and after
+chat_response became a native async view.
+
+"before" replays the old request path: a sync view in a pool of worker
+threads, each of which blocks on loop.run_until_complete() for the whole
+model round trip. "after" dispatches the same number of concurrent requests
+to the async chatbot.views.chat_response on a single event loop, as one
+ASGI worker would. ChatBotAgent is replaced by a stub with a simulated
+Gemini round trip, so no API key or network access is needed.
+
+Usage:
+    python scripts/bench_chat_concurrency.py [--requests 200] [--threads 8] [--latency-ms 800]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "backend")))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "core.settings")
+os.environ.setdefault("SECRET_KEY", "bench")
+
+import django  # noqa: E402
+
+django.setup()
+
+from rest_framework.test import APIRequestFactory, force_authenticate  # noqa: E402
+
+from chatbot import views  # noqa: E402
+from chatbot.schemas import ChatResponse  # noqa: E402
+from user_profiles.models import CustomUser  # noqa: E402
+
+
+class StubChatBotAgent:
+    """Stand-in for ChatBotAgent with a fixed simulated round trip"""
+
+    latency = 0.8
+
+    async def generate_response(self, question, content=None, history=None, summary=None):
+        await asyncio.sleep(self.latency)
+        return ChatResponse(answer=f"Answer to: {question}")
+
+
+def legacy_chat_response(question):
+    """
+    The request path chat_response used to take: a sync view blocking its
+    worker thread on a per-thread event loop
+    """
+    try:
+        loop = asyncio.get_event_loop()
+    except RuntimeError:
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+    return loop.run_until_complete(StubChatBotAgent().generate_response(question))
+
+
+def bench_before(requests, threads):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(legacy_chat_response, (f"Question {i}" for i in range(requests))))
+    return time.perf_counter() - start
+
+
+def bench_after(requests):
+    factory = APIRequestFactory()
+    user = CustomUser(username="bench")
+
+    def make_request(i):
+        request = factory.post("/api/chatbot/", {"question": f"Question {i}"}, format="json")
+        force_authenticate(request, user=user)
+        return request
+
+    async def run():
+        responses = await asyncio.gather(*(views.chat_response(make_request(i)) for i in range(requests)))
+        failed = [r for r in responses if r.status_code != 200]
+        if failed:
+            raise RuntimeError(f"{len(failed)} requests failed: {failed[0].data}")
+
+    start = time.perf_counter()
+    asyncio.run(run())
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--threads", type=int, default=8, help="worker threads for the sync (before) path")
+    parser.add_argument("--latency-ms", type=float, default=800)
+    args = parser.parse_args()
+
+    StubChatBotAgent.latency = args.latency_ms / 1000
+    with mock.patch.object(views, "ChatBotAgent", StubChatBotAgent):
+        before = bench_before(args.requests, args.threads)
+        after = bench_after(args.requests)
+
+    print(f"{args.requests} concurrent requests, {args.latency_ms:.0f} ms simulated model latency")
+    print(f"{'path':<34} {'seconds':>8} {'req/s':>8}")
+    print(f"{f'before: sync, {args.threads} threads':<34} {before:>8.2f} {args.requests / before:>8.1f}")
+    print(f"{'after: async, 1 event loop':<34} {after:>8.2f} {args.requests / after:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
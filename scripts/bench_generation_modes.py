@@ -0,0 +1,139 @@
+"""
+Benchmark the content generation modes (two_step, single, fanout) against
+a stubbed Gemini model.
+
+The stub simulates a network round trip plus a per-output-token decode time
+for every call, so the benchmark measures what the modes cost in model
+round trips rather than what the real API happens to do today.
+
+Usage:
+    python scripts/bench_generation_modes.py [--runs 50] [--scale 0.01]
+
+--scale shrinks the simulated latencies so the benchmark finishes quickly;
+reported numbers are converted back to simulated milliseconds.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from unittest import mock
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "backend")))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "core.settings")
+
+from core.llm import llm_clients  # noqa: E402
+from content_generation.content_generation import (  # noqa: E402
+    ContentGenerator,
+    GENERATION_MODES,
+)
+
+# Simulated latency model (milliseconds)
+ROUND_TRIP_MS = 450
+DECODE_MS_PER_TOKEN = 4
+ANALYSIS_TOKENS = 80
+CONTENT_TOKENS = 1400
+
+ANALYSIS = {
+    "recommended_difficulty": "beginner",
+    "sections": ["Introduction", "Core Concepts", "Applications", "Conclusion"],
+    "key_concepts": ["Reflection", "Refraction", "Lenses"],
+}
+
+CONTENT = {
+    "topic": "Ray Optics",
+    "summary": "Ray optics models light as rays travelling in straight lines.",
+    "sections": [
+        {
+            "title": title,
+            "content": "Light travels in straight lines until it meets a boundary. " * 8,
+            "key_points": ["Key point one", "Key point two", "Key point three"],
+        }
+        for title in ANALYSIS["sections"]
+    ],
+    "references": ["NCERT Physics Part 2, Chapter 9"],
+    "difficulty_level": "beginner",
+}
+
+
+class StubResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class StubModel:
+    """Stand-in for the shared genai.GenerativeModel with simulated latency"""
+
+    scale = 0.01
+    calls = 0
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def _latency(self, output_tokens):
+        # Round trips vary a lot more than decode throughput
+        simulated_ms = (
+            ROUND_TRIP_MS * random.lognormvariate(0, 0.4)
+            + output_tokens * DECODE_MS_PER_TOKEN * random.lognormvariate(0, 0.05)
+        )
+        return simulated_ms / 1000 * self.scale
+
+    async def generate_content_async(self, prompt, generation_config=None, stream=False):
+        StubModel.calls += 1
+        section_count = len(CONTENT["sections"])
+        if "First analyze the topic" in prompt:
+            await asyncio.sleep(self._latency(ANALYSIS_TOKENS + CONTENT_TOKENS))
+            return StubResponse(json.dumps({"analysis": ANALYSIS, **CONTENT}))
+        if "Analyze the topic" in prompt:
+            await asyncio.sleep(self._latency(ANALYSIS_TOKENS))
+            return StubResponse(json.dumps(ANALYSIS))
+        if "Write the overview" in prompt:
+            await asyncio.sleep(self._latency(CONTENT_TOKENS // (section_count * 2)))
+            return StubResponse(json.dumps({"summary": CONTENT["summary"], "references": CONTENT["references"]}))
+        if "Write ONLY the section" in prompt:
+            await asyncio.sleep(self._latency(CONTENT_TOKENS // section_count))
+            return StubResponse(json.dumps(CONTENT["sections"][0]))
+        await asyncio.sleep(self._latency(CONTENT_TOKENS))
+        return StubResponse(json.dumps(CONTENT))
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def run(mode, runs, scale):
+    StubModel.scale = scale
+    StubModel.calls = 0
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        asyncio.run(ContentGenerator("Ray Optics", "beginner", mode=mode).generate_content())
+        timings.append((time.perf_counter() - start) * 1000 / scale)
+    return timings, StubModel.calls / runs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=50)
+    parser.add_argument("--scale", type=float, default=0.01)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    print(f"{'mode':<10} {'calls/req':>10} {'p50 ms':>10} {'p95 ms':>10} {'mean ms':>10}")
+    with mock.patch.object(llm_clients, "generative_model", StubModel):
+        for mode in GENERATION_MODES:
+            timings, calls = run(mode, args.runs, args.scale)
+            print(
+                f"{mode:<10} {calls:>10.1f} {percentile(timings, 50):>10.0f} "
+                f"{percentile(timings, 95):>10.0f} {statistics.mean(timings):>10.0f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
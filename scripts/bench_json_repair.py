@@ -0,0 +1,132 @@
+"""
+Fuzz and benchmark the local JSON extraction/repair used for model output
+(content_generation.json_repair.loads_lenient).
+
+The corpus holds the failure shapes seen in Gemini responses; the fuzzer
+mutates a valid lesson in the same ways (fences, prose, trailing commas,
+truncation, unescaped quotes, raw newlines) and checks that loads_lenient
+either returns JSON or raises json.JSONDecodeError, never anything else.
+
+Usage:
+    python scripts/bench_json_repair.py [--cases 5000] [--seed 7]
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "backend")))
+
+from content_generation.json_repair import loads_lenient  # noqa: E402
+
+LESSON = {
+    "topic": "Ray Optics",
+    "summary": "Ray optics models light as rays that travel in straight lines.",
+    "sections": [
+        {
+            "title": f"Section {n}",
+            "content": "When light meets a mirror it is reflected; at a lens it is refracted. " * 4,
+            "key_points": ["Angle of incidence equals angle of reflection", "Snell's law", "Focal length"],
+        }
+        for n in range(1, 6)
+    ],
+    "references": ["NCERT Physics Part 2, Chapter 9"],
+    "difficulty_level": "beginner",
+}
+VALID = json.dumps(LESSON, indent=2)
+
+# (name, model output, expected value or None if only "parses" is required)
+CORPUS = [
+    ("valid", VALID, LESSON),
+    ("json fence", "```json\n" + VALID + "\n```", LESSON),
+    ("bare fence", "```\n" + VALID + "\n```", LESSON),
+    ("leading prose", "Sure! Here is the lesson:\n\n" + VALID, LESSON),
+    ("trailing prose", VALID + "\n\nLet me know if you need anything else.", LESSON),
+    ("trailing commas", '{"a": [1, 2, 3,], "b": {"c": 1,},}', {"a": [1, 2, 3], "b": {"c": 1}}),
+    ("comment", '{"recommended_difficulty": "beginner",  // or intermediate\n "sections": []}',
+     {"recommended_difficulty": "beginner", "sections": []}),
+    ("unescaped quotes", '{"summary": "Newton called it "opticks" in 1704"}',
+     {"summary": 'Newton called it "opticks" in 1704'}),
+    ("raw newline", '{"content": "line one\nline two"}', {"content": "line one\nline two"}),
+    ("missing comma", '[\n  "a"\n  "b"\n]', ["a", "b"]),
+    ("python literals", '{"a": True, "b": None}', {"a": True, "b": None}),
+    ("truncated string", VALID[: VALID.index("reflected") + 4], None),
+    ("truncated array", '{"key_points": ["one", "two", "thr', {"key_points": ["one", "two", "thr"]}),
+    ("truncated key", '{"a": 1, "b', {"a": 1}),
+    ("truncated after colon", '{"a": 1, "b": ', {"a": 1}),
+    ("wrong bracket", '{"a": [1, 2}', {"a": [1, 2]}),
+]
+
+
+def mutate(rng, text, kinds=("fence", "prose", "comma", "truncate", "quote", "newline", "combo")):
+    kind = rng.choice(kinds)
+    if kind == "fence":
+        return kind, "```json\n" + text + "\n```"
+    if kind == "prose":
+        return kind, "Here you go:\n" + text + "\nThanks!"
+    if kind == "comma":
+        positions = [i for i, ch in enumerate(text) if ch in "]}"] or [len(text)]
+        i = rng.choice(positions)
+        return kind, text[:i] + "," + text[i:]
+    if kind == "truncate":
+        return kind, text[: rng.randrange(1, len(text))]
+    if kind == "quote":
+        return kind, text.replace("reflected", '"reflected"', 1)
+    if kind == "newline":
+        return kind, text.replace("When light", "When\nlight", 1)
+    # Combination: damage the body first, then truncate and/or wrap it
+    _, text = mutate(rng, text, ("comma", "quote", "newline"))
+    _, text = mutate(rng, text, ("truncate", "fence", "prose"))
+    return kind, text
+
+
+def timed(text):
+    start = time.perf_counter()
+    try:
+        value = loads_lenient(text)
+    except json.JSONDecodeError:
+        value = None
+    return value, (time.perf_counter() - start) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cases", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    print("Corpus")
+    print(f"  {'case':<24} {'result':<8} {'us':>8}")
+    for name, text, expected in CORPUS:
+        value, micros = timed(text)
+        ok = value is not None if expected is None else value == expected
+        print(f"  {name:<24} {'ok' if ok else 'FAIL':<8} {micros:>8.1f}")
+
+    rng = random.Random(args.seed)
+    results = {}
+    for _ in range(args.cases):
+        kind, text = mutate(rng, VALID)
+        try:
+            value, micros = timed(text)
+        except Exception as e:  # anything but JSONDecodeError is a bug
+            print(f"Unexpected {type(e).__name__} for {kind} mutation: {e}\n{text[:200]!r}")
+            raise
+        parsed, timings = results.setdefault(kind, ([], []))
+        parsed.append(value is not None)
+        timings.append(micros)
+
+    print(f"\nFuzz ({args.cases} cases)")
+    print(f"  {'mutation':<10} {'cases':>6} {'parsed':>8} {'p50 us':>8} {'p95 us':>8}")
+    for kind, (parsed, timings) in sorted(results.items()):
+        timings.sort()
+        print(
+            f"  {kind:<10} {len(parsed):>6} {sum(parsed) / len(parsed):>8.1%} "
+            f"{statistics.median(timings):>8.1f} {timings[int(len(timings) * 0.95) - 1]:>8.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Benchmark the leaderboard (quizzes.leaderboard) against sorting every user.
+
+Loads a synthetic population of users with random average scores, checks
+the Fenwick tree ranks against a full sort, then reports the cost of a
+"my rank" lookup, a top-K query and a score update next to the naive
+approach of sorting all users on every request.
+
+"uniform" spreads the averages over 0-100. "clustered" puts them on the
+few values short quizzes produce (0, 20, ..., 100), with a third of the
+users on the top score, so the best bucket holds most of a top-K query.
+
+Usage:
+    python scripts/bench_leaderboard.py [--users 100000] [--top 10] [--seed 7] [--scores uniform|clustered]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "backend")))
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "core.settings")
+os.environ.setdefault("SECRET_KEY", "bench")
+
+import django  # noqa: E402
+
+django.setup()
+
+from quizzes.leaderboard import Leaderboard, score_bucket  # noqa: E402
+
+
+def average_score(rng, scores):
+    if scores == "clustered":
+        return 100.0 if rng.random() < 1 / 3 else float(rng.choice([0, 20, 40, 60, 80]))
+    return round(rng.uniform(0, 100), 2)
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1e6)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.95) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--scores", choices=["uniform", "clustered"], default="uniform")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    rows = [
+        (user_id, f"student{user_id}", average_score(rng, args.scores), rng.randint(1, 40))
+        for user_id in range(1, args.users + 1)
+    ]
+
+    board = Leaderboard()
+    start = time.perf_counter()
+    board._load(rows)
+    build_ms = (time.perf_counter() - start) * 1e3
+
+    # Ranks must match a full sort (competition ranking on the bucketed score)
+    ordered = sorted(rows, key=lambda row: -score_bucket(row[2]))
+    higher = {}
+    for position, row in enumerate(ordered):
+        bucket = score_bucket(row[2])
+        higher.setdefault(bucket, position)
+    for row in rng.sample(rows, 1000):
+        assert board.rank(row[0])["rank"] == higher[score_bucket(row[2])] + 1
+    expected_top = sorted(rows, key=lambda row: (-score_bucket(row[2]), row[1]))[: args.top]
+    assert [entry["user_id"] for entry in board.top(args.top)] == [row[0] for row in expected_top]
+
+    user_ids = [row[0] for row in rows]
+
+    def naive_rank():
+        user_id = rng.choice(user_ids)
+        ranked = sorted(rows, key=lambda row: -row[2])
+        next(i for i, row in enumerate(ranked) if row[0] == user_id)
+
+    def naive_top():
+        sorted(rows, key=lambda row: -row[2])[: args.top]
+
+    def update():
+        user_id = rng.choice(user_ids)
+        board.update(user_id, f"student{user_id}", rng.uniform(0, 100), 2)
+
+    results = [
+        ("my rank (leaderboard)", timed(lambda: board.rank(rng.choice(user_ids)), 2000)),
+        ("my rank (sort all users)", timed(naive_rank, 10)),
+        (f"top {args.top} (leaderboard)", timed(lambda: board.top(args.top), 2000)),
+        (f"top {args.top} (sort all users)", timed(naive_top, 10)),
+        ("score update (leaderboard)", timed(update, 2000)),
+    ]
+
+    print(f"{args.users} users ({args.scores} scores), leaderboard built in {build_ms:.0f} ms")
+    print(f"{'operation':<30} {'p50 us':>10} {'p95 us':>10}")
+    for name, (p50, p95) in results:
+        print(f"{name:<30} {p50:>10.1f} {p95:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Benchmark the question bank's near-duplicate index (quizzes.similarity).
+
+Builds a synthetic bank of questions, a quarter of them reworded
+duplicates, then reports the per-question cost of near-duplicate checks at
+insert time and of diverse subset selection at serve time.
+
+Usage:
+    python scripts/bench_question_similarity.py [--bank 500] [--serve 10] [--seed 7]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "backend")))
+
+from quizzes.similarity import SimilarityIndex, diverse_subset, question_text, shingles  # noqa: E402
+
+# Vocabulary of made-up content words, so distinct questions share few words
+VOCABULARY = [f"term{i}" for i in range(3000)]
+
+
+def build_bank(rng, size):
+    """
+    Distinct questions of 6-10 content words, where every fourth question is
+    a rewording of an earlier one (same words reordered, one word swapped)
+    """
+    bank = []
+    for i in range(size):
+        if i % 4 == 3 and bank:
+            words = rng.choice(bank).split()
+            rng.shuffle(words)
+            words[0] = rng.choice(VOCABULARY)
+        else:
+            words = rng.sample(VOCABULARY, rng.randint(6, 10))
+        bank.append(question_text(" ".join(words[:-1]) + "?", words[-1]))
+    return bank
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--bank", type=int, default=500)
+    parser.add_argument("--serve", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    random.seed(args.seed)
+    texts = build_bank(rng, args.bank)
+
+    index = SimilarityIndex()
+    insert_us = []
+    rejected = 0
+    for i, text in enumerate(texts):
+        shingles.cache_clear()  # measure cold shingling, as for a freshly generated question
+        start = time.perf_counter()
+        added = index.add_if_new(i, text)
+        insert_us.append((time.perf_counter() - start) * 1e6)
+        rejected += not added
+
+    items = [(i, text) for i, text in enumerate(texts)]
+    serve_us = []
+    for _ in range(50):
+        start = time.perf_counter()
+        diverse_subset(items, args.serve)
+        serve_us.append((time.perf_counter() - start) * 1e6 / args.serve)
+
+    insert_us.sort()
+    serve_us.sort()
+    print(f"bank of {args.bank} questions, {rejected} rejected as near-duplicates, {len(index)} indexed")
+    print(f"{'operation':<34} {'p50 us':>8} {'p95 us':>8}")
+    print(f"{'insert check (per question)':<34} {statistics.median(insert_us):>8.1f} "
+          f"{insert_us[int(len(insert_us) * 0.95) - 1]:>8.1f}")
+    print(f"{f'diverse {args.serve} of {args.bank} (per question)':<34} {statistics.median(serve_us):>8.1f} "
+          f"{serve_us[int(len(serve_us) * 0.95) - 1]:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
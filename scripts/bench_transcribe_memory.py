@@ -0,0 +1,136 @@
+"""
+Benchmark the peak memory of the transcribe_audio upload path as the audio
+file grows.
+
+"buffered" is the old path: Django's default upload handlers, then
+file.read() into a bytes payload for Deepgram. "streamed" is the current
+path: SizeCappedUploadHandler spools the file to disk and the open file is
+sent, read in chunks as it goes out. Both parse a real multipart body with
+Django's MultiPartParser and post the payload through httpx (which the
+Deepgram SDK uses) to a transport that discards it, so no network or API key
+is needed.
+
+Every measurement runs in a fresh process and reports how much its peak RSS
+grew over the process baseline.
+
+Usage:
+    python scripts/bench_transcribe_memory.py [--sizes 8 32 128]
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "backend")))
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "core.settings")
+os.environ.setdefault("SECRET_KEY", "bench")
+# The benchmark measures files beyond the default cap
+os.environ.setdefault("TRANSCRIBE_MAX_UPLOAD_BYTES", str(4 * 1024 ** 3))
+
+BOUNDARY = "benchboundary"
+MB = 1024 * 1024
+
+
+def write_request(path, size_mb):
+    """Write a multipart body with one audio file of size_mb to disk, without holding it in memory"""
+    chunk = os.urandom(MB)
+    with open(path, "wb") as body:
+        body.write(
+            f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="file"; filename="note.mp3"\r\n'
+            "Content-Type: audio/mpeg\r\n\r\n".encode()
+        )
+        for _ in range(size_mb):
+            body.write(chunk)
+        body.write(f"\r\n--{BOUNDARY}--\r\n".encode())
+    return os.path.getsize(path)
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / MB if sys.platform == "darwin" else peak / 1024
+
+
+def measure(mode, body_path):
+    import django
+
+    django.setup()
+
+    import httpx
+    from django.conf import settings
+    from django.core.files.uploadhandler import load_handler
+    from django.http.multipartparser import MultiPartParser
+
+    from chatbot.audio import SizeCappedUploadHandler
+
+    class DiscardTransport(httpx.BaseTransport):
+        def __init__(self):
+            self.sent = 0
+
+        def handle_request(self, request):
+            for chunk in request.stream:
+                self.sent += len(chunk)
+            return httpx.Response(200, json={})
+
+    meta = {
+        "CONTENT_TYPE": f"multipart/form-data; boundary={BOUNDARY}",
+        "CONTENT_LENGTH": str(os.path.getsize(body_path)),
+    }
+    if mode == "streamed":
+        handlers = [SizeCappedUploadHandler()]
+    else:
+        handlers = [load_handler(handler) for handler in settings.FILE_UPLOAD_HANDLERS]
+
+    transport = DiscardTransport()
+    baseline = peak_rss_mb()
+    start = time.perf_counter()
+    with open(body_path, "rb") as input_data, httpx.Client(transport=transport) as client:
+        _, files = MultiPartParser(meta, input_data, handlers).parse()
+        file = files["file"]
+        if mode == "streamed":
+            with open(file.temporary_file_path(), "rb") as stream:
+                client.post("https://deepgram.invalid/v1/listen", content=stream)
+        else:
+            client.post("https://deepgram.invalid/v1/listen", content=file.read())
+        file.close()
+    return {
+        "peak_growth_mb": peak_rss_mb() - baseline,
+        "sent_mb": transport.sent / MB,
+        "seconds": time.perf_counter() - start,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[8, 32, 128], help="audio file sizes in MB")
+    parser.add_argument("--measure", nargs=2, metavar=("MODE", "BODY"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        print(json.dumps(measure(*args.measure)))
+        return
+
+    print(f"{'file MB':>8} {'mode':<10} {'peak RSS growth MB':>19} {'sent MB':>9} {'seconds':>8}")
+    with tempfile.TemporaryDirectory() as directory:
+        body_path = os.path.join(directory, "request.body")
+        for size_mb in args.sizes:
+            write_request(body_path, size_mb)
+            for mode in ("buffered", "streamed"):
+                output = subprocess.run(
+                    [sys.executable, __file__, "--measure", mode, body_path],
+                    check=True, capture_output=True, text=True,
+                ).stdout
+                result = json.loads(output.strip().splitlines()[-1])
+                print(
+                    f"{size_mb:>8} {mode:<10} {result['peak_growth_mb']:>19.1f} "
+                    f"{result['sent_mb']:>9.1f} {result['seconds']:>8.2f}"
+                )
+
+
+if __name__ == "__main__":
+    main()